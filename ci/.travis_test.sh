@@ -19,8 +19,8 @@ python -c "import update_checker; print('update_checker %s ' % update_checker.__
 python -c "import tqdm; print('tqdm %s' % tqdm.__version__)"
 
 if [[ "$COVERAGE" == "true" ]]; then
-    nosetests -s -v --with-coverage
+    nosetests -s -v -a '!slow' --with-coverage
 else
-    nosetests -s -v
+    nosetests -s -v -a '!slow'
 fi
 # make test-doc test-sphinxext
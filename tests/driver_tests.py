@@ -239,6 +239,7 @@ class ParserTest(TestCase):
         self.assertEqual(args.OUTPUT_FILE, None)
         self.assertEqual(args.POPULATION_SIZE, 100)
         self.assertEqual(args.RANDOM_STATE, None)
+        self.assertEqual(args.RESUME_FROM, None)
         self.assertEqual(args.SUBSAMPLE, 1.0)
         self.assertEqual(args.SCORING_FN, None)
         self.assertEqual(args.TARGET_NAME, 'class')
@@ -275,6 +276,7 @@ OFFSPRING_SIZE      =     100
 OUTPUT_FILE         =     None
 POPULATION_SIZE     =     100
 RANDOM_STATE        =     None
+RESUME_FROM         =     None
 SCORING_FN          =     accuracy
 SUBSAMPLE           =     1.0
 TARGET_NAME         =     class
@@ -317,6 +319,7 @@ OFFSPRING_SIZE      =     100
 OUTPUT_FILE         =     None
 POPULATION_SIZE     =     100
 RANDOM_STATE        =     None
+RESUME_FROM         =     None
 SCORING_FN          =     neg_mean_squared_error
 SUBSAMPLE           =     1.0
 TARGET_NAME         =     class
@@ -27,10 +27,17 @@ from tpot import TPOTClassifier, TPOTRegressor
 from tpot.base import TPOTBase
 from tpot.driver import float_range
 from tpot.gp_types import Output_Array
-from tpot.gp_deap import mutNodeReplacement, _wrapped_cross_val_score, pick_two_individuals_eligible_for_crossover, cxOnePoint, varOr, initialize_stats_dict
+from tpot.gp_deap import mutNodeReplacement, _wrapped_cross_val_score, pick_two_individuals_eligible_for_crossover, cxOnePoint, varOr, initialize_stats_dict, _racing_upper_bound
+from tpot.gp_deap import canonical_pipeline_key, CrossoverIndex, shared_fit_key, _decomposition_key, _derive_decomposition, _fit_selector, _fit_and_score_path, _wrapped_group_cross_val_score
 from tpot.metrics import balanced_accuracy, SCORERS
 from tpot.operator_utils import TPOTOperatorClassFactory, set_sample_weight
-from tpot.decorators import pretest_X, pretest_y
+from tpot.decorators import pretest_X, pretest_y, _pretest_fit
+from tpot.parallel_utils import EvaluationPool
+from tpot.cache_utils import EvaluationCache, PrefixCache, PretestMemo, TPOTMemory
+from tpot import cache_utils
+from tpot.surrogate import SurrogateModel, pipeline_features
+from tpot.shape_utils import data_shape, infer_pipeline_shape
+from tpot.export_utils import expr_to_tree
 
 from tpot.config.classifier import classifier_config_dict
 from tpot.config.classifier_light import classifier_config_dict_light
@@ -57,9 +64,12 @@ from sklearn.datasets import load_digits, load_boston
 from sklearn.model_selection import train_test_split, cross_val_score, GroupKFold
 from sklearn.externals.joblib import Memory
 from sklearn.metrics import make_scorer, roc_auc_score
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.pipeline import make_pipeline
 from deap import creator, gp
 from deap.tools import ParetoFront
 from nose.tools import assert_raises, assert_not_equal, assert_greater_equal, assert_equal, assert_in
+from nose.plugins.attrib import attr
 from driver_tests import captured_output
 
 from tqdm import tqdm
@@ -301,6 +311,80 @@ def test_invalid_pipeline():
     assert return_value == -float('inf')
 
 
+def test_racing_upper_bound():
+    """Assert that _racing_upper_bound returns a finite bound above the mean only with at least two fold scores."""
+    assert _racing_upper_bound([0.8]) == np.inf
+    assert _racing_upper_bound([0.8, -float('inf')]) == np.inf
+    upper_bound = _racing_upper_bound([0.7, 0.8, 0.75])
+    assert np.isfinite(upper_bound)
+    assert upper_bound > 0.75
+
+
+def test_wrapped_cross_val_score_racing():
+    """Assert that _wrapped_cross_val_score stops scoring folds once the pipeline cannot reach the racing threshold."""
+    tpot_obj = TPOTClassifier()
+    pipeline_string = 'GaussianNB(input_matrix)'
+    tpot_obj._optimized_pipeline = creator.Individual.from_string(pipeline_string, tpot_obj._pset)
+    tpot_obj.fitted_pipeline_ = tpot_obj._toolbox.compile(expr=tpot_obj._optimized_pipeline)
+    fold_scores = _wrapped_cross_val_score(tpot_obj.fitted_pipeline_,
+                                           training_features,
+                                           training_target,
+                                           cv=5,
+                                           scoring_function='accuracy',
+                                           racing_threshold=1.1,
+                                           return_fold_scores=True,
+                                           timeout=300)
+    assert len(fold_scores) == 2
+
+    fold_scores = _wrapped_cross_val_score(tpot_obj.fitted_pipeline_,
+                                           training_features,
+                                           training_target,
+                                           cv=5,
+                                           scoring_function='accuracy',
+                                           racing_threshold=0.,
+                                           return_fold_scores=True,
+                                           timeout=300)
+    assert len(fold_scores) == 5
+
+
+def test_racing_threshold():
+    """Assert that _racing_threshold returns the best Pareto front score among pipelines that are not more complex."""
+    tpot_obj = TPOTClassifier(racing=True)
+    assert tpot_obj._racing_threshold(2) is None
+
+    tpot_obj._pareto_front = ParetoFront()
+    for pipeline_string, fitness in [('GaussianNB(input_matrix)', (1, 0.8)),
+                                     ('BernoulliNB(GaussianNB(input_matrix), BernoulliNB__alpha=1.0, BernoulliNB__fit_prior=True)', (2, 0.9))]:
+        ind = creator.Individual.from_string(pipeline_string, tpot_obj._pset)
+        ind.fitness.values = fitness
+        tpot_obj._pareto_front.update([ind])
+
+    assert tpot_obj._racing_threshold(1) == 0.8
+    assert tpot_obj._racing_threshold(3) == 0.9
+
+    tpot_obj.racing = False
+    assert tpot_obj._racing_threshold(3) is None
+
+
+def test_racing_partial_score():
+    """Assert that _record_scores keeps the mean score of an abandoned evaluation apart from the CV score."""
+    tpot_obj = TPOTClassifier(racing=True)
+    pipeline_strings = ['GaussianNB(input_matrix)',
+                        'BernoulliNB(input_matrix, BernoulliNB__alpha=1.0, BernoulliNB__fit_prior=True)']
+    stats_dicts = dict((pipeline_string, {}) for pipeline_string in pipeline_strings)
+    operator_counts = dict((pipeline_string, 1) for pipeline_string in pipeline_strings)
+    tpot_obj._record_scores([np.array([0.6, 0.7]), np.array([0.5, 0.6, 0.5, 0.6, 0.5])], pipeline_strings,
+                            operator_counts, stats_dicts, n_cv_folds=5)
+
+    abandoned_stats = tpot_obj.evaluated_individuals_[pipeline_strings[0]]
+    assert_equal(abandoned_stats['internal_cv_score'], -float('inf'))
+    assert np.allclose(abandoned_stats['racing_partial_score'], 0.65)
+    assert_equal(abandoned_stats['cv_folds_evaluated'], 2)
+    complete_stats = tpot_obj.evaluated_individuals_[pipeline_strings[1]]
+    assert np.allclose(complete_stats['internal_cv_score'], 0.54)
+    assert 'racing_partial_score' not in complete_stats
+
+
 def test_balanced_accuracy():
     """Assert that the balanced_accuracy in TPOT returns correct accuracy."""
     y_true = np.array([1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 4, 4, 4])
@@ -747,6 +831,408 @@ def test_fit_4():
     assert not (tpot_obj._start_datetime is None)
 
 
+def test_fit_steady_state():
+    """Assert that the TPOT fit function provides an optimized pipeline with steady-state evolution."""
+    tpot_obj = TPOTClassifier(
+        random_state=42,
+        population_size=2,
+        offspring_size=4,
+        generations=2,
+        steady_state=True,
+        verbosity=0,
+        config_dict='TPOT light'
+    )
+    tpot_obj.fit(training_features, training_target)
+
+    assert isinstance(tpot_obj._optimized_pipeline, creator.Individual)
+    assert not (tpot_obj._start_datetime is None)
+
+
+def test_fit_steady_state_2():
+    """Assert that the steady-state evolution evaluates offspring in the evaluation pool when n_jobs > 1."""
+    tpot_obj = TPOTClassifier(
+        random_state=42,
+        population_size=2,
+        offspring_size=4,
+        generations=2,
+        steady_state=True,
+        n_jobs=2,
+        verbosity=0,
+        config_dict='TPOT light'
+    )
+    tpot_obj.fit(training_features, training_target)
+
+    assert isinstance(tpot_obj._optimized_pipeline, creator.Individual)
+    assert tpot_obj._evaluation_pool is None
+    assert_equal(tpot_obj._async_evaluations, {})
+    assert max(stats['generation'] for stats in tpot_obj.evaluated_individuals_.values()) <= 2
+
+
+def test_pareto_front_fitted_pipelines():
+    """Assert that the pipelines of the Pareto front are only fitted when they are accessed."""
+    tpot_obj = TPOTClassifier(
+        random_state=42,
+        population_size=2,
+        offspring_size=4,
+        generations=1,
+        verbosity=0,
+        config_dict='TPOT light'
+    )
+    tpot_obj.fit(training_features, training_target)
+
+    fitted_pipelines = tpot_obj.pareto_front_fitted_pipelines_
+    assert_equal(fitted_pipelines.n_fitted, 0)
+    assert_equal(set(fitted_pipelines.keys()), set(str(pipeline) for pipeline in tpot_obj._pareto_front.items))
+    pipeline_str = str(tpot_obj._optimized_pipeline)
+    assert_equal(len(fitted_pipelines[pipeline_str].predict(testing_features)), len(testing_features))
+    assert_equal(fitted_pipelines.n_fitted, 1)
+
+
+def test_pareto_front_fitted_pipelines_2():
+    """Assert that eager_pareto_front fits the whole Pareto front in the worker processes before fit() returns."""
+    tpot_obj = TPOTClassifier(
+        random_state=42,
+        population_size=2,
+        offspring_size=4,
+        generations=1,
+        n_jobs=2,
+        eager_pareto_front=True,
+        verbosity=0,
+        config_dict='TPOT light'
+    )
+    tpot_obj.fit(training_features, training_target)
+
+    fitted_pipelines = tpot_obj.pareto_front_fitted_pipelines_
+    assert_equal(fitted_pipelines.n_fitted, len(tpot_obj._pareto_front.items))
+    assert tpot_obj._evaluation_pool is None
+    for pipeline_str in fitted_pipelines:
+        assert_equal(len(fitted_pipelines[pipeline_str].predict(testing_features)), len(testing_features))
+
+
+def test_regularization_path():
+    """Assert that shared_fit_key() groups the pipelines that only differ by C or alpha."""
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+    from sklearn.linear_model import LogisticRegression, Lasso
+    from sklearn.naive_bayes import GaussianNB
+
+    key = shared_fit_key(make_pipeline(MinMaxScaler(), LogisticRegression(C=0.1)))
+    assert_equal(key, shared_fit_key(make_pipeline(MinMaxScaler(), LogisticRegression(C=10.))))
+    assert key != shared_fit_key(make_pipeline(StandardScaler(), LogisticRegression(C=10.)))
+    assert key != shared_fit_key(make_pipeline(MinMaxScaler(), LogisticRegression(C=10., penalty='l1')))
+    assert_equal(shared_fit_key(make_pipeline(Lasso(alpha=0.1))),
+                 shared_fit_key(make_pipeline(Lasso(alpha=1.))))
+    assert shared_fit_key(make_pipeline(GaussianNB())) is None
+    assert shared_fit_key(make_pipeline(Lasso(alpha=0.1)), regularization_path=False) is None
+
+
+def test_regularization_path_2():
+    """Assert that the pipelines evaluated along a regularization path get the same scores as on their own."""
+    pipeline_strings = [
+        'LogisticRegression(MinMaxScaler(input_matrix), LogisticRegression__C={}, '
+        'LogisticRegression__dual=False, LogisticRegression__penalty=l2)'.format(C)
+        for C in [10.0, 0.1, 1.0]
+    ] + ['GaussianNB(input_matrix)']
+
+    fitness_scores_list = []
+    for n_jobs, regularization_path in [(1, False), (1, True), (2, True)]:
+        tpot_obj = TPOTClassifier(random_state=42, n_jobs=n_jobs, regularization_path=regularization_path,
+                                  config_dict='TPOT light')
+        tpot_obj._pbar = tqdm(total=1, disable=True)
+        individuals = [creator.Individual.from_string(pipeline_string, tpot_obj._pset)
+                       for pipeline_string in pipeline_strings]
+        for individual in individuals:
+            initialize_stats_dict(individual)
+        sklearn_pipelines = [tpot_obj._toolbox.compile(expr=individual) for individual in individuals]
+        assert_equal(len(tpot_obj._shared_fit_groups(sklearn_pipelines)), 2 if regularization_path else 4)
+        fitness_scores_list.append(tpot_obj._evaluate_individuals(individuals, training_features, training_target))
+
+    # liblinear does not warm start, so the scores are identical
+    for fitness_scores in fitness_scores_list[1:]:
+        for fitness, expected_fitness in zip(fitness_scores, fitness_scores_list[0]):
+            assert np.allclose(fitness[1], expected_fitness[1])
+
+
+def test_regularization_path_3():
+    """Assert that the Lasso models of a regularization path are warm-started from the previous solution."""
+    from sklearn.linear_model import Lasso
+
+    original_fit = Lasso.fit
+    warm_starts = []
+
+    def recording_fit(self, X, y, *args, **kwargs):
+        warm_starts.append(self.warm_start and getattr(self, 'coef_', None) is not None)
+        return original_fit(self, X, y, *args, **kwargs)
+
+    final_estimators = [Lasso(alpha=alpha, max_iter=10000) for alpha in [0.01, 1.0, 0.1]]
+    scorer = SCORERS['neg_mean_squared_error']
+    Lasso.fit = recording_fit
+    try:
+        results = _fit_and_score_path(final_estimators, training_features_r, training_target_r,
+                                      testing_features_r, testing_target_r, scorer, {})
+    finally:
+        Lasso.fit = original_fit
+
+    # The strongest regularization is fitted from scratch, the next ones reuse its solution
+    assert_equal(warm_starts, [False, True, True])
+    for final_estimator, result in zip(final_estimators, results):
+        expected_score = scorer(clone(final_estimator).fit(training_features_r, training_target_r),
+                                testing_features_r, testing_target_r)
+        assert np.allclose(result[0], expected_score, rtol=1e-3)
+
+
+def test_regularization_path_4():
+    """Assert that _shared_fit_groups() splits the groups of pipelines beyond _max_fit_group_size."""
+    from sklearn.linear_model import LogisticRegression
+
+    tpot_obj = TPOTClassifier(regularization_path=True)
+    sklearn_pipelines = [make_pipeline(LogisticRegression(C=C)) for C in [0.01, 0.1, 1.0, 10.0, 100.0]]
+    assert_equal(tpot_obj._shared_fit_groups(sklearn_pipelines), [[0, 1, 2], [3, 4]])
+
+
+def test_batch_neighbors():
+    """Assert that shared_fit_key() groups the pipelines that only differ by n_neighbors or weights."""
+    from sklearn.preprocessing import MinMaxScaler
+    from sklearn.neighbors import KNeighborsClassifier
+
+    key = shared_fit_key(make_pipeline(MinMaxScaler(), KNeighborsClassifier(n_neighbors=5)))
+    assert_equal(key, shared_fit_key(make_pipeline(MinMaxScaler(), KNeighborsClassifier(n_neighbors=20,
+                                                                                         weights='distance'))))
+    assert key != shared_fit_key(make_pipeline(MinMaxScaler(), KNeighborsClassifier(n_neighbors=5, p=1)))
+    assert key != shared_fit_key(make_pipeline(KNeighborsClassifier(n_neighbors=5)))
+    assert shared_fit_key(make_pipeline(KNeighborsClassifier()), batch_neighbors=False) is None
+
+
+def test_batch_neighbors_2():
+    """Assert that the pipelines evaluated from a shared neighbor query get the same scores as on their own."""
+    pipeline_strings = [
+        'KNeighborsClassifier(MinMaxScaler(input_matrix), KNeighborsClassifier__n_neighbors={}, '
+        'KNeighborsClassifier__p=2, KNeighborsClassifier__weights={})'.format(n_neighbors, weights)
+        for n_neighbors, weights in [(5, 'uniform'), (20, 'distance'), (1, 'uniform'), (100, 'distance')]
+    ] + ['GaussianNB(input_matrix)']
+
+    fitness_scores_list = []
+    for n_jobs, batch_neighbors in [(1, False), (1, True), (2, True)]:
+        tpot_obj = TPOTClassifier(random_state=42, n_jobs=n_jobs, batch_neighbors=batch_neighbors,
+                                  config_dict='TPOT light')
+        tpot_obj._pbar = tqdm(total=1, disable=True)
+        individuals = [creator.Individual.from_string(pipeline_string, tpot_obj._pset)
+                       for pipeline_string in pipeline_strings]
+        for individual in individuals:
+            initialize_stats_dict(individual)
+        sklearn_pipelines = [tpot_obj._toolbox.compile(expr=individual) for individual in individuals]
+        # The four KNeighborsClassifier are split into groups of at most 3 pipelines
+        assert_equal(len(tpot_obj._shared_fit_groups(sklearn_pipelines)), 3 if batch_neighbors else 5)
+        fitness_scores_list.append(tpot_obj._evaluate_individuals(individuals, training_features, training_target))
+
+    for fitness_scores in fitness_scores_list[1:]:
+        for fitness, expected_fitness in zip(fitness_scores, fitness_scores_list[0]):
+            assert np.allclose(fitness[1], expected_fitness[1])
+
+
+def test_batch_neighbors_3():
+    """Assert that the distance weighted neighbors scored from a shared query match cross_val_score."""
+    from sklearn.preprocessing import MinMaxScaler
+    from sklearn.neighbors import KNeighborsClassifier
+
+    sklearn_pipelines = [make_pipeline(MinMaxScaler(), KNeighborsClassifier(n_neighbors=n_neighbors, weights='distance'))
+                         for n_neighbors in [1, 5, 20]]
+    results = _wrapped_group_cross_val_score(sklearn_pipelines, training_features, training_target,
+                                             cv=5, scoring_function='accuracy')
+    for sklearn_pipeline, (score, _) in zip(sklearn_pipelines, results):
+        assert np.allclose(score, cross_val_score(sklearn_pipeline, training_features, training_target,
+                                                  cv=5, scoring='accuracy').mean())
+
+
+def test_cost_objective():
+    """Assert that the TPOT fit function adds the fit time of the pipelines as a third objective of the Pareto front."""
+    tpot_obj = TPOTClassifier(
+        random_state=42,
+        population_size=2,
+        offspring_size=4,
+        generations=1,
+        cost_objective='fit_time',
+        verbosity=0,
+        config_dict='TPOT light'
+    )
+    assert_equal(creator.FitnessMultiCost.weights, (-1.0, 1.0, -1.0))
+    # The other TPOT objects keep two objectives
+    assert_equal(creator.FitnessMulti.weights, (-1.0, 1.0))
+    tpot_obj.fit(training_features, training_target)
+
+    assert isinstance(tpot_obj._optimized_pipeline, creator.IndividualCost)
+    for pipeline, pipeline_scores in zip(tpot_obj._pareto_front.items, reversed(tpot_obj._pareto_front.keys)):
+        stats = tpot_obj.evaluated_individuals_[str(pipeline)]
+        assert_equal(len(pipeline_scores.values), 3)
+        assert np.allclose(pipeline_scores.values[2], stats['fit_time'] / len(stats['fold_times']))
+
+
+def test_cost_objective_2():
+    """Assert that TPOT uses the predict latency per row as cost objective and rejects unknown cost objectives."""
+    tpot_obj = TPOTClassifier(random_state=42, cost_objective='predict_latency', config_dict='TPOT light')
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    individual = creator.IndividualCost.from_string('GaussianNB(input_matrix)', tpot_obj._pset)
+    initialize_stats_dict(individual)
+    fitness, = tpot_obj._evaluate_individuals([individual], training_features, training_target)
+
+    stats = tpot_obj.evaluated_individuals_['GaussianNB(input_matrix)']
+    assert np.allclose(fitness[2], stats['score_time'] / training_features.shape[0])
+    # The memory costs are measured on the first fold with a cost objective
+    assert stats['model_size'] > 0
+
+    assert_raises(ValueError, TPOTClassifier, cost_objective='memory')
+
+
+def test_surrogate_model():
+    """Assert that the surrogate model ranks unseen pipelines from the evaluated ones."""
+    evaluated_individuals = {}
+    for c in range(1, 11):
+        evaluated_individuals['LogisticRegression(input_matrix, LogisticRegression__C={}.0)'.format(c)] = {
+            'internal_cv_score': 0.5 + c / 100.,
+            'fit_time': 0.1 * c,
+            'score_time': 0.01
+        }
+    surrogate = SurrogateModel(random_state=42)
+    surrogate.fit(dict(list(evaluated_individuals.items())[:5]))
+    assert not surrogate.is_fitted
+    surrogate.fit(evaluated_individuals)
+    assert surrogate.is_fitted
+    assert_equal(surrogate.n_samples_, 10)
+
+    candidates = [
+        'LogisticRegression(input_matrix, LogisticRegression__C=1.5)',
+        'LogisticRegression(input_matrix, LogisticRegression__C=9.5)'
+    ]
+    scores, runtimes = surrogate.predict(candidates)
+    assert scores[1] > scores[0]
+    assert runtimes[1] > runtimes[0]
+    assert_equal(len(surrogate.select(candidates, 1)), 1)
+
+    features = pipeline_features('GaussianNB(BernoulliNB(input_matrix, BernoulliNB__alpha=0.1, BernoulliNB__fit_prior=True))')
+    assert_equal(features['operator=GaussianNB'], 1)
+    assert_equal(features['BernoulliNB__alpha'], 0.1)
+    assert_equal(features['BernoulliNB__fit_prior'], 'True')
+    assert_equal(features['n_operators'], 2)
+    assert_equal(features['depth'], 2)
+
+
+def test_surrogate_model_2():
+    """Assert that the steady-state evolution refits the surrogate model once per offspring_size new evaluations."""
+    tpot_obj = TPOTClassifier(random_state=42, offspring_size=4, steady_state=True, surrogate_factor=3)
+    tpot_obj._surrogate = SurrogateModel(random_state=42)
+    offspring = [creator.Individual.from_string('GaussianNB(input_matrix)', tpot_obj._pset)]
+    n_evaluated = []
+    for c in range(1, 19):
+        tpot_obj.evaluated_individuals_['LogisticRegression(input_matrix, LogisticRegression__C={}.0)'.format(c)] = {
+            'internal_cv_score': 0.5 + c / 100.
+        }
+        tpot_obj._prescreen_offspring(offspring, 1)
+        n_evaluated.append(tpot_obj._surrogate.n_evaluated_)
+
+    # The surrogate is refitted for each evaluation until it has enough samples, then every 4 evaluations
+    assert_equal(n_evaluated, list(range(1, 11)) + [10, 10, 10, 14, 14, 14, 14, 18])
+
+
+def test_surrogate_factor():
+    """Assert that the TPOT fit function evaluates offspring_size offspring per generation with a surrogate model."""
+    tpot_obj = TPOTClassifier(
+        random_state=42,
+        population_size=10,
+        offspring_size=2,
+        generations=2,
+        surrogate_factor=3,
+        verbosity=0,
+        config_dict='TPOT light'
+    )
+    tpot_obj.fit(training_features, training_target)
+
+    assert isinstance(tpot_obj._optimized_pipeline, creator.Individual)
+    assert isinstance(tpot_obj._surrogate, SurrogateModel)
+    assert len(tpot_obj.evaluated_individuals_) <= 14
+
+
+def test_fidelity_schedule():
+    """Assert that the TPOT fit function only evaluates the promoted pipelines on the whole training set."""
+    tpot_obj = TPOTClassifier(
+        random_state=42,
+        population_size=4,
+        offspring_size=4,
+        generations=1,
+        fidelity_schedule=[0.5],
+        verbosity=0,
+        config_dict='TPOT light'
+    )
+    tpot_obj.fit(training_features, training_target)
+
+    assert isinstance(tpot_obj._optimized_pipeline, creator.Individual)
+    # The pipelines eliminated on the subsample are not recorded, so they can be screened again
+    fidelities = [stats['fidelity'] for stats in tpot_obj.evaluated_individuals_.values() if 'fidelity' in stats]
+    assert 1.0 in fidelities
+    assert 0.5 not in fidelities
+    for stats in tpot_obj.evaluated_individuals_.values():
+        if stats.get('fidelity') == 1.0:
+            assert_equal(len(stats['fidelity_scores']), 1)
+
+
+def test_fidelity_schedule_2():
+    """Assert that TPOT splits stratified subsamples for the fidelity schedule and rejects invalid schedules and the steady-state evolution."""
+    tpot_obj = TPOTClassifier(random_state=42, cv=3, fidelity_schedule=[0.2, 0.5])
+    tpot_obj._setup_fidelity_folds(training_target)
+
+    assert_equal(len(tpot_obj._fidelity_cv_iters), 2)
+    for fraction, fidelity_cv_iter in zip([0.2, 0.5], tpot_obj._fidelity_cv_iters):
+        assert_equal(len(fidelity_cv_iter), 3)
+        test_indices = np.concatenate([test for _, test in fidelity_cv_iter])
+        assert abs(len(np.unique(test_indices)) - fraction * training_target.shape[0]) <= 1
+        assert set(training_target[test_indices]) == set(training_target)
+
+    assert_raises(ValueError, TPOTClassifier, fidelity_schedule=[0.5, 0.2])
+    assert_raises(ValueError, TPOTClassifier, fidelity_schedule=[0.5, 1.0])
+    assert_raises(ValueError, TPOTClassifier, fidelity_schedule=[0.5], steady_state=True)
+
+
+def test_fidelity_schedule_3():
+    """Assert that _evaluate_individuals gives the pipelines eliminated by the successive halving a CV score of -inf."""
+    tpot_obj = TPOTClassifier(random_state=42, fidelity_schedule=[0.5], config_dict='TPOT light')
+    tpot_obj._setup_fidelity_folds(training_target)
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    individuals = [creator.Individual.from_string(pipeline_string, tpot_obj._pset) for pipeline_string in
+                   ['GaussianNB(input_matrix)', 'BernoulliNB(input_matrix, BernoulliNB__alpha=1.0, BernoulliNB__fit_prior=True)',
+                    'DecisionTreeClassifier(input_matrix, DecisionTreeClassifier__criterion=gini, '
+                    'DecisionTreeClassifier__max_depth=3, DecisionTreeClassifier__min_samples_leaf=1, '
+                    'DecisionTreeClassifier__min_samples_split=2)']]
+    for individual in individuals:
+        initialize_stats_dict(individual)
+    fitnesses = tpot_obj._evaluate_individuals(individuals, training_features, training_target)
+
+    eliminated = [str(individual) for individual in individuals if str(individual) not in tpot_obj.evaluated_individuals_]
+    assert_equal(len(eliminated), 1)
+    for individual, fitness in zip(individuals, fitnesses):
+        if str(individual) in eliminated:
+            assert_equal(fitness[1], -float('inf'))
+        else:
+            assert np.isfinite(fitness[1])
+
+
+def test_fidelity_schedule_4():
+    """Assert that _score_at_fidelity ignores the results left in the evaluation pool by other evaluations."""
+    tpot_obj = TPOTClassifier(random_state=42, n_jobs=2, fidelity_schedule=[0.5], verbosity=0, config_dict='TPOT light')
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    tpot_obj._setup_fidelity_folds(training_target)
+    sklearn_pipeline = tpot_obj._toolbox.compile(expr=creator.Individual.from_string('GaussianNB(input_matrix)', tpot_obj._pset))
+
+    tpot_obj._setup_evaluation_pool(training_features, training_target)
+    try:
+        # A fold of an evaluation of the previous generation is still in the pool
+        tpot_obj._evaluation_pool.submit(1, (sklearn_pipeline, 0, 300))
+        scores = [tpot_obj._score_at_fidelity([sklearn_pipeline, sklearn_pipeline], 0, training_features, training_target)
+                  for _ in range(2)]
+    finally:
+        tpot_obj._close_evaluation_pool()
+
+    assert np.all(np.isfinite(scores))
+    assert np.allclose(scores[0], scores[1])
+
+
 def test_memory():
     """Assert that the TPOT fit function runs normally with memory=\'auto\'."""
     tpot_obj = TPOTClassifier(
@@ -862,6 +1348,32 @@ def test_memory_6():
     assert_raises(ValueError, tpot_obj._setup_memory)
 
 
+def test_checkpoint_resume():
+    """Assert that fit() resumes from a checkpoint exactly where the previous run stopped."""
+    checkpoint_folder = mkdtemp()
+    try:
+        tpot_kwargs = dict(random_state=42, population_size=3, offspring_size=3, verbosity=0,
+                           config_dict='TPOT light')
+        tpot_obj = TPOTClassifier(generations=1, periodic_checkpoint_folder=checkpoint_folder, **tpot_kwargs)
+        tpot_obj.fit(training_features, training_target)
+        checkpoint = tpot_obj._read_checkpoint(checkpoint_folder)
+        assert_equal(checkpoint['generation'], 1)
+        assert_equal(len(checkpoint['population']), 3)
+        assert_equal(set(checkpoint['evaluated_individuals_']), set(tpot_obj.evaluated_individuals_))
+
+        resumed_tpot_obj = TPOTClassifier(generations=2, **tpot_kwargs)
+        resumed_tpot_obj.fit(training_features, training_target,
+                             resume_from=os.path.join(checkpoint_folder, 'tpot_checkpoint.pkl'))
+        uninterrupted_tpot_obj = TPOTClassifier(generations=2, **tpot_kwargs)
+        uninterrupted_tpot_obj.fit(training_features, training_target)
+
+        assert_equal(set(resumed_tpot_obj.evaluated_individuals_), set(uninterrupted_tpot_obj.evaluated_individuals_))
+        assert_equal(str(resumed_tpot_obj._optimized_pipeline), str(uninterrupted_tpot_obj._optimized_pipeline))
+        assert_raises(ValueError, resumed_tpot_obj._read_checkpoint, os.path.join(checkpoint_folder, 'missing.pkl'))
+    finally:
+        rmtree(checkpoint_folder)
+
+
 def test_check_periodic_pipeline():
     """Assert that the _check_periodic_pipeline exports periodic pipeline."""
     tpot_obj = TPOTClassifier(
@@ -1242,6 +1754,528 @@ def test_evaluate_individuals_2():
         assert np.allclose(fitness_score[1], mean_cv_scores)
 
 
+def test_evaluate_individuals_3():
+    """Assert that _evaluate_individuals records the costs of each evaluation in evaluated_individuals_."""
+    tpot_obj = TPOTClassifier(
+        random_state=42,
+        verbosity=0,
+        config_dict='TPOT light'
+    )
+
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    pipeline_string = 'GaussianNB(input_matrix)'
+    individual = creator.Individual.from_string(pipeline_string, tpot_obj._pset)
+    initialize_stats_dict(individual)
+    tpot_obj._evaluate_individuals([individual], training_features, training_target)
+
+    stats = tpot_obj.evaluated_individuals_[pipeline_string]
+    assert stats['fit_time'] > 0
+    assert stats['score_time'] > 0
+    assert_equal(len(stats['fold_times']), 5)
+    assert stats['fit_time'] + stats['score_time'] <= sum(stats['fold_times'])
+    # The memory costs are only measured for the cost objective
+    assert stats['model_size'] is None
+    assert stats['peak_rss'] is None
+
+    evaluated_individuals = tpot_obj.evaluated_individuals_to_dataframe()
+    assert_equal(list(evaluated_individuals.index), [pipeline_string])
+    assert_equal(evaluated_individuals.loc[pipeline_string, 'model_size'], stats['model_size'])
+    assert_equal(evaluated_individuals.loc[pipeline_string, 'internal_cv_score'], stats['internal_cv_score'])
+
+
+def test_evaluate_folds_in_parallel():
+    """Assert that _evaluate_folds_in_parallel returns the same CV scores as _wrapped_cross_val_score."""
+    tpot_obj = TPOTClassifier(
+        n_jobs=2,
+        random_state=42,
+        verbosity=0,
+        config_dict='TPOT light'
+    )
+
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    pop = tpot_obj._toolbox.population(n=4)
+    sklearn_pipeline_list = [tpot_obj._toolbox.compile(expr=ind) for ind in pop]
+    for sklearn_pipeline in sklearn_pipeline_list:
+        tpot_obj._set_param_recursive(sklearn_pipeline.steps, 'random_state', 42)
+
+    result_score_list, cost_stats_list = tpot_obj._evaluate_folds_in_parallel(sklearn_pipeline_list, [None] * 4,
+                                                                              training_features, training_target)
+    for cost_stats in cost_stats_list:
+        assert_equal(len(cost_stats['fold_times']), 5)
+
+    for sklearn_pipeline, result_score in zip(sklearn_pipeline_list, result_score_list):
+        known_score = _wrapped_cross_val_score(sklearn_pipeline,
+                                               training_features,
+                                               training_target,
+                                               cv=5,
+                                               scoring_function='accuracy',
+                                               timeout=300)
+        assert np.allclose(known_score, result_score)
+
+
+def test_evaluate_folds_in_parallel_2():
+    """Assert that the time limit of a pipeline evaluated in parallel applies to the sum of its CV folds."""
+    tpot_obj = TPOTClassifier(n_jobs=2, random_state=42, verbosity=0, config_dict='TPOT light')
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    sklearn_pipeline = tpot_obj._toolbox.compile(expr=creator.Individual.from_string('GaussianNB(input_matrix)', tpot_obj._pset))
+
+    tpot_obj._setup_evaluation_pool(training_features, training_target)
+    try:
+        vals = []
+        for time_budget in [tpot_obj.max_eval_time_seconds, 0.]:
+            key = tpot_obj._submit_fold_tasks(sklearn_pipeline, None)
+            # Every fold is scored within its timeout, but not within the time left to the pipeline
+            tpot_obj._fold_tasks[key]['time_budget'] = time_budget
+            received_key = None
+            while received_key != key:
+                received_key, val, _ = tpot_obj._receive_fold_result()
+            vals.append(val)
+    finally:
+        tpot_obj._close_evaluation_pool()
+
+    assert np.isfinite(vals[0])
+    assert_equal(vals[1], "Timeout")
+
+
+def test_evaluation_pool():
+    """Assert that EvaluationPool scores pipelines on the folds of the training data shared with its workers."""
+    tpot_obj = TPOTClassifier(n_jobs=2, random_state=42, config_dict='TPOT light')
+    sklearn_pipeline = tpot_obj._toolbox.compile(expr=creator.Individual.from_string('GaussianNB(input_matrix)', tpot_obj._pset))
+    cv_iter = list(GroupKFold(n_splits=3).split(training_features, training_target, np.arange(training_target.shape[0]) % 3))
+
+    pool = EvaluationPool(2, training_features, training_target, cv_iter, 'accuracy')
+    try:
+        assert pool.n_folds == 3
+        fold_scores = pool.map([(sklearn_pipeline, fold_idx, 300) for fold_idx in range(3)])
+        memory_report = pool.memory_report()
+
+        for fold_idx in range(3):
+            pool.submit(fold_idx, (sklearn_pipeline, fold_idx, 300))
+        streamed_scores = {}
+        for _ in range(3):
+            fold_idx, score, fold_stats = pool.get_result()
+            streamed_scores[fold_idx] = score
+            assert fold_stats['fit_time'] >= 0
+            assert fold_stats['model_size'] is None
+        assert pool.n_pending == 0
+
+        # The results of the tasks submitted by other callers are skipped
+        pool.submit(0, (sklearn_pipeline, 0, 300))
+        pool.submit(('fidelity', 1, 0, 0), (sklearn_pipeline, 1, 300))
+        fitted_pipeline, = pool.fit_pipelines([sklearn_pipeline], 300)
+        assert hasattr(fitted_pipeline, 'predict')
+        assert np.allclose(pool.map([(sklearn_pipeline, fold_idx, 300) for fold_idx in range(3)]), fold_scores)
+    finally:
+        pool.close()
+
+    assert not os.path.isdir(pool._temp_folder)
+    assert memory_report['shared_bytes'] >= training_features.nbytes + training_target.nbytes
+    assert memory_report['saved_bytes'] == memory_report['shared_bytes']
+
+    known_scores = cross_val_score(sklearn_pipeline, training_features, training_target, cv=cv_iter, scoring='accuracy')
+    assert np.allclose(known_scores, fold_scores)
+    assert np.allclose(known_scores, [streamed_scores[fold_idx] for fold_idx in range(3)])
+
+
+class SleepingClassifier(BaseEstimator, ClassifierMixin):
+    """Classifier that never finishes fitting within the time limits of the tests."""
+
+    def fit(self, X, y):
+        sleep(60)
+        return self
+
+
+def test_evaluation_pool_2():
+    """Assert that EvaluationPool kills a worker running past the time limit and replaces it."""
+    tpot_obj = TPOTClassifier(n_jobs=2, random_state=42, config_dict='TPOT light')
+    sklearn_pipeline = tpot_obj._toolbox.compile(expr=creator.Individual.from_string('GaussianNB(input_matrix)', tpot_obj._pset))
+    cv_iter = list(GroupKFold(n_splits=3).split(training_features, training_target, np.arange(training_target.shape[0]) % 3))
+
+    pool = EvaluationPool(2, training_features, training_target, cv_iter, 'accuracy')
+    try:
+        start_time = datetime.now()
+        pool.submit('sleeping', (make_pipeline(SleepingClassifier()), 0, 1))
+        pool.submit('normal', (sklearn_pipeline, 0, 300))
+        results = dict(pool.get_result()[:2] for _ in range(2))
+        assert (datetime.now() - start_time).total_seconds() < 30
+        assert_equal(results['sleeping'], "Timeout")
+        assert results['normal'] > 0
+
+        # The killed worker was replaced
+        fold_scores = pool.map([(sklearn_pipeline, fold_idx, 300) for fold_idx in range(3)])
+        assert all(process.is_alive() for process in pool._processes)
+    finally:
+        pool.close()
+
+    known_scores = cross_val_score(sklearn_pipeline, training_features, training_target, cv=cv_iter, scoring='accuracy')
+    assert np.allclose(known_scores, fold_scores)
+
+
+class FoldFailingClassifier(BaseEstimator, ClassifierMixin):
+    """Classifier that fails on the training sets of a given size and never finishes fitting on the others."""
+
+    def __init__(self, fail_n_samples=0):
+        self.fail_n_samples = fail_n_samples
+
+    def fit(self, X, y):
+        if X.shape[0] == self.fail_n_samples:
+            raise ValueError('Failing on purpose')
+        sleep(60)
+        return self
+
+
+def test_evaluation_pool_3():
+    """Assert that the folds of an evaluation dropped after a failed fold are cancelled in the EvaluationPool."""
+    n_samples = training_target.shape[0]
+    indices = np.arange(n_samples)
+    # The training set of the first fold is the only one with n_samples // 3 samples
+    cv = [(indices[:n_samples // 3], indices[n_samples // 3:]),
+          (indices[n_samples // 3:], indices[:n_samples // 3]),
+          (indices[n_samples // 4:], indices[:n_samples // 4])]
+    tpot_obj = TPOTClassifier(n_jobs=2, cv=cv, random_state=42, verbosity=0, config_dict='TPOT light')
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    sklearn_pipeline = tpot_obj._toolbox.compile(expr=creator.Individual.from_string('GaussianNB(input_matrix)', tpot_obj._pset))
+
+    tpot_obj._setup_evaluation_pool(training_features, training_target)
+    pool = tpot_obj._evaluation_pool
+    try:
+        start_time = datetime.now()
+        key = tpot_obj._submit_fold_tasks(make_pipeline(FoldFailingClassifier(fail_n_samples=n_samples // 3)), None)
+        received_key = None
+        while received_key != key:
+            received_key, val, _ = tpot_obj._receive_fold_result()
+        assert_equal(val, -float('inf'))
+
+        # The running and queued folds of the failed pipeline are gone
+        assert_equal(pool.n_pending, 0)
+        assert_equal(len(pool._tasks), 0)
+        assert all(running is None for running in pool._running)
+
+        fold_scores = pool.map([(sklearn_pipeline, fold_idx, 300) for fold_idx in range(3)])
+        fitted_pipeline, = pool.fit_pipelines([sklearn_pipeline], 300)
+        assert (datetime.now() - start_time).total_seconds() < 30
+        assert all(process.is_alive() for process in pool._processes)
+    finally:
+        tpot_obj._close_evaluation_pool()
+
+    known_scores = cross_val_score(sklearn_pipeline, training_features, training_target, cv=cv, scoring='accuracy')
+    assert np.allclose(known_scores, fold_scores)
+    assert hasattr(fitted_pipeline, 'predict')
+
+
+def test_evaluation_cache():
+    """Assert that EvaluationCache stores evaluations per evaluation context and evicts the least recently used ones."""
+    cachedir = mkdtemp()
+    try:
+        cache = EvaluationCache(cachedir)
+        cv_iter = list(GroupKFold(n_splits=3).split(training_features, training_target, np.arange(training_target.shape[0]) % 3))
+        cache.set_context(training_features, training_target, cv_iter, 'accuracy')
+        assert cache.get('GaussianNB(input_matrix)') is None
+
+        cache.put('GaussianNB(input_matrix)', {'operator_count': 1, 'internal_cv_score': 0.9})
+        assert_equal(cache.get('GaussianNB(input_matrix)'), {'operator_count': 1, 'internal_cv_score': 0.9})
+
+        # Equivalent pipelines share their evaluation
+        cache.put('GaussianNB(CombineDFs(input_matrix, StandardScaler(input_matrix)))',
+                  {'operator_count': 2, 'internal_cv_score': 0.8})
+        assert_equal(cache.get('GaussianNB(CombineDFs(StandardScaler(input_matrix), input_matrix))'),
+                     {'operator_count': 2, 'internal_cv_score': 0.8})
+
+        # Another TPOT run with the same data shares the evaluations, but not a run with another scoring function
+        assert_equal(EvaluationCache(cachedir).get('GaussianNB(input_matrix)'), None)
+        other_cache = EvaluationCache(cachedir)
+        other_cache.set_context(training_features, training_target, cv_iter, 'accuracy')
+        assert_equal(other_cache.get('GaussianNB(input_matrix)'), {'operator_count': 1, 'internal_cv_score': 0.9})
+        other_cache.set_context(training_features, training_target, cv_iter, 'f1_macro')
+        assert other_cache.get('GaussianNB(input_matrix)') is None
+        # Nor a run with another random state or another version of TPOT
+        other_cache.set_context(training_features, training_target, cv_iter, 'accuracy', random_state=42)
+        assert other_cache.get('GaussianNB(input_matrix)') is None
+        tpot_version = cache_utils.__version__
+        cache_utils.__version__ = 'other'
+        try:
+            other_cache.set_context(training_features, training_target, cv_iter, 'accuracy')
+        finally:
+            cache_utils.__version__ = tpot_version
+        assert other_cache.get('GaussianNB(input_matrix)') is None
+
+        cache.max_bytes = 0
+        cache.evict()
+        assert cache.get('GaussianNB(input_matrix)') is None
+    finally:
+        rmtree(cachedir)
+
+
+def test_evaluation_cache_2():
+    """Assert that _preprocess_individuals uses the scores stored by a previous TPOT run in the evaluation cache."""
+    cachedir = mkdtemp()
+    try:
+        pipeline_string = 'GaussianNB(input_matrix)'
+        tpot_obj = TPOTClassifier(random_state=42, config_dict='TPOT light', evaluation_cache=cachedir, verbosity=0)
+        tpot_obj._setup_evaluation_cache(training_features, training_target)
+        tpot_obj._evaluation_cache.put(pipeline_string, {'operator_count': 1, 'internal_cv_score': 0.9})
+
+        tpot_obj._pbar = tqdm(total=1, disable=True)
+        individual = creator.Individual.from_string(pipeline_string, tpot_obj._pset)
+        initialize_stats_dict(individual)
+        operator_counts, eval_individuals_str, sklearn_pipeline_list, stats_dicts = \
+            tpot_obj._preprocess_individuals([individual])
+
+        assert_equal(eval_individuals_str, [])
+        assert_equal(tpot_obj.evaluated_individuals_[pipeline_string]['internal_cv_score'], 0.9)
+    finally:
+        rmtree(cachedir)
+
+
+def test_prefix_cache():
+    """Assert that _wrapped_cross_val_score reuses the cached outputs of a shared pipeline prefix."""
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.decomposition import PCA
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.tree import DecisionTreeClassifier
+
+    prefix_cache = PrefixCache(50 * 2 ** 20)
+    pipeline_1 = make_pipeline(StandardScaler(), PCA(n_components=5, random_state=42), GaussianNB())
+    pipeline_2 = make_pipeline(StandardScaler(), PCA(n_components=5, random_state=42),
+                               DecisionTreeClassifier(random_state=42))
+    scores = []
+    for pipeline in [pipeline_1, pipeline_2]:
+        score = _wrapped_cross_val_score(pipeline, training_features, training_target, cv=3,
+                                         scoring_function='accuracy', prefix_cache=prefix_cache, cv_key='cv')
+        assert np.allclose(score, cross_val_score(pipeline, training_features, training_target, cv=3).mean())
+        scores.append(score)
+
+    # Each fold of the second pipeline reuses the output of StandardScaler -> PCA
+    assert_equal(prefix_cache.hits, 3)
+    assert_equal(prefix_cache.misses, 3)
+    assert_equal(len(prefix_cache), 6)
+    assert prefix_cache.n_bytes <= prefix_cache.max_bytes
+
+
+def test_prefix_cache_2():
+    """Assert that PrefixCache evicts the least recently used outputs beyond its size."""
+    entry = (np.zeros((10, 10)), np.zeros((5, 10)), 0., 0., 0)
+    prefix_cache = PrefixCache(2 * 1200)
+    prefix_cache.put('StandardScaler(); ', 0, entry)
+    prefix_cache.put('StandardScaler(); ', 1, entry)
+    assert_equal(prefix_cache.longest_prefix(['StandardScaler(); '], 0)[0], 1)
+    prefix_cache.put('StandardScaler(); ', 2, entry)
+
+    assert_equal(len(prefix_cache), 2)
+    assert_equal(prefix_cache.longest_prefix(['StandardScaler(); '], 1), (0, None))
+    assert_equal(prefix_cache.longest_prefix(['StandardScaler(); ', 'StandardScaler(); PCA(); '], 2)[0], 1)
+    # Outputs larger than the whole cache are not stored
+    prefix_cache.put('PCA(); ', 0, (np.zeros((100, 10)), np.zeros((5, 10)), 0., 0., 0))
+    assert_equal(len(prefix_cache), 2)
+
+
+def test_prefix_cache_3():
+    """Assert that the selectors with different thresholds reuse the cached column statistics of their input."""
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.feature_selection import SelectPercentile, SelectFwe, VarianceThreshold, f_classif
+    from sklearn.naive_bayes import GaussianNB
+
+    prefix_cache = PrefixCache(50 * 2 ** 20)
+    pipelines = [
+        make_pipeline(StandardScaler(), SelectPercentile(f_classif, percentile=10), GaussianNB()),
+        make_pipeline(StandardScaler(), SelectPercentile(f_classif, percentile=50), GaussianNB()),
+        make_pipeline(StandardScaler(), SelectFwe(f_classif, alpha=0.01), GaussianNB()),
+        make_pipeline(VarianceThreshold(threshold=0.1), GaussianNB()),
+        make_pipeline(VarianceThreshold(threshold=10.), GaussianNB())
+    ]
+    for pipeline in pipelines:
+        score = _wrapped_cross_val_score(pipeline, training_features, training_target, cv=3,
+                                         scoring_function='accuracy', prefix_cache=prefix_cache, cv_key='cv')
+        assert np.allclose(score, cross_val_score(pipeline, training_features, training_target, cv=3).mean())
+
+    # The f_classif scores and the variances are computed once per fold
+    assert prefix_cache.get_statistics('StandardScaler(copy=True, with_mean=True, with_std=True); '
+                                       'UnivariateStatistics(score_func=sklearn.feature_selection.univariate_selection.f_classif)',
+                                       ('cv', 0)) is not None
+    assert prefix_cache.get_statistics('Variances()', ('cv', 2)) is not None
+    assert prefix_cache.get_statistics('Variances()', ('cv', 3)) is None
+
+
+def test_prefix_cache_4():
+    """Assert that the decompositions are derived from a cached fit at least as accurate of the same input."""
+    from sklearn.decomposition import PCA
+    from sklearn.naive_bayes import GaussianNB
+
+    prefix_cache = PrefixCache(0, 50 * 2 ** 20)
+    accurate_pipeline = make_pipeline(PCA(svd_solver='randomized', iterated_power=10, random_state=42), GaussianNB())
+    _wrapped_cross_val_score(accurate_pipeline, training_features, training_target, cv=3,
+                             scoring_function='accuracy', prefix_cache=prefix_cache, cv_key='cv')
+    pipeline = make_pipeline(PCA(svd_solver='randomized', iterated_power=3, random_state=42), GaussianNB())
+    score = _wrapped_cross_val_score(pipeline, training_features, training_target, cv=3,
+                                     scoring_function='accuracy', prefix_cache=prefix_cache, cv_key='cv')
+    assert np.allclose(score, cross_val_score(accurate_pipeline, training_features, training_target, cv=3).mean())
+    assert_equal(len(prefix_cache.get_decompositions(_decomposition_key(pipeline.steps[0][1]), ('cv', 0))), 1)
+
+    # A PCA with fewer components is truncated from a cached full SVD
+    for n_components in [10, 5]:
+        pipeline = make_pipeline(PCA(n_components=n_components, svd_solver='full'), GaussianNB())
+        score = _wrapped_cross_val_score(pipeline, training_features, training_target, cv=3,
+                                         scoring_function='accuracy', prefix_cache=prefix_cache, cv_key='cv')
+        assert np.allclose(score, cross_val_score(pipeline, training_features, training_target, cv=3).mean())
+    assert_equal(len(prefix_cache.get_decompositions(_decomposition_key(pipeline.steps[0][1]), ('cv', 0))), 1)
+    assert prefix_cache.n_decomposition_bytes <= prefix_cache.decomposition_bytes
+    assert_equal(len(prefix_cache), 0)
+
+
+def test_prefix_cache_5():
+    """Assert that a PCA with fewer components is derived from a cached fit without singular_values_ (scikit-learn 0.18)."""
+    from sklearn.decomposition import PCA
+
+    decomposition = PCA(n_components=10, svd_solver='full').fit(training_features)
+    if hasattr(decomposition, 'singular_values_'):
+        del decomposition.singular_values_
+    transformer = PCA(n_components=5, svd_solver='full')
+
+    assert _derive_decomposition(transformer, decomposition, min(training_features.shape))
+    assert not hasattr(transformer, 'singular_values_')
+    assert_equal(transformer.n_components_, 5)
+    expected = PCA(n_components=5, svd_solver='full').fit(training_features)
+    assert np.allclose(np.abs(transformer.transform(training_features)), np.abs(expected.transform(training_features)))
+
+
+def test_prefix_cache_6():
+    """Assert that a selector fitted from the cached column statistics matches a fresh fit."""
+    from sklearn.feature_selection import SelectPercentile, SelectFwe, f_classif
+
+    prefix_cache = PrefixCache(50 * 2 ** 20)
+    statistics_key = 'UnivariateStatistics(score_func=sklearn.feature_selection.univariate_selection.f_classif)'
+    assert_equal(_fit_selector(SelectPercentile(f_classif, percentile=50), training_features, training_target,
+                               prefix_cache, statistics_key, 0), 0.)
+
+    for selector in [SelectPercentile(f_classif, percentile=20), SelectFwe(f_classif, alpha=0.01)]:
+        expected = clone(selector).fit(training_features, training_target)
+        _fit_selector(selector, training_features, training_target, prefix_cache, statistics_key, 0)
+        assert np.allclose(selector.scores_, expected.scores_, equal_nan=True)
+        assert np.allclose(selector.pvalues_, expected.pvalues_, equal_nan=True)
+        assert np.array_equal(selector.get_support(), expected.get_support())
+
+
+def test_prefix_cache_7():
+    """Assert that a PCA truncated from a cached fit has the noise variance and the likelihood of a fresh fit."""
+    from sklearn.decomposition import PCA
+
+    decomposition = PCA(n_components=20, svd_solver='full').fit(training_features)
+    transformer = PCA(n_components=5, svd_solver='full')
+    assert _derive_decomposition(transformer, decomposition, min(training_features.shape))
+
+    expected = PCA(n_components=5, svd_solver='full').fit(training_features)
+    assert np.allclose(transformer.noise_variance_, expected.noise_variance_)
+    assert np.allclose(transformer.get_covariance(), expected.get_covariance())
+    assert np.allclose(transformer.score(testing_features), expected.score(testing_features))
+
+
+def test_tpot_memory():
+    """Assert that TPOTMemory reuses the cached transformer outputs of each fold and evicts them beyond max_bytes."""
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.naive_bayes import GaussianNB
+
+    cachedir = mkdtemp()
+    try:
+        memory = TPOTMemory(cachedir, max_bytes=1)
+        memory.set_data(training_features, training_target)
+        pipeline = make_pipeline(StandardScaler(), GaussianNB())
+        pipeline.memory = memory
+
+        scores = [_wrapped_cross_val_score(pipeline, training_features, training_target, cv=3,
+                                           scoring_function='accuracy') for _ in range(2)]
+        assert_equal(scores[0], scores[1])
+        assert_equal(memory.misses, 3)
+        assert_equal(memory.hits, 3)
+        assert_equal(len([f for f in os.listdir(memory._outputdir) if f.endswith('.pkl')]), 3)
+
+        memory.evict()
+        assert_equal(len([f for f in os.listdir(memory._outputdir) if f.endswith('.pkl')]), 0)
+    finally:
+        rmtree(cachedir)
+
+
+def test_tpot_memory_2():
+    """Assert that the TPOTMemory statistics of the main process add up the cache hits and misses of the workers."""
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.naive_bayes import GaussianNB
+
+    cachedir = mkdtemp()
+    try:
+        memory = TPOTMemory(cachedir)
+        memory.set_data(training_features, training_target)
+        pipeline = make_pipeline(StandardScaler(), GaussianNB())
+        pipeline.memory = memory
+        cv_iter = list(GroupKFold(n_splits=3).split(training_features, training_target, np.arange(training_target.shape[0]) % 3))
+
+        pool = EvaluationPool(2, training_features, training_target, cv_iter, 'accuracy')
+        try:
+            scores = [pool.map([(pipeline, fold_idx, 300) for fold_idx in range(3)]) for _ in range(2)]
+        finally:
+            pool.close()
+
+        assert np.allclose(scores[0], scores[1])
+        assert_equal(memory.misses, 3)
+        assert_equal(memory.hits, 3)
+    finally:
+        rmtree(cachedir)
+
+
+def test_materialize_folds():
+    """Assert that the CV folds split once by fit() and their read-only buffers give the same scores."""
+    tpot_obj = TPOTClassifier(random_state=42, cv=3, materialize_folds=True, config_dict='TPOT light')
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    individual = creator.Individual.from_string('GaussianNB(input_matrix)', tpot_obj._pset)
+    initialize_stats_dict(individual)
+    fitness, = tpot_obj._evaluate_individuals([individual], training_features, training_target)
+
+    tpot_obj.evaluated_individuals_ = {}
+    tpot_obj._setup_cv_folds(training_features, training_target)
+    assert_equal(len(tpot_obj._cv_iter), 3)
+    assert_equal(len(tpot_obj._fold_buffers), 3)
+    for (train, test), (X_train, y_train, X_test, y_test) in zip(tpot_obj._cv_iter, tpot_obj._fold_buffers):
+        assert np.array_equal(X_train, training_features[train])
+        assert np.array_equal(y_test, training_target[test])
+        assert not X_train.flags.writeable
+    fitness_2, = tpot_obj._evaluate_individuals([individual], training_features, training_target)
+
+    assert np.allclose(fitness[1], fitness_2[1])
+
+
+def test_pretest_memo():
+    """Assert that _pretest_fit rejects the pipelines starting with a prefix that failed and saves the memo."""
+    from sklearn.cluster import FeatureAgglomeration
+    from sklearn.naive_bayes import GaussianNB, BernoulliNB
+
+    memo = PretestMemo(context='test')
+    # The ward linkage only supports the euclidean affinity
+    bad_step = FeatureAgglomeration(linkage='ward', affinity='manhattan')
+    assert_raises(ValueError, _pretest_fit, make_pipeline(bad_step, GaussianNB()), pretest_X, pretest_y, memo)
+    assert_equal(len(memo.failed), 1)
+
+    # Any pipeline starting with the failing step is rejected without being fitted
+    other_pipeline = make_pipeline(FeatureAgglomeration(linkage='ward', affinity='manhattan'), BernoulliNB())
+    assert_raises(ValueError, _pretest_fit, other_pipeline, pretest_X, pretest_y, memo)
+    assert not hasattr(other_pipeline.steps[-1][1], 'classes_')
+
+    _pretest_fit(make_pipeline(GaussianNB()), pretest_X, pretest_y, memo)
+    assert_equal(len(memo.passed), 1)
+
+    memo_dir = mkdtemp()
+    try:
+        memo_path = os.path.join(memo_dir, 'pretest.pkl')
+        memo.save(memo_path)
+        loaded_memo = PretestMemo(context='test')
+        loaded_memo.load(memo_path)
+        assert_equal(loaded_memo.failed, memo.failed)
+        assert_equal(loaded_memo.passed, memo.passed)
+        # The outcomes of another context are not loaded
+        other_memo = PretestMemo(context='other')
+        other_memo.load(memo_path)
+        assert_equal(len(other_memo.failed), 0)
+    finally:
+        rmtree(memo_dir)
+
+
 def test_update_pbar():
     """Assert that _update_pbar updates self._pbar with printing correct warning message."""
     tpot_obj = TPOTClassifier(
@@ -1610,6 +2644,92 @@ def test_PolynomialFeatures_exception():
     assert np.allclose(known_scores, fitness_scores)
 
 
+def test_infer_pipeline_shape():
+    """Assert that infer_pipeline_shape() propagates the shape of the input through the operators and CombineDFs."""
+    from sklearn.preprocessing import PolynomialFeatures
+
+    tpot_obj = TPOTClassifier()
+    n_samples, n_features, density, is_sparse = data_shape(training_features)
+    individual = creator.Individual.from_string(
+        'LogisticRegression(PolynomialFeatures'
+        '(input_matrix, PolynomialFeatures__degree=2, PolynomialFeatures__include_bias=False, '
+        'PolynomialFeatures__interaction_only=False), LogisticRegression__C=10.0, '
+        'LogisticRegression__dual=False, LogisticRegression__penalty=l2)',
+        tpot_obj._pset
+    )
+    shape = infer_pipeline_shape(expr_to_tree(individual, tpot_obj._pset), tpot_obj.operators,
+                                 n_samples, n_features, density, is_sparse)
+    n_polynomial_features = PolynomialFeatures(include_bias=False).fit(training_features).n_output_features_
+    assert_equal(shape['n_features'], n_polynomial_features)
+    assert_equal(shape['degree'], 2)
+    assert_equal(shape['peak_bytes'], n_samples * n_polynomial_features * 8)
+
+    individual = creator.Individual.from_string(
+        'GaussianNB(CombineDFs(Binarizer(input_matrix, Binarizer__threshold=0.5), input_matrix))',
+        tpot_obj._pset
+    )
+    shape = infer_pipeline_shape(expr_to_tree(individual, tpot_obj._pset), tpot_obj.operators,
+                                 n_samples, n_features, 0.1, True)
+    assert_equal(shape['n_features'], 2 * n_features)
+    assert np.allclose(shape['density'], 0.1)
+    assert_equal(shape['degree'], 1)
+
+
+def test_PolynomialFeatures_exception_2():
+    """Assert that TPOT skips the pipelines whose predicted intermediate samples exceed max_pipeline_mb."""
+    pipeline_string = (
+        'LogisticRegression(PolynomialFeatures'
+        '(input_matrix, PolynomialFeatures__degree=2, PolynomialFeatures__include_bias=False, '
+        'PolynomialFeatures__interaction_only=False), LogisticRegression__C=10.0, '
+        'LogisticRegression__dual=False, LogisticRegression__penalty=l2)'
+    )
+    for max_pipeline_mb, n_evaluated in [(None, 1), (100, 1), (1, 0)]:
+        tpot_obj = TPOTClassifier(max_pipeline_mb=max_pipeline_mb)
+        tpot_obj._pbar = tqdm(total=1, disable=True)
+        tpot_obj._input_shape = data_shape(training_features)
+        tpot_obj._n_classes = len(np.unique(training_target))
+        individual = creator.Individual.from_string(pipeline_string, tpot_obj._pset)
+        initialize_stats_dict(individual)
+        _, eval_individuals_str, _, _ = tpot_obj._preprocess_individuals([individual])
+        assert_equal(len(eval_individuals_str), n_evaluated)
+
+
+def test_PolynomialFeatures_exception_3():
+    """Assert that TPOT skips the pipelines whose predicted fit cost exceeds max_pipeline_fit_cost."""
+    pipeline_string = (
+        'LogisticRegression(PolynomialFeatures'
+        '(input_matrix, PolynomialFeatures__degree=2, PolynomialFeatures__include_bias=False, '
+        'PolynomialFeatures__interaction_only=False), LogisticRegression__C=10.0, '
+        'LogisticRegression__dual=False, LogisticRegression__penalty=l2)'
+    )
+    # The pipeline reads and outputs about 70 times the values of the training set
+    for max_pipeline_fit_cost, n_evaluated in [(None, 1), (100, 1), (10, 0)]:
+        tpot_obj = TPOTClassifier(max_pipeline_fit_cost=max_pipeline_fit_cost)
+        tpot_obj._pbar = tqdm(total=1, disable=True)
+        tpot_obj._input_shape = data_shape(training_features)
+        tpot_obj._n_classes = len(np.unique(training_target))
+        individual = creator.Individual.from_string(pipeline_string, tpot_obj._pset)
+        initialize_stats_dict(individual)
+        _, eval_individuals_str, _, _ = tpot_obj._preprocess_individuals([individual])
+        assert_equal(len(eval_individuals_str), n_evaluated)
+
+
+def test_PolynomialFeatures_exception_4():
+    """Assert that TPOT allows PolynomialFeatures in separate branches of a CombineDFs, since their degrees do not multiply."""
+    polynomial_features = ('PolynomialFeatures(input_matrix, PolynomialFeatures__degree=2, '
+                           'PolynomialFeatures__include_bias=False, PolynomialFeatures__interaction_only=False)')
+    pipeline_string = (
+        'LogisticRegression(CombineDFs({0}, {0}), LogisticRegression__C=10.0, '
+        'LogisticRegression__dual=False, LogisticRegression__penalty=l2)'.format(polynomial_features)
+    )
+    tpot_obj = TPOTClassifier()
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    individual = creator.Individual.from_string(pipeline_string, tpot_obj._pset)
+    initialize_stats_dict(individual)
+    _, eval_individuals_str, _, _ = tpot_obj._preprocess_individuals([individual])
+    assert_equal(eval_individuals_str, [str(individual)])
+
+
 def test_pick_two_individuals_eligible_for_crossover():
     """Assert that pick_two_individuals_eligible_for_crossover() picks the correct pair of nodes to perform crossover with"""
     tpot_obj = TPOTClassifier()
@@ -1675,6 +2795,165 @@ def test_pick_two_individuals_eligible_for_crossover_bad():
     assert pick1 is None and pick2 is None
 
 
+def test_crossover_index():
+    """Assert that CrossoverIndex samples only the pairs of individuals eligible for crossover."""
+    tpot_obj = TPOTClassifier()
+    ind1 = creator.Individual.from_string(
+        'BernoulliNB(input_matrix, BernoulliNB__alpha=1.0, BernoulliNB__fit_prior=True)',
+        tpot_obj._pset
+    )
+    ind2 = creator.Individual.from_string(
+        'BernoulliNB(input_matrix, BernoulliNB__alpha=10.0, BernoulliNB__fit_prior=True)',
+        tpot_obj._pset
+    )
+    ind3 = creator.Individual.from_string(
+        'GaussianNB(input_matrix)',
+        tpot_obj._pset
+    )
+    ind4 = creator.Individual.from_string(
+        'KNeighborsClassifier('
+        'BernoulliNB(input_matrix, BernoulliNB__alpha=10.0, BernoulliNB__fit_prior=True),'
+        'KNeighborsClassifier__n_neighbors=10, '
+        'KNeighborsClassifier__p=1, '
+        'KNeighborsClassifier__weights=uniform'
+        ')',
+        tpot_obj._pset
+    )
+
+    crossover_index = CrossoverIndex([ind1, ind2, ind3, ind4])
+    eligible_pairs = set(
+        [(str(ind1), str(ind2)), (str(ind1), str(ind4)), (str(ind2), str(ind4))]
+    )
+    for _ in range(50):
+        pick1, pick2 = crossover_index.sample()
+        assert ((str(pick1), str(pick2)) in eligible_pairs or
+                (str(pick2), str(pick1)) in eligible_pairs)
+
+    # Only equivalent individuals share a primitive
+    crossover_index = CrossoverIndex([ind1, tpot_obj._toolbox.clone(ind1), ind3])
+    assert_equal(crossover_index.sample(), (None, None))
+
+
+def test_crossover_index_2():
+    """Assert that CrossoverIndex samples the same pairs as enumerating all the eligible pairs."""
+    tpot_obj = TPOTClassifier()
+    population = [
+        creator.Individual.from_string(pipeline_string, tpot_obj._pset) for pipeline_string in [
+            'BernoulliNB(input_matrix, BernoulliNB__alpha=1.0, BernoulliNB__fit_prior=True)',
+            'BernoulliNB(input_matrix, BernoulliNB__alpha=10.0, BernoulliNB__fit_prior=True)',
+            'BernoulliNB(MinMaxScaler(input_matrix), BernoulliNB__alpha=1.0, BernoulliNB__fit_prior=True)',
+            'GaussianNB(MinMaxScaler(input_matrix))',
+            'GaussianNB(input_matrix)',
+            'GaussianNB(input_matrix)',
+            'DecisionTreeClassifier(input_matrix, DecisionTreeClassifier__criterion=gini, '
+            'DecisionTreeClassifier__max_depth=3, DecisionTreeClassifier__min_samples_leaf=1, '
+            'DecisionTreeClassifier__min_samples_split=2)'
+        ]
+    ]
+    # Pairing of the previous versions of TPOT, in O(n^2) for each crossover
+    primitives_by_ind = [set([node.name for node in ind if isinstance(node, gp.Primitive)]) for ind in population]
+    expected_pairs = set((str(ind1), str(ind2)) for i, ind1 in enumerate(population)
+                         for j, ind2 in enumerate(population)
+                         if i != j and not primitives_by_ind[i].isdisjoint(primitives_by_ind[j]) and
+                         str(ind1) != str(ind2))
+
+    np.random.seed(42)
+    crossover_index = CrossoverIndex(population)
+    sampled_pairs = set()
+    for _ in range(500):
+        pick1, pick2 = crossover_index.sample()
+        sampled_pairs.add((str(pick1), str(pick2)))
+
+    assert_equal(sampled_pairs, expected_pairs)
+
+
+@attr('slow')
+def test_crossover_index_3():
+    """Assert that CrossoverIndex picks the crossover pairs of a generation faster than enumerating all the pairs."""
+    from timeit import default_timer
+
+    def pick_from_all_pairs(population):
+        # Pairing of the previous versions of TPOT, in O(n^2) for each crossover
+        primitives_by_ind = [set([node.name for node in ind if isinstance(node, gp.Primitive)])
+                             for ind in population]
+        pop_as_str = [str(ind) for ind in population]
+        eligible_pairs = [(i, i + 1 + j) for i, ind1_prims in enumerate(primitives_by_ind)
+                          for j, ind2_prims in enumerate(primitives_by_ind[i + 1:])
+                          if not ind1_prims.isdisjoint(ind2_prims) and pop_as_str[i] != pop_as_str[i + 1 + j]]
+        eligible_pairs += [(j, i) for (i, j) in eligible_pairs]
+        idx1, idx2 = eligible_pairs[np.random.randint(0, len(eligible_pairs))]
+        return population[idx1], population[idx2]
+
+    tpot_obj = TPOTClassifier()
+    population = [
+        creator.Individual.from_string(
+            'BernoulliNB(input_matrix, BernoulliNB__alpha={}, BernoulliNB__fit_prior={})'.format(alpha, fit_prior),
+            tpot_obj._pset
+        )
+        for alpha in [0.001, 0.01, 0.1, 1.0, 10.0, 100.0] for fit_prior in [True, False]
+    ] * 25
+    n_crossovers = 10
+
+    start_time = default_timer()
+    for _ in range(n_crossovers):
+        pick_from_all_pairs(population)
+    all_pairs_time = default_timer() - start_time
+
+    start_time = default_timer()
+    crossover_index = CrossoverIndex(population)
+    for _ in range(n_crossovers):
+        pick1, pick2 = crossover_index.sample()
+        assert str(pick1) != str(pick2)
+    index_time = default_timer() - start_time
+
+    assert index_time < all_pairs_time
+
+
+def test_canonical_pipeline_key():
+    """Assert that canonical_pipeline_key() gives the same form to equivalent pipelines."""
+    assert_equal(
+        canonical_pipeline_key('GaussianNB(CombineDFs(MinMaxScaler(input_matrix), input_matrix))'),
+        canonical_pipeline_key('GaussianNB(CombineDFs(input_matrix, MinMaxScaler(input_matrix)))')
+    )
+    assert_equal(
+        canonical_pipeline_key('Nystroem(input_matrix, Nystroem__gamma=0.1, Nystroem__kernel=linear, '
+                               'Nystroem__n_components=5)'),
+        'Nystroem(input_matrix, Nystroem__kernel=linear, Nystroem__n_components=5)'
+    )
+    # gamma is a parameter of the rbf kernel
+    assert canonical_pipeline_key(
+        'Nystroem(input_matrix, Nystroem__gamma=0.1, Nystroem__kernel=rbf, Nystroem__n_components=5)'
+    ) != canonical_pipeline_key(
+        'Nystroem(input_matrix, Nystroem__gamma=0.2, Nystroem__kernel=rbf, Nystroem__n_components=5)'
+    )
+
+
+def test_canonical_pipeline_key_2():
+    """Assert that _evaluate_individuals evaluates only once the equivalent pipelines."""
+    tpot_obj = TPOTClassifier(random_state=42, config_dict='TPOT light', verbosity=0)
+    tpot_obj._pbar = tqdm(total=1, disable=True)
+    ind1 = creator.Individual.from_string(
+        'GaussianNB(CombineDFs(Binarizer(input_matrix, Binarizer__threshold=0.5), input_matrix))',
+        tpot_obj._pset
+    )
+    ind2 = creator.Individual.from_string(
+        'GaussianNB(CombineDFs(input_matrix, Binarizer(input_matrix, Binarizer__threshold=0.5)))',
+        tpot_obj._pset
+    )
+    initialize_stats_dict(ind1)
+    initialize_stats_dict(ind2)
+
+    operator_counts, eval_individuals_str, sklearn_pipeline_list, stats_dicts = \
+        tpot_obj._preprocess_individuals([ind1, ind2])
+    assert_equal(len(eval_individuals_str), 1)
+
+    fitness_scores = tpot_obj._evaluate_individuals([ind1, ind2], training_features, training_target)
+    assert_equal(fitness_scores[0], fitness_scores[1])
+    assert str(ind1) in tpot_obj.evaluated_individuals_
+    assert str(ind2) in tpot_obj.evaluated_individuals_
+    assert_equal(tpot_obj._evaluated_equivalent(str(ind2)), tpot_obj._evaluated_equivalent(str(ind1)))
+
+
 def test_mate_operator():
     """Assert that self._mate_operator returns offsprings as expected."""
     tpot_obj = TPOTClassifier()
@@ -30,7 +30,8 @@ import warnings
 import sys
 import imp
 from functools import partial
-from datetime import datetime
+import pickle
+from datetime import datetime, timedelta
 from multiprocessing import cpu_count
 import os
 import re
@@ -40,18 +41,26 @@ from tempfile import mkdtemp
 from shutil import rmtree
 
 import numpy as np
+import pandas as pd
 from scipy import sparse
 import deap
 from deap import base, creator, tools, gp
 from tqdm import tqdm
 from copy import copy, deepcopy
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
 
+import sklearn
 from sklearn.base import BaseEstimator
-from sklearn.utils import check_X_y
-from sklearn.externals.joblib import Parallel, delayed, Memory
+from sklearn.utils import check_X_y, indexable, safe_indexing
+from sklearn.externals.joblib import Memory
 from sklearn.pipeline import make_pipeline, make_union
 from sklearn.preprocessing import FunctionTransformer, Imputer
 from sklearn.model_selection import train_test_split
+from sklearn.model_selection._split import check_cv
 from sklearn.metrics.scorer import make_scorer, _BaseScorer
 
 from update_checker import update_check
@@ -71,7 +80,13 @@ from .config.classifier_sparse import classifier_config_sparse
 
 from .metrics import SCORERS
 from .gp_types import Output_Array
-from .gp_deap import eaMuPlusLambda, mutNodeReplacement, _wrapped_cross_val_score, cxOnePoint
+from .gp_deap import eaMuPlusLambda, eaSteadyState, mutNodeReplacement, _wrapped_cross_val_score, cxOnePoint
+from .gp_deap import _racing_upper_bound, _combine_fold_stats, canonical_pipeline_key
+from .gp_deap import _wrapped_group_cross_val_score, shared_fit_key
+from .parallel_utils import EvaluationPool
+from .cache_utils import EvaluationCache, PrefixCache, PretestMemo, TPOTMemory, _atomic_write, _dump_pickle
+from .surrogate import SurrogateModel
+from .shape_utils import MAX_FEATURE_DEGREE, data_shape, infer_pipeline_shape
 
 # hot patch for Windows: solve the problem of crashing python after Ctrl + C in Windows OS
 # https://github.com/ContinuumIO/anaconda-issues/issues/905
@@ -95,6 +110,72 @@ if sys.platform.startswith('win'):
     win32api.SetConsoleCtrlHandler(handler, 1)
 
 
+class _FittedPipelines(Mapping):
+    """Read-only mapping of the pipeline strings to pipelines fitted on the whole training set.
+
+    Each pipeline is fitted the first time it is accessed, the training set is
+    released once all the pipelines are fitted.
+    """
+
+    def __init__(self, pipelines, features, target, fitted_pipelines=None):
+        """Set up the mapping.
+
+        Parameters
+        ----------
+        pipelines: OrderedDict
+            Unfitted sklearn pipelines keyed by the string of their DEAP individual
+        features: array-like {n_samples, n_features}
+            Feature matrix
+        target: array-like {n_samples}
+            List of class labels for prediction
+        fitted_pipelines: dict, optional
+            Pipelines that are already fitted, keyed by the string of their DEAP individual
+
+        Returns
+        -------
+        None
+        """
+        self._pipelines = pipelines
+        self._fitted_pipelines = dict(fitted_pipelines or {})
+        self._features = features
+        self._target = target
+        self._release_data()
+
+    def _release_data(self):
+        if len(self._fitted_pipelines) == len(self._pipelines):
+            self._features = None
+            self._target = None
+
+    def __getitem__(self, pipeline_str):
+        if pipeline_str not in self._fitted_pipelines:
+            sklearn_pipeline = self._pipelines[pipeline_str]
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                sklearn_pipeline.fit(self._features, self._target)
+            self._fitted_pipelines[pipeline_str] = sklearn_pipeline
+            self._release_data()
+        return self._fitted_pipelines[pipeline_str]
+
+    def __iter__(self):
+        return iter(self._pipelines)
+
+    def __len__(self):
+        return len(self._pipelines)
+
+    def __contains__(self, pipeline_str):
+        return pipeline_str in self._pipelines
+
+    def fit_all(self):
+        """Fit all the pipelines that were not accessed yet."""
+        for pipeline_str in self._pipelines:
+            self[pipeline_str]
+
+    @property
+    def n_fitted(self):
+        """Number of pipelines fitted so far."""
+        return len(self._fitted_pipelines)
+
+
 class TPOTBase(BaseEstimator):
     """Automatically creates and optimizes machine learning pipelines using GP."""
 
@@ -105,7 +186,12 @@ class TPOTBase(BaseEstimator):
                  random_state=None, config_dict=None,
                  warm_start=False, memory=None,
                  periodic_checkpoint_folder=None, early_stop=None,
-                 verbosity=0, disable_update_check=False):
+                 racing=False, evaluation_cache=None,
+                 steady_state=False, cost_objective=None, surrogate_factor=None,
+                 fidelity_schedule=None, prefix_cache_mb=None, memory_max_mb=None,
+                 materialize_folds=False, pretest_memo=None, eager_pareto_front=False,
+                 regularization_path=False, batch_neighbors=False, decomposition_cache_mb=None,
+                 max_pipeline_mb=None, max_pipeline_fit_cost=None, verbosity=0, disable_update_check=False):
         """Set up the genetic programming algorithm for pipeline optimization.
 
         Parameters
@@ -178,6 +264,9 @@ class TPOTBase(BaseEstimator):
             How many minutes TPOT has to optimize a single pipeline.
             Setting this parameter to higher values will allow TPOT to explore more
             complex pipelines, but will also allow TPOT to run longer.
+            When n_jobs > 1, the limit still applies to the summed time of all the CV
+            folds of a pipeline, and the worker process of a fold running past the
+            time left to its pipeline is killed, which also stops fits stuck in native code.
         random_state: int, optional (default: None)
             Random number generator seed for TPOT. Use this parameter to make sure
             that TPOT will give you the same results each time you run it against the
@@ -212,6 +301,9 @@ class TPOTBase(BaseEstimator):
             String path of a caching directory
                 TPOT uses memory caching with the provided directory and TPOT does NOT clean
                 the caching directory up upon shutdown.
+            With a string, TPOT manages the cache itself: the training set is hashed once
+            per call to fit() instead of once per cached transformer, and the size of the
+            cache can be bounded with memory_max_mb.
             Memory object:
                 TPOT uses the instance of sklearn.external.joblib.Memory for memory caching,
                 and TPOT does NOT clean the caching directory up upon shutdown.
@@ -224,9 +316,147 @@ class TPOTBase(BaseEstimator):
                 Sudden death before tpot could save optimized pipeline
                 Track its progress
                 Grab pipelines while it's still optimizing
+            The complete state of the optimization is also saved after each generation
+            in tpot_checkpoint.pkl, from which fit() can resume with resume_from.
         early_stop: int or None (default: None)
             How many generations TPOT checks whether there is no improvement in optimization process.
             End optimization process if there is no improvement in the set number of generations.
+        racing: bool, optional (default: False)
+            Flag indicating whether TPOT should score the cross-validation folds of each
+            pipeline one by one and abandon the evaluation once a statistical upper bound
+            of its CV score shows that the pipeline is dominated by the current Pareto
+            front for its operator count. An abandoned pipeline gets a CV score of -inf,
+            and the mean score of its evaluated folds is recorded as racing_partial_score.
+        evaluation_cache: an EvaluationCache object or string, optional (default: None)
+            If supplied, the CV scores of the evaluated pipelines are stored on disk and
+            reused by later TPOT runs on the same training data, cross-validation folds
+            and scoring function, instead of evaluating these pipelines again.
+            String path of a caching directory
+                TPOT stores the evaluations in the provided directory, which can be shared
+                by several TPOT processes. The least recently used evaluations are removed
+                once the directory grows over 50 MB.
+            EvaluationCache object:
+                TPOT uses the instance of tpot.cache_utils.EvaluationCache, e.g. to set
+                another size limit.
+            None:
+                TPOT does not store the evaluations on disk.
+        steady_state: bool, optional (default: False)
+            Flag indicating whether TPOT should use a steady-state evolution instead of
+            evaluating whole generations. A new offspring is bred as soon as an evaluation
+            finishes and each evaluated offspring is inserted right away in the population
+            and the Pareto front, so that no CPU waits for the slowest pipeline of a
+            generation when n_jobs > 1. Generations are then counted every offspring_size
+            inserted offspring.
+        cost_objective: string or None, optional (default: None)
+            Runtime cost of the pipelines to minimize as a third objective of the
+            Pareto front, next to the number of operators and the CV score.
+            String 'fit_time':
+                Average fit time of the pipeline over the CV folds, in seconds.
+            String 'predict_latency':
+                Time to predict and score one row of the CV testing folds, in seconds.
+            None:
+                The Pareto front trades the CV score against the number of operators only.
+            Since the cost of a pipeline is only known once it is evaluated, racing
+            is disabled when a cost objective is set.
+        surrogate_factor: int or None, optional (default: None)
+            If supplied, TPOT breeds surrogate_factor times more offspring than
+            offspring_size in each generation, and a surrogate model trained on the
+            pipelines evaluated so far predicts their CV score and runtime from their
+            operators and parameters. Only the offspring_size most promising offspring
+            are evaluated, while the others are discarded. The surrogate is used once
+            10 pipelines were successfully evaluated.
+        fidelity_schedule: list of float or None, optional (default: None)
+            Increasing fractions of the training samples, e.g. [0.01, 0.1], used to
+            screen the offspring of each generation by successive halving. The offspring
+            are first cross-validated on a stratified subsample of the smallest fraction,
+            and only the better half of them is promoted to the next fraction. Only the
+            pipelines that survive the last fraction are cross-validated on the whole
+            training set. The other pipelines get a CV score of -inf in the current
+            generation, so that scores obtained on different subsamples are never
+            compared during the selection, and are left out of evaluated_individuals_,
+            so that they are screened again if they come back in a later generation.
+            The steady-state evolution evaluates the offspring one at a time, so the
+            fidelity schedule cannot be combined with steady_state=True.
+        prefix_cache_mb: int or None, optional (default: None)
+            If supplied, size in MB of an in-memory cache of the transformed samples
+            output by the fitted pipeline prefixes on each CV fold, e.g. StandardScaler
+            followed by PCA. The pipelines sharing a prefix with a previously evaluated
+            pipeline only fit their remaining steps. Unlike the memory parameter, the
+            training data is never hashed. The least recently used outputs are evicted
+            when the cache is full. When n_jobs > 1, each worker process has its own cache.
+            The column statistics of SelectPercentile, SelectFwe and VarianceThreshold
+            are cached on the same terms, the selectors with other thresholds reuse them.
+        memory_max_mb: int or None, optional (default: None)
+            If supplied, size in MB of the transformer outputs cached with memory='auto'
+            or a path string. The least recently used outputs are removed between
+            generations when the cache grows beyond it. By default, the size of the
+            cache is not limited. Has no effect when memory is a Memory object.
+        materialize_folds: boolean, optional (default: False)
+            If True, the training and testing samples of each CV fold are copied once
+            per call to fit() into read-only arrays shared by all the evaluations,
+            instead of being indexed from the training set for every fold of every
+            pipeline. This trades about cv times the size of the training set in memory
+            for the repeated allocations. A pipeline that modifies its input in place
+            fails on the read-only arrays.
+        pretest_memo: string or None, optional (default: None)
+            If supplied, path of a file where the outcomes of the pretests of new
+            pipelines on a small data set are saved at the end of fit() and loaded
+            at its start, so that they are shared between TPOT runs. The pipelines
+            starting with the steps of a pipeline that failed its pretest are
+            rejected without being fitted. Within a run, the outcomes are always memoized.
+        eager_pareto_front: boolean, optional (default: False)
+            If True, all the pipelines of the Pareto front are fitted on the whole
+            training set before fit() returns, in the worker processes when n_jobs > 1.
+            A fit in a worker is limited to max_eval_time_mins, the pipelines that run
+            past it are fitted in the main process instead. By default, each pipeline
+            of pareto_front_fitted_pipelines_ is fitted the first time it is accessed.
+        regularization_path: boolean, optional (default: False)
+            If True, the pipelines of a generation that only differ by the regularization
+            strength (C or alpha) of their final linear model, e.g. LogisticRegression,
+            LinearSVC, Lasso or ElasticNet, are evaluated together. On each CV fold,
+            their shared steps are fitted once and their final models are fitted from
+            the strongest to the weakest regularization, warm-started from the previous
+            solution for Lasso and ElasticNet. The liblinear models, LogisticRegression,
+            LinearSVC and LinearSVR, cannot warm start, so they only share the fits of
+            their preceding steps. The built-in configurations hold no Lasso or ElasticNet,
+            only ElasticNetCV and LassoLarsCV, which choose their alpha themselves, so
+            with them this option never warm starts and only shares the fits of the
+            preceding steps, as prefix_cache_mb does. The warm starts can slightly
+            change the CV scores. Racing does not apply to these pipelines. At most 3
+            pipelines are evaluated together, so that a group never runs for more than
+            3 times max_eval_time_mins.
+        batch_neighbors: boolean, optional (default: False)
+            If True, the pipelines of a generation that only differ by the n_neighbors
+            and weights of their final KNeighborsClassifier or KNeighborsRegressor are
+            evaluated together. On each CV fold, their shared steps are fitted once and
+            the neighbors of the testing samples are queried once for the largest
+            n_neighbors, each pipeline is scored from its first neighbors. Equally
+            distant neighbors can be ordered differently than in a query of their own.
+            Racing does not apply to these pipelines. At most 3 pipelines are evaluated
+            together, so that a group never runs for more than 3 times max_eval_time_mins.
+        decomposition_cache_mb: int or None, optional (default: None)
+            If supplied, size in MB of an in-memory cache of the PCA and FastICA fitted
+            on the output of each pipeline prefix on each CV fold. A PCA or FastICA that
+            only differs from a cached one by a lower accuracy (a smaller iterated_power
+            or a larger tol), or a PCA with fewer components, reuses the cached fit instead
+            of being fitted. The reused fits are more accurate than the ones they stand for,
+            which can slightly change the CV scores. The least recently used fits are evicted
+            when the cache is full. When n_jobs > 1, each worker process has its own cache.
+        max_pipeline_mb: int or None, optional (default: None)
+            If supplied, maximum size in MB of the intermediate samples of a pipeline
+            fitted on the training set. The shapes of the samples output by each step
+            are predicted from the shape and density of the training set before the
+            pipeline is evaluated, and the pipelines predicted over the budget are skipped
+            like invalid pipelines. Whatever the budget, the pipelines whose features are
+            polynomials of degree above 2 of the input features, e.g. PolynomialFeatures
+            applied twice, are skipped.
+        max_pipeline_fit_cost: float or None, optional (default: None)
+            If supplied, maximum rough cost of fitting a pipeline on the training set,
+            in multiples of the number of values of the training set. The cost of a
+            pipeline is predicted with the shapes of its samples, as the number of
+            values read and output by the fits of its steps, e.g. 1 for a classifier
+            alone and 3 for a scaler followed by a classifier. The pipelines predicted
+            over the budget are skipped like invalid pipelines.
         verbosity: int, optional (default: 0)
             How much information TPOT communicates while it's running.
             0 = none, 1 = minimal, 2 = high, 3 = all.
@@ -263,10 +493,77 @@ class TPOTBase(BaseEstimator):
         self.max_eval_time_seconds = max(int(self.max_eval_time_mins * 60), 1)
         self.periodic_checkpoint_folder = periodic_checkpoint_folder
         self.early_stop = early_stop
+        self.racing = racing
+        # Minimum number of CV folds scored before a pipeline can be abandoned in racing mode
+        self._racing_min_folds = 2
         self._last_optimized_pareto_front = None
         self._last_optimized_pareto_front_n_gens = 0
         self.memory = memory
         self._memory = None # initial Memory setting for sklearn pipeline
+        self._n_cv_folds = None
+        # Statistics of an evaluation that do not depend on the genealogy of the pipeline
+        self._cached_stats_keys = ['operator_count', 'internal_cv_score', 'fit_time', 'score_time',
+                                   'fold_times', 'peak_rss', 'model_size', 'predict_latency']
+        self._evaluation_pool = None # worker processes used when n_jobs > 1
+        self._n_evaluations_submitted = 0
+        self._fold_tasks = {} # state of the evaluations running in the evaluation pool
+        self._async_evaluations = {} # individuals evaluated in the background by the steady-state evolution
+        self._submitted_individuals = {}
+        self._finished_individuals = []
+        self.evaluation_cache = evaluation_cache
+        self.steady_state = steady_state
+        if cost_objective not in [None, 'fit_time', 'predict_latency']:
+            raise ValueError(
+                'The cost objective {} is not available. Please choose '
+                '\'fit_time\', \'predict_latency\' or None.'.format(cost_objective)
+            )
+        self.cost_objective = cost_objective
+        self.surrogate_factor = surrogate_factor
+        self._surrogate = None
+        if fidelity_schedule is not None:
+            fidelity_schedule = list(fidelity_schedule)
+            if (any(fraction <= 0.0 or fraction >= 1.0 for fraction in fidelity_schedule) or
+                    fidelity_schedule != sorted(set(fidelity_schedule))):
+                raise ValueError(
+                    'The fidelity schedule must hold increasing fractions of the training '
+                    'samples in the range (0.0, 1.0).'
+                )
+            if steady_state:
+                # The steady-state evolution evaluates the offspring one at a time, so
+                # there would be no pipelines to eliminate by successive halving
+                raise ValueError(
+                    'The fidelity schedule cannot be used with the steady-state evolution. '
+                    'Please set steady_state=False or fidelity_schedule=None.'
+                )
+        self.fidelity_schedule = fidelity_schedule
+        # Fraction of the pipelines promoted to the next fidelity
+        self._fidelity_promotion_rate = 0.5
+        # Pipelines evaluated together at most, since a group gets the sum of their time limits
+        self._max_fit_group_size = 3
+        self._fidelity_cv_iters = [] # (train, test) folds of each subsample of the fidelity schedule
+        self._fidelity_scores = {} # subsample scores of the pipelines promoted to their full evaluation
+        self.prefix_cache_mb = prefix_cache_mb
+        self.memory_max_mb = memory_max_mb
+        self.materialize_folds = materialize_folds
+        self.pretest_memo = pretest_memo
+        self.eager_pareto_front = eager_pareto_front
+        self.regularization_path = regularization_path
+        self.batch_neighbors = batch_neighbors
+        self.decomposition_cache_mb = decomposition_cache_mb
+        self.max_pipeline_mb = max_pipeline_mb
+        self.max_pipeline_fit_cost = max_pipeline_fit_cost
+        # The pretest outcomes depend on the pretest data set and on the library versions
+        self._pretest_memo = PretestMemo(context='{}-tpot{}-sklearn{}'.format(
+            'classification' if self.classification else 'regression', __version__, sklearn.__version__
+        ))
+        self._cv_iter = None # (train, test) folds split once per call to fit()
+        self._fold_buffers = None
+        self._scorer = None
+        self._input_shape = None # shape of the training set output by data_shape() during fit()
+        self._n_classes = None
+        self._prefix_cache = None
+        self._evaluation_cache = None
+        self.shared_memory_report_ = None
 
         # dont save periodic pipelines more often than this
         self._output_best_pipeline_period_seconds = 30
@@ -327,6 +624,10 @@ class TPOTBase(BaseEstimator):
         # Dictionary of individuals that have already been evaluated in previous
         # generations
         self.evaluated_individuals_ = {}
+        # Canonical forms of the evaluated individuals, used to find equivalent pipelines
+        self._canonical_keys = {}
+        self._canonical_index = {}
+        self._n_canonical_indexed = 0
         self.random_state = random_state
 
         self._setup_scoring_function(scoring)
@@ -490,12 +791,20 @@ class TPOTBase(BaseEstimator):
     def _setup_toolbox(self):
         with warnings.catch_warnings():
             warnings.simplefilter('ignore')
-            creator.create('FitnessMulti', base.Fitness, weights=(-1.0, 1.0))
-            creator.create('Individual', gp.PrimitiveTree, fitness=creator.FitnessMulti, statistics=dict)
+            if self.cost_objective is None:
+                creator.create('FitnessMulti', base.Fitness, weights=(-1.0, 1.0))
+                creator.create('Individual', gp.PrimitiveTree, fitness=creator.FitnessMulti, statistics=dict)
+                self._individual_class = creator.Individual
+            else:
+                # The runtime cost is minimized as a third objective, in classes of their own
+                # so that the TPOT objects without a cost objective keep two objectives
+                creator.create('FitnessMultiCost', base.Fitness, weights=(-1.0, 1.0, -1.0))
+                creator.create('IndividualCost', gp.PrimitiveTree, fitness=creator.FitnessMultiCost, statistics=dict)
+                self._individual_class = creator.IndividualCost
 
         self._toolbox = base.Toolbox()
         self._toolbox.register('expr', self._gen_grow_safe, pset=self._pset, min_=1, max_=3)
-        self._toolbox.register('individual', tools.initIterate, creator.Individual, self._toolbox.expr)
+        self._toolbox.register('individual', tools.initIterate, self._individual_class, self._toolbox.expr)
         self._toolbox.register('population', tools.initRepeat, list, self._toolbox.individual)
         self._toolbox.register('compile', self._compile_to_sklearn)
         self._toolbox.register('select', tools.selNSGA2)
@@ -503,7 +812,7 @@ class TPOTBase(BaseEstimator):
         self._toolbox.register('expr_mut', self._gen_grow_safe, min_=1, max_=4)
         self._toolbox.register('mutate', self._random_mutation_operator)
 
-    def fit(self, features, target, sample_weight=None, groups=None):
+    def fit(self, features, target, sample_weight=None, groups=None, resume_from=None):
         """Fit an optimized machine learning pipeline.
 
         Uses genetic programming to optimize a machine learning pipeline that
@@ -531,6 +840,11 @@ class TPOTBase(BaseEstimator):
             Group labels for the samples used when performing cross-validation.
             This parameter should only be used in conjunction with sklearn's Group cross-validation
             functions, such as sklearn.model_selection.GroupKFold
+        resume_from: path string, optional (default: None)
+            Path of a checkpoint written in periodic_checkpoint_folder by a previous call to
+            fit() on the same data with the same settings. The optimization continues from
+            the last generation saved in the checkpoint, with its population, Pareto front,
+            evaluated pipelines, random number generator states and elapsed time.
 
         Returns
         -------
@@ -538,6 +852,7 @@ class TPOTBase(BaseEstimator):
             Returns a copy of the fitted TPOT object
 
         """
+        checkpoint = self._read_checkpoint(resume_from) if resume_from is not None else None
         features = features.astype(np.float64)
 
         # Resets the imputer to be fit for the new dataset
@@ -582,9 +897,22 @@ class TPOTBase(BaseEstimator):
         self._start_datetime = datetime.now()
         self._last_pipeline_write = self._start_datetime
         self._toolbox.register('evaluate', self._evaluate_individuals, features=features, target=target, sample_weight=sample_weight, groups=groups)
+        self._toolbox.register('submit', self._submit_individual, features=features, target=target, sample_weight=sample_weight, groups=groups)
+        self._toolbox.register('collect', self._collect_individuals)
+        if self.surrogate_factor is not None and self.surrogate_factor > 1:
+            self._surrogate = SurrogateModel(random_state=self.random_state)
+            self._toolbox.register('prescreen', self._prescreen_offspring)
+            prescreen_factor = self.surrogate_factor
+        else:
+            prescreen_factor = 1
+
+        if self.pretest_memo is not None:
+            self._pretest_memo.load(self.pretest_memo)
 
         # assign population, self._pop can only be not None if warm_start is enabled
-        if self._pop:
+        if checkpoint is not None:
+            pop = self._restore_individuals(checkpoint['population'])
+        elif self._pop:
             pop = self._pop
         else:
             pop = self._toolbox.population(n=self.population_size)
@@ -609,7 +937,7 @@ class TPOTBase(BaseEstimator):
             return np.allclose(ind1.fitness.values, ind2.fitness.values)
 
         # Generate new pareto front if it doesn't already exist for warm start
-        if not self.warm_start or not self._pareto_front:
+        if not self.warm_start or not self._pareto_front or checkpoint is not None:
             self._pareto_front = tools.ParetoFront(similar=pareto_eq)
 
         # Start the progress bar
@@ -621,23 +949,65 @@ class TPOTBase(BaseEstimator):
         self._pbar = tqdm(total=total_evals, unit='pipeline', leave=False,
                           disable=not (self.verbosity >= 2), desc='Optimization Progress')
 
+        start_gen = 0
+        if checkpoint is not None:
+            start_gen = self._restore_checkpoint(checkpoint)
+
         try:
             with warnings.catch_warnings():
+                self._setup_cv_folds(features, target, groups)
+                # The predicted shapes of the pipelines start from the shape of the training set
+                self._input_shape = data_shape(features)
+                self._n_classes = len(np.unique(target)) if self.classification else None
                 self._setup_memory()
+                if isinstance(self._memory, TPOTMemory):
+                    self._memory.set_data(features, target)
+                self._setup_evaluation_cache(features, target, sample_weight, groups)
+                self._setup_fidelity_folds(target, groups)
+                # The cached outputs are only valid for the data of this call
+                if self.prefix_cache_mb or self.decomposition_cache_mb:
+                    self._prefix_cache = PrefixCache(self._prefix_cache_bytes() or 0,
+                                                     self._decomposition_cache_bytes() or 0)
+                else:
+                    self._prefix_cache = None
+                if self.n_jobs > 1:
+                    self._setup_evaluation_pool(features, target, sample_weight, groups)
                 warnings.simplefilter('ignore')
-                pop, _ = eaMuPlusLambda(
-                    population=pop,
-                    toolbox=self._toolbox,
-                    mu=self.population_size,
-                    lambda_=self.offspring_size,
-                    cxpb=self.crossover_rate,
-                    mutpb=self.mutation_rate,
-                    ngen=self.generations,
-                    pbar=self._pbar,
-                    halloffame=self._pareto_front,
-                    verbose=self.verbosity,
-                    per_generation_function=self._check_periodic_pipeline
-                )
+                if self.steady_state:
+                    pop, _ = eaSteadyState(
+                        population=pop,
+                        toolbox=self._toolbox,
+                        mu=self.population_size,
+                        lambda_=self.offspring_size,
+                        cxpb=self.crossover_rate,
+                        mutpb=self.mutation_rate,
+                        ngen=self.generations,
+                        pbar=self._pbar,
+                        n_slots=self.n_jobs,
+                        halloffame=self._pareto_front,
+                        verbose=self.verbosity,
+                        per_generation_function=self._check_periodic_pipeline,
+                        prescreen_factor=prescreen_factor,
+                        start_gen=start_gen,
+                        checkpoint_function=self._write_checkpoint if self.periodic_checkpoint_folder else None
+                    )
+                else:
+                    pop, _ = eaMuPlusLambda(
+                        population=pop,
+                        toolbox=self._toolbox,
+                        mu=self.population_size,
+                        lambda_=self.offspring_size,
+                        cxpb=self.crossover_rate,
+                        mutpb=self.mutation_rate,
+                        ngen=self.generations,
+                        pbar=self._pbar,
+                        halloffame=self._pareto_front,
+                        verbose=self.verbosity,
+                        per_generation_function=self._check_periodic_pipeline,
+                        prescreen_factor=prescreen_factor,
+                        start_gen=start_gen,
+                        checkpoint_function=self._write_checkpoint if self.periodic_checkpoint_folder else None
+                    )
 
             # store population for the next call
             if self.warm_start:
@@ -659,8 +1029,21 @@ class TPOTBase(BaseEstimator):
                     if not isinstance(self._pbar, type(None)):
                         self._pbar.close()
 
+                    if self.pretest_memo is not None:
+                        self._pretest_memo.save(self.pretest_memo)
+                    # Free the transformed samples held by the prefix cache and the fold buffers
+                    self._prefix_cache = None
+                    self._cv_iter = None
+                    self._fold_buffers = None
+                    self._scorer = None
+                    self._input_shape = None
+                    self._n_classes = None
                     self._update_top_pipeline()
-                    self._summary_of_best_pipeline(features, target)
+                    try:
+                        # The workers fit the Pareto front with eager_pareto_front
+                        self._summary_of_best_pipeline(features, target)
+                    finally:
+                        self._close_evaluation_pool()
                     # Delete the temporary cache before exiting
                     self._cleanup_memory()
                     break
@@ -686,7 +1069,8 @@ class TPOTBase(BaseEstimator):
                     raise ValueError(
                         'Could not find directory for memory caching: {}'.format(self.memory)
                     )
-                self._memory = Memory(cachedir=self._cachedir, verbose=0)
+                max_bytes = int(self.memory_max_mb * 2 ** 20) if self.memory_max_mb else None
+                self._memory = TPOTMemory(cachedir=self._cachedir, max_bytes=max_bytes)
             elif isinstance(self.memory, Memory):
                 self._memory = self.memory
             else:
@@ -697,6 +1081,212 @@ class TPOTBase(BaseEstimator):
                 )
 
 
+    def _setup_evaluation_cache(self, features, target, sample_weight=None, groups=None):
+        """Setup the EvaluationCache object for the evaluations of the current training data.
+
+        Parameters
+        ----------
+        features: array-like {n_samples, n_features}
+            Feature matrix
+        target: array-like {n_samples}
+            List of class labels for prediction
+        sample_weight: array-like {n_samples}, optional
+            List of sample weights to balance (or un-balanace) the dataset target as needed
+        groups: array-like {n_samples, }, optional
+            Group labels for the samples used while splitting the dataset into train/test set
+
+        Returns
+        -------
+        None
+        """
+        if self.evaluation_cache is None:
+            self._evaluation_cache = None
+            return
+        if isinstance(self.evaluation_cache, str):
+            self._evaluation_cache = EvaluationCache(self.evaluation_cache)
+        elif isinstance(self.evaluation_cache, EvaluationCache):
+            self._evaluation_cache = self.evaluation_cache
+        else:
+            raise ValueError(
+                'Could not recognize EvaluationCache object for evaluation caching. '
+                'Please provide an instance of tpot.cache_utils.EvaluationCache or '
+                'a path to a directory on your system.'
+            )
+        cv_iter = self._cv_folds(features, target, groups)
+        self._n_cv_folds = len(cv_iter)
+        self._evaluation_cache.set_context(features, target, cv_iter, self.scoring_function, sample_weight,
+                                           self.random_state)
+
+    def _store_evaluations(self, eval_individuals_str):
+        """Store the completed evaluations in the evaluation cache.
+
+        Pipelines that failed or were only partially evaluated in racing mode are not stored.
+
+        Parameters
+        ----------
+        eval_individuals_str: list
+            A list of strings for evaluated pipelines
+
+        Returns
+        -------
+        None
+        """
+        for individual_str in eval_individuals_str:
+            stats = self.evaluated_individuals_[individual_str]
+            if not np.isfinite(stats['internal_cv_score']):
+                continue
+            if stats.get('cv_folds_evaluated', self._n_cv_folds) < self._n_cv_folds:
+                continue
+            self._evaluation_cache.put(individual_str, dict(
+                (key, value) for key, value in stats.items() if key in self._cached_stats_keys
+            ))
+        self._evaluation_cache.evict()
+
+    def _setup_evaluation_pool(self, features, target, sample_weight=None, groups=None):
+        """Start the pool of worker processes used to evaluate pipelines when n_jobs > 1.
+
+        The training data and the cross-validation folds are placed once in a
+        read-only memory-mapped file shared by all the workers, then only the
+        pipelines are sent along with each evaluation task.
+
+        Parameters
+        ----------
+        features: array-like {n_samples, n_features}
+            Feature matrix
+        target: array-like {n_samples}
+            List of class labels for prediction
+        sample_weight: array-like {n_samples}, optional
+            List of sample weights to balance (or un-balanace) the dataset target as needed
+        groups: array-like {n_samples, }, optional
+            Group labels for the samples used while splitting the dataset into train/test set
+
+        Returns
+        -------
+        None
+        """
+        features, target, groups = indexable(features, target, groups)
+        cv_iter = self._cv_folds(features, target, groups)
+        # The folds of the fidelity subsamples are shared after the folds of the full evaluation
+        fidelity_folds = [fold for fidelity_cv_iter in self._fidelity_cv_iters for fold in fidelity_cv_iter]
+        self._evaluation_pool = EvaluationPool(
+            n_jobs=self.n_jobs,
+            features=features,
+            target=target,
+            cv_iter=cv_iter + fidelity_folds,
+            scoring_function=self.scoring_function,
+            sample_weight=sample_weight,
+            n_folds=len(cv_iter),
+            prefix_cache_bytes=self._prefix_cache_bytes(),
+            decomposition_cache_bytes=self._decomposition_cache_bytes(),
+            fold_buffers=self._fold_buffers,
+            measure_memory=self.cost_objective is not None
+        )
+        self.shared_memory_report_ = self._evaluation_pool.memory_report()
+        if self.verbosity >= 2 and not isinstance(self._pbar, type(None)):
+            message = 'Sharing {:.1f} MB of training data between {} workers saves {:.1f} MB of memory'.format(
+                self.shared_memory_report_['shared_bytes'] / 1e6,
+                self.shared_memory_report_['n_jobs'],
+                self.shared_memory_report_['saved_bytes'] / 1e6
+            )
+            self._pbar.write(message, file=self._file)
+
+    def _setup_cv_folds(self, features, target, groups=None):
+        """Split the CV folds and look up the scorer once for all the evaluations of a call to fit().
+
+        Parameters
+        ----------
+        features: array-like {n_samples, n_features}
+            Feature matrix
+        target: array-like {n_samples}
+            List of class labels for prediction
+        groups: array-like {n_samples, }, optional
+            Group labels for the samples used while splitting the dataset into train/test set
+
+        Returns
+        -------
+        None
+        """
+        self._cv_iter = None
+        self._cv_iter = self._cv_folds(features, target, groups)
+        self._scorer = SCORERS[self.scoring_function]
+        self._fold_buffers = None
+        if self.materialize_folds:
+            self._fold_buffers = []
+            for train, test in self._cv_iter:
+                fold_data = (safe_indexing(features, train), safe_indexing(target, train),
+                             safe_indexing(features, test), safe_indexing(target, test))
+                # The buffers are shared by all the evaluations, so they must never be modified
+                for data in fold_data:
+                    if isinstance(data, np.ndarray):
+                        data.flags.writeable = False
+                self._fold_buffers.append(fold_data)
+
+    def _cv_folds(self, features, target, groups=None):
+        """Return the (train, test) folds of the cross-validation, split by fit() or split now."""
+        if self._cv_iter is not None:
+            return self._cv_iter
+        features, target, groups = indexable(features, target, groups)
+        return list(check_cv(self.cv, target, classifier=self.classification).split(features, target, groups))
+
+    def _setup_fidelity_folds(self, target, groups=None):
+        """Split stratified subsamples of the training set for the fidelity schedule.
+
+        Parameters
+        ----------
+        target: array-like {n_samples}
+            List of class labels for prediction
+        groups: array-like {n_samples, }, optional
+            Group labels for the samples used while splitting the dataset into train/test set
+
+        Returns
+        -------
+        None
+        """
+        self._fidelity_cv_iters = []
+        if not self.fidelity_schedule:
+            return
+        target = np.asarray(target)
+        sample_indices = np.arange(target.shape[0])
+        for fraction in self.fidelity_schedule:
+            try:
+                fidelity_indices, _ = train_test_split(sample_indices, train_size=fraction,
+                                                       random_state=self.random_state,
+                                                       stratify=target if self.classification else None)
+            except ValueError:
+                # Some classes have too few samples to stratify the subsample
+                fidelity_indices, _ = train_test_split(sample_indices, train_size=fraction,
+                                                       random_state=self.random_state)
+            fidelity_indices = np.sort(fidelity_indices)
+            fidelity_target = target[fidelity_indices]
+            fidelity_groups = None if groups is None else np.asarray(groups)[fidelity_indices]
+            cv = check_cv(self.cv, fidelity_target, classifier=self.classification)
+            # The splitters only use the number of rows of the feature matrix
+            fidelity_folds = cv.split(np.zeros((fidelity_indices.shape[0], 1)), fidelity_target, fidelity_groups)
+            # Index the folds in the whole training set, so that the subsamples are never copied
+            self._fidelity_cv_iters.append([(fidelity_indices[train], fidelity_indices[test])
+                                            for train, test in fidelity_folds])
+
+    def _prefix_cache_bytes(self):
+        """Size of the prefix cache in bytes, None if it is disabled."""
+        if not self.prefix_cache_mb:
+            return None
+        return int(self.prefix_cache_mb * 2 ** 20)
+
+    def _decomposition_cache_bytes(self):
+        """Size of the decomposition cache in bytes, None if it is disabled."""
+        if not self.decomposition_cache_mb:
+            return None
+        return int(self.decomposition_cache_mb * 2 ** 20)
+
+    def _close_evaluation_pool(self):
+        """Stop the worker processes of the evaluation pool."""
+        if self._evaluation_pool is not None:
+            self._evaluation_pool.close()
+            self._evaluation_pool = None
+        self._fold_tasks = {}
+        self._async_evaluations = {}
+        self._submitted_individuals = {}
+
     def _cleanup_memory(self):
         """Clean up caching directory at the end of optimization process only when memory='auto'"""
         if self.memory == "auto":
@@ -773,14 +1363,29 @@ class TPOTBase(BaseEstimator):
                 optimized_pipeline_str = self.clean_pipeline_string(self._optimized_pipeline)
                 print('Best pipeline:', optimized_pipeline_str)
 
-            # Store and fit the entire Pareto front as fitted models for convenience
-            self.pareto_front_fitted_pipelines_ = {}
-
+            # Store the entire Pareto front as fitted models for convenience, they are
+            # only fitted when accessed unless eager_pareto_front is set
+            pareto_front_pipelines = OrderedDict()
             for pipeline in self._pareto_front.items:
-                self.pareto_front_fitted_pipelines_[str(pipeline)] = self._toolbox.compile(expr=pipeline)
-                with warnings.catch_warnings():
-                    warnings.simplefilter('ignore')
-                    self.pareto_front_fitted_pipelines_[str(pipeline)].fit(features, target)
+                pareto_front_pipelines[str(pipeline)] = self._toolbox.compile(expr=pipeline)
+                if self.memory == 'auto':
+                    # The temporary cache is removed at the end of fit()
+                    pareto_front_pipelines[str(pipeline)].memory = None
+
+            fitted_pipelines = {}
+            if self.eager_pareto_front and self._evaluation_pool is not None:
+                pipeline_strs = list(pareto_front_pipelines.keys())
+                fitted_list = self._evaluation_pool.fit_pipelines([pareto_front_pipelines[pipeline_str]
+                                                                   for pipeline_str in pipeline_strs],
+                                                                  self.max_eval_time_seconds)
+                fitted_pipelines = dict((pipeline_str, fitted_pipeline)
+                                        for pipeline_str, fitted_pipeline in zip(pipeline_strs, fitted_list)
+                                        if fitted_pipeline is not None)
+            self.pareto_front_fitted_pipelines_ = _FittedPipelines(pareto_front_pipelines, features, target,
+                                                                   fitted_pipelines)
+            if self.eager_pareto_front:
+                # The pipelines that failed in a worker, if any, are fitted here
+                self.pareto_front_fitted_pipelines_.fit_all()
 
     def predict(self, features):
         """Use the optimized pipeline to predict the target for a feature set.
@@ -921,9 +1526,12 @@ class TPOTBase(BaseEstimator):
     def _check_periodic_pipeline(self):
         """If enough time has passed, save a new optimized pipeline.
 
-        Currently used in the per generation hook in the optimization loop.
+        Currently used in the per generation hook in the optimization loop,
+        which also keeps the memory cache under memory_max_mb.
         """
         self._update_top_pipeline()
+        if isinstance(self._memory, TPOTMemory):
+            self._memory.evict()
         if self.periodic_checkpoint_folder is not None:
             total_since_last_pipeline_save = (datetime.now() - self._last_pipeline_write).total_seconds()
             if total_since_last_pipeline_save > self._output_best_pipeline_period_seconds:
@@ -947,6 +1555,115 @@ class TPOTBase(BaseEstimator):
         except Exception as e:
             self._update_pbar(pbar_num=0, pbar_msg='Failed saving periodic pipeline, exception:\n{}'.format(str(e)[:250]))
 
+    def _write_checkpoint(self, gen, population):
+        """Save the complete state of the evolution in periodic_checkpoint_folder.
+
+        The checkpoint is written to a temporary file first and then renamed, so
+        that a crash while writing never leaves a corrupted checkpoint behind.
+
+        Parameters
+        ----------
+        gen: int
+            Number of completed generations
+        population: list of DEAP individuals
+            The evaluated population after the selection of generation gen
+
+        Returns
+        -------
+        None
+        """
+        try:
+            self._create_periodic_checkpoint_folder()
+            checkpoint = {
+                'tpot_version': __version__,
+                'generation': gen,
+                'population': self._dump_individuals(population),
+                'pareto_front': self._dump_individuals(self._pareto_front.items),
+                'evaluated_individuals_': self.evaluated_individuals_,
+                'python_random_state': random.getstate(),
+                'numpy_random_state': np.random.get_state(),
+                'last_optimized_pareto_front': self._last_optimized_pareto_front,
+                'last_optimized_pareto_front_n_gens': self._last_optimized_pareto_front_n_gens,
+                'elapsed_seconds': (datetime.now() - self._start_datetime).total_seconds(),
+                'pbar_n': self._pbar.n if self._pbar is not None else 0
+            }
+            filename = os.path.join(self.periodic_checkpoint_folder, 'tpot_checkpoint.pkl')
+            _atomic_write(filename, partial(_dump_pickle, checkpoint))
+        except Exception as e:
+            self._update_pbar(pbar_num=0, pbar_msg='Failed saving checkpoint, exception:\n{}'.format(str(e)[:250]))
+
+    def _read_checkpoint(self, path):
+        """Load a checkpoint written by _write_checkpoint().
+
+        Parameters
+        ----------
+        path: string
+            Path of the checkpoint file, or of the folder holding it
+
+        Returns
+        -------
+        checkpoint: dict
+            The saved state of the evolution
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, 'tpot_checkpoint.pkl')
+        if not os.path.isfile(path):
+            raise ValueError('Could not find the checkpoint to resume from: {}'.format(path))
+        with open(path, 'rb') as checkpoint_file:
+            return pickle.load(checkpoint_file)
+
+    def _dump_individuals(self, individuals):
+        """Convert individuals to picklable (pipeline string, fitness values, statistics) tuples."""
+        return [(str(ind), ind.fitness.values, dict(ind.statistics)) for ind in individuals]
+
+    def _restore_individuals(self, dumped_individuals):
+        """Rebuild the individuals saved by _dump_individuals() with their fitness and statistics."""
+        individuals = []
+        for individual_str, fitness_values, statistics in dumped_individuals:
+            try:
+                individual = self._individual_class.from_string(individual_str, self._pset)
+            except Exception:
+                raise ValueError(
+                    'The pipeline {} of the checkpoint is not valid with the current '
+                    'configuration of TPOT.'.format(individual_str)
+                )
+            individual.statistics.update(statistics)
+            if fitness_values:
+                individual.fitness.values = fitness_values
+            individuals.append(individual)
+        return individuals
+
+    def _restore_checkpoint(self, checkpoint):
+        """Restore the state of the evolution saved in a checkpoint.
+
+        The population is restored by fit() itself. This restores the Pareto front,
+        the evaluated pipelines, the random number generators, the early stop
+        counters, the elapsed time and the progress bar.
+
+        Parameters
+        ----------
+        checkpoint: dict
+            Checkpoint loaded by _read_checkpoint()
+
+        Returns
+        -------
+        start_gen: int
+            Number of generations completed before the checkpoint
+        """
+        self._pareto_front.update(self._restore_individuals(checkpoint['pareto_front']))
+        self.evaluated_individuals_ = checkpoint['evaluated_individuals_']
+        self._canonical_index = {}
+        self._n_canonical_indexed = 0
+        random.setstate(checkpoint['python_random_state'])
+        np.random.set_state(checkpoint['numpy_random_state'])
+        self._last_optimized_pareto_front = checkpoint['last_optimized_pareto_front']
+        self._last_optimized_pareto_front_n_gens = checkpoint['last_optimized_pareto_front_n_gens']
+        # The time budget of max_time_mins includes the time spent before the checkpoint
+        self._start_datetime = datetime.now() - timedelta(seconds=checkpoint['elapsed_seconds'])
+        if self._pbar is not None:
+            self._pbar.update(checkpoint['pbar_n'])
+        return checkpoint['generation']
+
     def _create_periodic_checkpoint_folder(self):
         try:
             os.makedirs(self.periodic_checkpoint_folder)
@@ -957,6 +1674,27 @@ class TPOTBase(BaseEstimator):
             else:
                 raise ValueError('Failed creating the periodic_checkpoint_folder:\n{}'.format(e))
 
+    def evaluated_individuals_to_dataframe(self):
+        """Export the statistics of the evaluated pipelines as a DataFrame.
+
+        Besides the operator count, CV score and genealogy of each pipeline, the
+        columns hold the costs measured during its evaluation: 'fit_time' and
+        'score_time' summed over the folds in seconds, 'fold_times' with the wall
+        time of each fold in seconds, 'peak_rss' with the peak resident memory of
+        the evaluating process in bytes and 'model_size' with the pickled size of
+        the fitted pipeline in bytes. The last two are only measured on the first
+        fold when cost_objective is set. The costs are missing for pipelines that
+        were skipped or whose scores were taken from the evaluation cache.
+
+        Returns
+        -------
+        evaluated_individuals: pandas.DataFrame
+            One row per evaluated pipeline, indexed by the pipeline string
+        """
+        pipeline_strings = sorted(self.evaluated_individuals_.keys())
+        return pd.DataFrame([self.evaluated_individuals_[pipeline_string] for pipeline_string in pipeline_strings],
+                            index=pipeline_strings)
+
     def export(self, output_file_name, skip_if_repeated=False):
         """Export the optimized pipeline as Python code.
 
@@ -1140,44 +1878,794 @@ class TPOTBase(BaseEstimator):
 
         """
 
-        operator_counts, eval_individuals_str, sklearn_pipeline_list, stats_dicts = self._preprocess_individuals(individuals)
+        operator_counts, eval_individuals_str, sklearn_pipeline_list, stats_dicts = \
+            self._preprocess_individuals(individuals)
+        screened_stats = {}
+        if self._fidelity_cv_iters:
+            eval_individuals_str, sklearn_pipeline_list, screened_stats = \
+                self._successive_halving(eval_individuals_str, sklearn_pipeline_list, operator_counts, stats_dicts,
+                                         features, target, sample_weight, groups)
 
         # Make the partial function that will be called below
         partial_wrapped_cross_val_score = partial(
             _wrapped_cross_val_score,
             features=features,
             target=target,
-            cv=self.cv,
-            scoring_function=self.scoring_function,
+            cv=self._cv_iter if self._cv_iter is not None else self.cv,
+            scoring_function=self._scorer or self.scoring_function,
             sample_weight=sample_weight,
             groups=groups,
+            racing_min_folds=self._racing_min_folds,
+            return_fold_scores=self.racing,
+            return_stats=True,
+            prefix_cache=self._prefix_cache,
+            cv_key='cv',
+            fold_buffers=self._fold_buffers,
+            measure_memory=self.cost_objective is not None,
             timeout=self.max_eval_time_seconds
         )
 
-        result_score_list = []
+        # In racing mode, each pipeline is raced against the Pareto front members
+        # that are not more complex than itself
+        racing_thresholds = [self._racing_threshold(operator_counts[individual_str])
+                             for individual_str in eval_individuals_str]
+
+        # The pipelines sharing their fits, e.g. along a regularization path, are evaluated together
+        fit_groups = self._shared_fit_groups(sklearn_pipeline_list)
+
         # Don't use parallelization if n_jobs==1
         if self.n_jobs == 1:
-            for sklearn_pipeline in sklearn_pipeline_list:
+            completed_idx = []
+            completed_vals = []
+            completed_cost_stats = []
+            for fit_group in fit_groups:
                 self._stop_by_max_time_mins()
-                val = partial_wrapped_cross_val_score(sklearn_pipeline=sklearn_pipeline)
-                result_score_list = self._update_val(val, result_score_list)
+                if len(fit_group) == 1:
+                    val = partial_wrapped_cross_val_score(sklearn_pipeline=sklearn_pipeline_list[fit_group[0]],
+                                                          racing_threshold=racing_thresholds[fit_group[0]])
+                    vals = [val]
+                else:
+                    vals = _wrapped_group_cross_val_score(
+                        sklearn_pipelines=[sklearn_pipeline_list[idx] for idx in fit_group],
+                        features=features,
+                        target=target,
+                        cv=self._cv_iter if self._cv_iter is not None else self.cv,
+                        scoring_function=self._scorer or self.scoring_function,
+                        sample_weight=sample_weight,
+                        groups=groups,
+                        return_fold_scores=self.racing,
+                        fold_buffers=self._fold_buffers,
+                        measure_memory=self.cost_objective is not None,
+                        timeout=self.max_eval_time_seconds * len(fit_group)
+                    )
+                    if not isinstance(vals, list):
+                        vals = [vals] * len(fit_group)
+                for idx, val in zip(fit_group, vals):
+                    # The costs are lost when the timeout stops the evaluation from the outside
+                    val, cost_stats = val if isinstance(val, tuple) else (val, _combine_fold_stats([]))
+                    completed_idx.append(idx)
+                    completed_vals = self._update_val(val, completed_vals)
+                    completed_cost_stats.append(cost_stats)
+            result_score_list = [None] * len(sklearn_pipeline_list)
+            cost_stats_list = [None] * len(sklearn_pipeline_list)
+            for idx, val, cost_stats in zip(completed_idx, completed_vals, completed_cost_stats):
+                result_score_list[idx] = val
+                cost_stats_list[idx] = cost_stats
         else:
-            # chunk size for pbar update
-            for chunk_idx in range(0, len(sklearn_pipeline_list), self.n_jobs * 4):
-                self._stop_by_max_time_mins()
-                parallel = Parallel(n_jobs=self.n_jobs, verbose=0, pre_dispatch='2*n_jobs')
-                tmp_result_scores = parallel(delayed(partial_wrapped_cross_val_score)(sklearn_pipeline=sklearn_pipeline)
-                                             for sklearn_pipeline in sklearn_pipeline_list[chunk_idx:chunk_idx + self.n_jobs * 4])
-                # update pbar
-                for val in tmp_result_scores:
-                    result_score_list = self._update_val(val, result_score_list)
+            # Dispatch one task per (pipeline, CV fold) pair so that the number of busy
+            # workers scales with the number of folds and not only with the batch size
+            result_score_list, cost_stats_list = self._evaluate_folds_in_parallel(sklearn_pipeline_list,
+                                                                                  racing_thresholds,
+                                                                                  features, target,
+                                                                                  sample_weight, groups,
+                                                                                  fit_groups)
+
+        n_cv_folds = len(self._cv_folds(features, target, groups)) if self.racing else None
+        self._record_scores(result_score_list, eval_individuals_str, operator_counts, stats_dicts, cost_stats_list,
+                            n_cv_folds)
+
+        # Individuals that were skipped as equivalent to another individual of the batch
+        screened_keys = dict((self._canonical_key(individual_str), individual_str) for individual_str in screened_stats)
+        for individual in individuals:
+            individual_str = str(individual)
+            if individual_str in self.evaluated_individuals_ or individual_str in screened_stats:
+                continue
+            equivalent_str = self._evaluated_equivalent(individual_str)
+            if equivalent_str is not None:
+                self._copy_equivalent_stats(individual, equivalent_str)
+            else:
+                # The equivalent individual was eliminated by the successive halving
+                screened_stats[individual_str] = screened_stats[screened_keys[self._canonical_key(individual_str)]]
+
+        """Look up the operator count and cross validation score to use in the optimization"""
+        return [self._individual_fitness(str(individual), screened_stats) for individual in individuals]
+
+    def _record_scores(self, result_score_list, eval_individuals_str, operator_counts, stats_dicts,
+                       cost_stats_list=None, n_cv_folds=None):
+        """Record the CV scores of evaluated pipelines in evaluated_individuals_ and in the evaluation cache.
+
+        Parameters
+        ----------
+        result_score_list: list
+            A list of CV scores or, in racing mode, arrays of fold scores for evaluated pipelines
+        eval_individuals_str: list
+            A list of strings for evaluated pipelines
+        operator_counts: dict
+            A dict where 'key' is the string representation of an individual and 'value' is the number of operators in the pipeline
+        stats_dicts: dict
+            A dict where 'key' is the string representation of an individual and 'value' is a dict containing statistics about the individual
+        cost_stats_list: list, optional
+            A list of dicts with the 'fit_time', 'score_time', 'fold_times', 'peak_rss' and
+            'model_size' measured during the evaluation of each pipeline
+        n_cv_folds: int, optional
+            Number of folds of a full cross-validation, needed in racing mode to tell
+            the abandoned evaluations from the complete ones
+
+        Returns
+        -------
+        None
+        """
+        # In racing mode the fold scores are returned, summarize them before updating the stats
+        result_score_list = list(result_score_list)
+        cv_folds_evaluated = {}
+        racing_partial_scores = {}
+        if self.racing:
+            for idx, (val, individual_str) in enumerate(zip(result_score_list, eval_individuals_str)):
+                if isinstance(val, np.ndarray):
+                    cv_folds_evaluated[individual_str] = len(val)
+                    result_score_list[idx] = np.nanmean(val)
+                    # The mean score of an abandoned evaluation is kept aside, so that it
+                    # never outranks the CV score of a fully evaluated pipeline
+                    if n_cv_folds is not None and len(val) < n_cv_folds:
+                        racing_partial_scores[individual_str] = result_score_list[idx]
+                        result_score_list[idx] = -float('inf')
 
         self._update_evaluated_individuals_(result_score_list, eval_individuals_str, operator_counts, stats_dicts)
+        if self.fidelity_schedule:
+            for individual_str in eval_individuals_str:
+                self.evaluated_individuals_[individual_str]['fidelity'] = 1.0
+                self.evaluated_individuals_[individual_str]['fidelity_scores'] = self._fidelity_scores.pop(individual_str, [])
+        for individual_str, n_folds in cv_folds_evaluated.items():
+            self.evaluated_individuals_[individual_str]['cv_folds_evaluated'] = n_folds
+        for individual_str, racing_partial_score in racing_partial_scores.items():
+            self.evaluated_individuals_[individual_str]['racing_partial_score'] = racing_partial_score
+        if cost_stats_list is not None:
+            for individual_str, cost_stats in zip(eval_individuals_str, cost_stats_list):
+                self.evaluated_individuals_[individual_str].update(cost_stats)
+        if self._evaluation_cache is not None:
+            self._store_evaluations(eval_individuals_str)
+
+    def _successive_halving(self, eval_individuals_str, sklearn_pipeline_list, operator_counts, stats_dicts,
+                            features, target, sample_weight=None, groups=None):
+        """Screen pipelines on the subsamples of the fidelity schedule before their full evaluation.
+
+        At each fidelity, the pipelines are cross-validated on the subsample and only the
+        better half of them is promoted to the next one. The eliminated pipelines are left
+        out of evaluated_individuals_, so that they are screened again if they come back in
+        a later generation, and their stats only hold a CV score of -inf for this generation.
 
-        """Look up the operator count and cross validation score to use in the optimization"""
-        return [(self.evaluated_individuals_[str(individual)]['operator_count'],
-                 self.evaluated_individuals_[str(individual)]['internal_cv_score'])
-                for individual in individuals]
+        Parameters
+        ----------
+        eval_individuals_str: list
+            A list of strings for the pipelines to evaluate
+        sklearn_pipeline_list: list
+            A list of scikit-learn pipelines to evaluate
+        operator_counts: dict
+            A dict where 'key' is the string representation of an individual and 'value' is the number of operators in the pipeline
+        stats_dicts: dict
+            A dict where 'key' is the string representation of an individual and 'value' is a dict containing statistics about the individual
+        features: numpy.ndarray {n_samples, n_features}
+            A numpy matrix containing the training and testing features for the individual's evaluation
+        target: numpy.ndarray {n_samples}
+            A numpy matrix containing the training and testing target for the individual's evaluation
+        sample_weight: array-like {n_samples}, optional
+            List of sample weights to balance (or un-balanace) the dataset target as needed
+        groups: array-like {n_samples, }, optional
+            Group labels for the samples used while splitting the dataset into train/test set
+
+        Returns
+        -------
+        eval_individuals_str: list
+            A list of strings for the pipelines promoted to the full evaluation
+        sklearn_pipeline_list: list
+            The promoted scikit-learn pipelines
+        screened_stats: dict
+            A dict where 'key' is the string representation of an eliminated individual and 'value'
+            is a dict containing its statistics, the fidelity it reached and its scores on the subsamples
+        """
+        screened_stats = {}
+        self._fidelity_scores = dict((individual_str, []) for individual_str in eval_individuals_str)
+        for fidelity_idx, fraction in enumerate(self.fidelity_schedule):
+            n_promoted = int(np.ceil(len(eval_individuals_str) * self._fidelity_promotion_rate))
+            # A fidelity that cannot eliminate any pipeline is not worth evaluating
+            if n_promoted >= len(eval_individuals_str):
+                break
+            scores = self._score_at_fidelity(sklearn_pipeline_list, fidelity_idx, features, target,
+                                             sample_weight, groups)
+            for individual_str, score in zip(eval_individuals_str, scores):
+                self._fidelity_scores[individual_str].append(score)
+
+            promoted = set(np.argsort(-np.array(scores), kind='mergesort')[:n_promoted])
+            for idx, individual_str in enumerate(eval_individuals_str):
+                if idx in promoted:
+                    continue
+                screened_stats[individual_str] = self._combine_individual_stats(operator_counts[individual_str],
+                                                                                -float('inf'),
+                                                                                stats_dicts[individual_str])
+                screened_stats[individual_str]['fidelity'] = fraction
+                screened_stats[individual_str]['fidelity_scores'] = self._fidelity_scores.pop(individual_str)
+                self._update_pbar()
+            eval_individuals_str = [individual_str for idx, individual_str in enumerate(eval_individuals_str) if idx in promoted]
+            sklearn_pipeline_list = [sklearn_pipeline for idx, sklearn_pipeline in enumerate(sklearn_pipeline_list) if idx in promoted]
+        return eval_individuals_str, sklearn_pipeline_list, screened_stats
+
+    def _score_at_fidelity(self, sklearn_pipeline_list, fidelity_idx, features, target,
+                           sample_weight=None, groups=None):
+        """Cross-validate pipelines on the folds of a fidelity subsample.
+
+        Parameters
+        ----------
+        sklearn_pipeline_list: list
+            A list of scikit-learn pipelines to evaluate
+        fidelity_idx: int
+            Index of the subsample in the fidelity schedule
+        features: numpy.ndarray {n_samples, n_features}
+            A numpy matrix containing the training and testing features for the individual's evaluation
+        target: numpy.ndarray {n_samples}
+            A numpy matrix containing the training and testing target for the individual's evaluation
+        sample_weight: array-like {n_samples}, optional
+            List of sample weights to balance (or un-balanace) the dataset target as needed
+        groups: array-like {n_samples, }, optional
+            Group labels for the samples used while splitting the dataset into train/test set
+
+        Returns
+        -------
+        scores: list
+            CV score of each pipeline on the subsample, -inf if it failed or timed out
+        """
+        fidelity_cv_iter = self._fidelity_cv_iters[fidelity_idx]
+        if self._evaluation_pool is None:
+            scores = []
+            for sklearn_pipeline in sklearn_pipeline_list:
+                self._stop_by_max_time_mins()
+                scores.append(_wrapped_cross_val_score(sklearn_pipeline=sklearn_pipeline,
+                                                       features=features,
+                                                       target=target,
+                                                       cv=fidelity_cv_iter,
+                                                       scoring_function=self._scorer or self.scoring_function,
+                                                       sample_weight=sample_weight,
+                                                       groups=groups,
+                                                       prefix_cache=self._prefix_cache,
+                                                       cv_key=('fidelity', fidelity_idx),
+                                                       timeout=self.max_eval_time_seconds))
+        else:
+            # The fidelity folds are shared after the folds of the full evaluation
+            fold_offset = self._evaluation_pool.n_folds + sum(len(cv_iter) for cv_iter in self._fidelity_cv_iters[:fidelity_idx])
+            # The tasks of this call get their own identifiers, so that the results
+            # left in the pool by the previous users are never mistaken for them
+            self._n_evaluations_submitted += 1
+            call_key = self._n_evaluations_submitted
+            task_ids = set()
+            for idx, sklearn_pipeline in enumerate(sklearn_pipeline_list):
+                for fold_idx in range(len(fidelity_cv_iter)):
+                    task_id = ('fidelity', call_key, idx, fold_idx)
+                    task_ids.add(task_id)
+                    self._evaluation_pool.submit(task_id,
+                                                 (sklearn_pipeline, fold_offset + fold_idx, self.max_eval_time_seconds))
+            fold_scores = [[] for _ in sklearn_pipeline_list]
+            # Like in the main process, the time limit applies to all the folds of a pipeline
+            time_spent = [0.] * len(sklearn_pipeline_list)
+            while task_ids:
+                task_id, score, fold_stats = self._evaluation_pool.get_result()
+                if task_id not in task_ids:
+                    continue
+                task_ids.remove(task_id)
+                idx = task_id[2]
+                fold_scores[idx].append(score)
+                time_spent[idx] += fold_stats.get('fold_time', 0.)
+            scores = []
+            for pipeline_fold_scores, pipeline_time in zip(fold_scores, time_spent):
+                if (any(isinstance(score, str) for score in pipeline_fold_scores) or
+                        pipeline_time > self.max_eval_time_seconds):
+                    scores.append(-float('inf'))
+                else:
+                    scores.append(np.nanmean(pipeline_fold_scores))
+            self._stop_by_max_time_mins()
+        return [score if not isinstance(score, str) and np.isfinite(score) else -float('inf') for score in scores]
+
+    def _submit_individual(self, individual, features, target, sample_weight=None, groups=None):
+        """Start the evaluation of an individual without waiting for its result.
+
+        Used by the steady-state evolution, the result is retrieved with _collect_individuals().
+        Without an evaluation pool, the individual is evaluated right away.
+
+        Parameters
+        ----------
+        individual: a DEAP individual
+            Individual to evaluate
+        features: numpy.ndarray {n_samples, n_features}
+            A numpy matrix containing the training and testing features for the individual's evaluation
+        target: numpy.ndarray {n_samples}
+            A numpy matrix containing the training and testing target for the individual's evaluation
+        sample_weight: array-like {n_samples}, optional
+            List of sample weights to balance (or un-balanace) the dataset target as needed
+        groups: array-like {n_samples, }, optional
+            Group labels for the samples used while splitting the dataset into train/test set
+
+        Returns
+        -------
+        None
+        """
+        individual_str = str(individual)
+        # The same pipeline is already being evaluated, wait for that evaluation
+        if individual_str in self._submitted_individuals:
+            key = self._submitted_individuals[individual_str]
+            self._async_evaluations[key]['individuals'].append(individual)
+            return
+
+        if self._evaluation_pool is None:
+            fitness, = self._evaluate_individuals([individual], features, target, sample_weight, groups)
+            self._finished_individuals.append((individual, fitness))
+            return
+
+        operator_counts, eval_individuals_str, sklearn_pipeline_list, stats_dicts = \
+            self._preprocess_individuals([individual])
+        if not eval_individuals_str:
+            # Invalid or previously evaluated pipeline
+            self._finished_individuals.append((individual, self._individual_fitness(individual_str)))
+            return
+
+        key = self._submit_fold_tasks(sklearn_pipeline_list[0], self._racing_threshold(operator_counts[individual_str]))
+        self._submitted_individuals[individual_str] = key
+        self._async_evaluations[key] = {
+            'individuals': [individual],
+            'individual_str': individual_str,
+            'operator_counts': operator_counts,
+            'stats_dicts': stats_dicts
+        }
+
+    def _collect_individuals(self):
+        """Wait until at least one individual submitted with _submit_individual() is evaluated.
+
+        Returns
+        -------
+        finished: list
+            List of (individual, fitness) tuples of the newly evaluated individuals
+        """
+        while not self._finished_individuals:
+            key, val, cost_stats = self._receive_fold_result()
+            if key not in self._async_evaluations:
+                continue
+            evaluation = self._async_evaluations.pop(key)
+            individual_str = evaluation['individual_str']
+            del self._submitted_individuals[individual_str]
+            self._record_scores(self._update_val(val, []), [individual_str],
+                                evaluation['operator_counts'], evaluation['stats_dicts'], [cost_stats],
+                                self._evaluation_pool.n_folds)
+            fitness = self._individual_fitness(individual_str)
+            for individual in evaluation['individuals']:
+                self._finished_individuals.append((individual, fitness))
+
+        finished = self._finished_individuals
+        self._finished_individuals = []
+        return finished
+
+    def _prescreen_offspring(self, offspring, n_selected):
+        """Pick the offspring to evaluate with the surrogate model.
+
+        Parameters
+        ----------
+        offspring: list of DEAP individuals
+            Candidate offspring, in random order
+        n_selected: int
+            Number of offspring to evaluate
+
+        Returns
+        -------
+        selected: list of DEAP individuals
+            The n_selected most promising offspring
+        """
+        # The steady-state evolution prescreens every offspring, so the forests are only
+        # refitted once per offspring_size new evaluations instead of for each of them
+        refit_interval = self.offspring_size if self.steady_state and self._surrogate.is_fitted else 1
+        n_new = len(self.evaluated_individuals_) - self._surrogate.n_evaluated_
+        # evaluated_individuals_ is replaced when fit() resumes from a checkpoint
+        if n_new < 0 or n_new >= refit_interval:
+            self._surrogate.fit(self.evaluated_individuals_)
+        if not self._surrogate.is_fitted:
+            return offspring[:n_selected]
+
+        # Offspring that repeat an evaluated pipeline or another candidate do not
+        # bring new information, they are only kept if too few candidates are left
+        candidates = []
+        repeats = []
+        candidates_keys = set()
+        for individual in offspring:
+            individual_str = str(individual)
+            individual_key = self._canonical_key(individual_str)
+            if self._evaluated_equivalent(individual_str) is not None or individual_key in candidates_keys:
+                repeats.append(individual)
+            else:
+                candidates_keys.add(individual_key)
+                candidates.append(individual)
+
+        selected = [candidates[idx] for idx in self._surrogate.select([str(ind) for ind in candidates], n_selected)]
+        return selected + repeats[:n_selected - len(selected)]
+
+    def _canonical_key(self, individual_str):
+        """Compute, with memoization, the canonical form of an individual shared by its equivalent pipelines."""
+        if individual_str not in self._canonical_keys:
+            self._canonical_keys[individual_str] = canonical_pipeline_key(individual_str)
+        return self._canonical_keys[individual_str]
+
+    def _evaluated_equivalent(self, individual_str):
+        """Find an evaluated individual that is equivalent to an individual.
+
+        Parameters
+        ----------
+        individual_str: string
+            String representation of the individual
+
+        Returns
+        -------
+        equivalent_str: string or None
+            Key in evaluated_individuals_ of an individual with the same canonical form,
+            None if no equivalent individual was evaluated
+        """
+        if individual_str in self.evaluated_individuals_:
+            return individual_str
+        # evaluated_individuals_ only grows during an optimization, but it is replaced
+        # when fit() resumes from a checkpoint
+        if self._n_canonical_indexed != len(self.evaluated_individuals_):
+            self._canonical_index = {}
+            for evaluated_str in self.evaluated_individuals_:
+                self._canonical_index.setdefault(self._canonical_key(evaluated_str), evaluated_str)
+            self._n_canonical_indexed = len(self.evaluated_individuals_)
+        return self._canonical_index.get(self._canonical_key(individual_str))
+
+    def _copy_equivalent_stats(self, individual, equivalent_str):
+        """Record the scores of an evaluated equivalent pipeline for an individual in evaluated_individuals_."""
+        equivalent_stats = self.evaluated_individuals_[equivalent_str]
+        stats = self._combine_individual_stats(equivalent_stats['operator_count'],
+                                               equivalent_stats['internal_cv_score'],
+                                               individual.statistics)
+        for key, value in equivalent_stats.items():
+            stats.setdefault(key, value)
+        self.evaluated_individuals_[str(individual)] = stats
+
+    def _individual_fitness(self, individual_str, screened_stats=None):
+        """Look up the operator count, cross validation score and, if enabled, runtime cost of an evaluated individual.
+
+        The stats of the individuals eliminated by the successive halving are looked up in screened_stats.
+        """
+        if screened_stats and individual_str in screened_stats:
+            stats = screened_stats[individual_str]
+        else:
+            stats = self.evaluated_individuals_[individual_str]
+        if self.cost_objective is None:
+            return stats['operator_count'], stats['internal_cv_score']
+        return stats['operator_count'], stats['internal_cv_score'], self._evaluation_cost(stats)
+
+    def _evaluation_cost(self, stats):
+        """Compute the runtime cost objective of an evaluated individual.
+
+        Parameters
+        ----------
+        stats: dict
+            Statistics of the individual in evaluated_individuals_
+
+        Returns
+        -------
+        cost: float
+            Average fit time per fold or predict latency per row in seconds,
+            inf if the pipeline failed or its costs were not measured
+        """
+        if not np.isfinite(stats['internal_cv_score']):
+            return float('inf')
+        if self.cost_objective == 'fit_time':
+            if not stats.get('fold_times'):
+                return float('inf')
+            return stats['fit_time'] / len(stats['fold_times'])
+        if stats.get('predict_latency') is None:
+            return float('inf')
+        return stats['predict_latency']
+
+    def _evaluate_folds_in_parallel(self, sklearn_pipeline_list, racing_thresholds, features, target,
+                                    sample_weight=None, groups=None, fit_groups=None):
+        """Evaluate pipelines in parallel with one task per (pipeline, CV fold) pair.
+
+        In racing mode, the next fold of a pipeline is dispatched as soon as its
+        previous folds are scored, unless it cannot reach its racing threshold anymore.
+
+        Parameters
+        ----------
+        sklearn_pipeline_list: list
+            A list of scikit-learn pipelines to evaluate
+        racing_thresholds: list
+            Racing threshold of each pipeline, None if the pipeline is not raced
+        features: numpy.ndarray {n_samples, n_features}
+            A numpy matrix containing the training and testing features for the individual's evaluation
+        target: numpy.ndarray {n_samples}
+            A numpy matrix containing the training and testing target for the individual's evaluation
+        sample_weight: array-like {n_samples}, optional
+            List of sample weights to balance (or un-balanace) the dataset target as needed
+        groups: array-like {n_samples, }, optional
+            Group labels for the samples used while splitting the dataset into train/test set
+        fit_groups: list, optional
+            Lists of indices of the pipelines evaluated together, see _shared_fit_groups.
+            By default, each pipeline on its own.
+
+        Returns
+        -------
+        result_score_list: list
+            CV score, "Timeout" or, in racing mode, array of fold scores of each pipeline
+        cost_stats_list: list
+            Costs of the evaluation of each pipeline measured in the workers, see _combine_fold_stats
+        """
+        # Use the pool started by fit() or a temporary one if called on its own
+        temporary_pool = self._evaluation_pool is None
+        if temporary_pool:
+            self._setup_evaluation_pool(features, target, sample_weight, groups)
+
+        try:
+            return self._dispatch_fold_tasks(sklearn_pipeline_list, racing_thresholds, fit_groups)
+        finally:
+            if temporary_pool:
+                self._close_evaluation_pool()
+
+    def _dispatch_fold_tasks(self, sklearn_pipeline_list, racing_thresholds, fit_groups=None):
+        """Dispatch (pipeline, CV fold) tasks to the evaluation pool and gather the fold scores.
+
+        Every worker is given a new task as soon as it finishes the previous one,
+        and the progress bar and the time limit are checked for each result.
+
+        Parameters
+        ----------
+        sklearn_pipeline_list: list
+            A list of scikit-learn pipelines to evaluate
+        racing_thresholds: list
+            Racing threshold of each pipeline, None if the pipeline is not raced
+        fit_groups: list, optional
+            Lists of indices of the pipelines evaluated together, see _shared_fit_groups
+
+        Returns
+        -------
+        result_score_list: list
+            CV score, "Timeout" or, in racing mode, array of fold scores of each pipeline
+        cost_stats_list: list
+            Costs of the evaluation of each pipeline measured in the workers, see _combine_fold_stats
+        """
+        if fit_groups is None:
+            fit_groups = [[idx] for idx in range(len(sklearn_pipeline_list))]
+        keys = [None] * len(sklearn_pipeline_list)
+        for fit_group in fit_groups:
+            if len(fit_group) == 1:
+                keys[fit_group[0]] = self._submit_fold_tasks(sklearn_pipeline_list[fit_group[0]],
+                                                              racing_thresholds[fit_group[0]])
+            else:
+                group_keys = self._submit_group_fold_tasks([sklearn_pipeline_list[idx] for idx in fit_group])
+                for idx, key in zip(fit_group, group_keys):
+                    keys[idx] = key
+        key_indices = dict((key, idx) for idx, key in enumerate(keys))
+
+        completed_idx = []
+        completed_vals = []
+        cost_stats_list = [None] * len(sklearn_pipeline_list)
+        while len(completed_idx) < len(keys):
+            key, val, cost_stats = self._receive_fold_result()
+            if key not in key_indices:
+                continue
+            completed_idx.append(key_indices[key])
+            completed_vals = self._update_val(val, completed_vals)
+            cost_stats_list[key_indices[key]] = cost_stats
+
+        result_score_list = [None] * len(sklearn_pipeline_list)
+        for idx, val in zip(completed_idx, completed_vals):
+            result_score_list[idx] = val
+        return result_score_list, cost_stats_list
+
+    def _submit_fold_tasks(self, sklearn_pipeline, racing_threshold):
+        """Submit the first CV folds of a pipeline to the evaluation pool.
+
+        Parameters
+        ----------
+        sklearn_pipeline: sklearn.pipeline.Pipeline
+            The pipeline to evaluate
+        racing_threshold: float or None
+            Racing threshold of the pipeline, None if the pipeline is not raced
+
+        Returns
+        -------
+        key: int
+            Identifier of the evaluation, returned by _receive_fold_result() once it is complete
+        """
+        self._n_evaluations_submitted += 1
+        key = self._n_evaluations_submitted
+        self._fold_tasks[key] = {
+            'sklearn_pipeline': sklearn_pipeline,
+            'racing_threshold': racing_threshold,
+            'fold_scores': [],
+            'fold_stats': [],
+            'n_submitted': 0,
+            'n_received': 0,
+            'time_budget': self.max_eval_time_seconds,
+            'time_spent': 0.
+        }
+        # In racing mode, the next fold of a pipeline is only submitted once
+        # its previous folds show that it can still reach the Pareto front
+        n_folds = self._evaluation_pool.n_folds
+        for _ in range(min(self._racing_min_folds if self.racing else n_folds, n_folds)):
+            self._submit_next_fold(key)
+        return key
+
+    def _submit_group_fold_tasks(self, sklearn_pipelines):
+        """Submit all the CV folds of a group of pipelines sharing their fits to the evaluation pool.
+
+        Each fold of the pipelines is one task, whose result is split into one result
+        per pipeline by the pool.
+
+        Parameters
+        ----------
+        sklearn_pipelines: list
+            Pipelines with the same shared_fit_key()
+
+        Returns
+        -------
+        keys: list
+            Identifier of the evaluation of each pipeline, returned by _receive_fold_result() once it is complete
+        """
+        n_folds = self._evaluation_pool.n_folds
+        keys = []
+        for sklearn_pipeline in sklearn_pipelines:
+            self._n_evaluations_submitted += 1
+            key = self._n_evaluations_submitted
+            # The folds are all submitted at once, so the pipelines are never raced
+            self._fold_tasks[key] = {
+                'sklearn_pipeline': sklearn_pipeline,
+                'racing_threshold': None,
+                'fold_scores': [],
+                'fold_stats': [],
+                'n_submitted': n_folds,
+                'n_received': 0,
+                # Each pipeline is charged its own share of the time of the shared fits
+                'time_budget': self.max_eval_time_seconds,
+                'time_spent': 0.,
+                'group_keys': keys
+            }
+            keys.append(key)
+        # Like in the main process, the group shares the time limits of its pipelines
+        group_timeout = self.max_eval_time_seconds * len(sklearn_pipelines)
+        for fold_idx in range(n_folds):
+            self._evaluation_pool.submit(('group', tuple(keys)), (sklearn_pipelines, fold_idx, group_timeout))
+        return keys
+
+    def _submit_next_fold(self, key):
+        """Submit the next CV fold of an evaluation to the evaluation pool."""
+        fold_task = self._fold_tasks[key]
+        # A fold can use the time left to the pipeline by its previous folds
+        fold_timeout = fold_task['time_budget'] - fold_task['time_spent']
+        self._evaluation_pool.submit(key, (fold_task['sklearn_pipeline'], fold_task['n_submitted'], fold_timeout))
+        fold_task['n_submitted'] += 1
+
+    def _receive_fold_result(self):
+        """Wait for the next fold score from the evaluation pool.
+
+        Returns
+        -------
+        (key, val, cost_stats): tuple
+            Identifier and result of an evaluation once its last fold is scored: the CV score,
+            "Timeout", -inf or, in racing mode, the array of fold scores, and the costs of the
+            scored folds, see _combine_fold_stats. (None, None, None) while the evaluation
+            needs more folds.
+        """
+        key, val, fold_stats = self._evaluation_pool.get_result()
+        self._stop_by_max_time_mins()
+
+        # Late folds of an evaluation that already failed are ignored
+        fold_task = self._fold_tasks.get(key)
+        if fold_task is None:
+            return None, None, None
+        fold_task['n_received'] += 1
+        fold_task['fold_stats'].append(fold_stats)
+        fold_task['time_spent'] += fold_stats.get('fold_time', 0.)
+
+        # The time limit applies to all the folds of the pipeline, like in the main
+        # process, even though its folds run in different workers
+        if not isinstance(val, str) and fold_task['time_spent'] > fold_task['time_budget']:
+            val = "Timeout"
+        # A timed out or failed fold invalidates the whole pipeline
+        if isinstance(val, str) or val == -float('inf'):
+            del self._fold_tasks[key]
+            self._cancel_fold_tasks(key, fold_task)
+            return key, val, _combine_fold_stats(fold_task['fold_stats'])
+
+        fold_scores = fold_task['fold_scores']
+        fold_scores.append(val)
+        if fold_task['n_received'] < fold_task['n_submitted']:
+            return None, None, None
+        racing_threshold = fold_task['racing_threshold']
+        if (fold_task['n_submitted'] < self._evaluation_pool.n_folds and
+                not (racing_threshold is not None and _racing_upper_bound(fold_scores) < racing_threshold)):
+            self._submit_next_fold(key)
+            return None, None, None
+
+        del self._fold_tasks[key]
+        cost_stats = _combine_fold_stats(fold_task['fold_stats'])
+        if self.racing:
+            return key, np.array(fold_scores), cost_stats
+        return key, np.nanmean(fold_scores), cost_stats
+
+    def _cancel_fold_tasks(self, key, fold_task):
+        """Cancel the folds of a dropped evaluation still queued or running in the evaluation pool.
+
+        The folds of a group of pipelines are only cancelled once all the pipelines
+        of the group are dropped, since they score the other pipelines too.
+
+        Parameters
+        ----------
+        key: int
+            Identifier of the dropped evaluation
+        fold_task: dict
+            State of the evaluation, already removed from _fold_tasks
+
+        Returns
+        -------
+        None
+        """
+        group_keys = fold_task.get('group_keys')
+        if group_keys is None:
+            self._evaluation_pool.cancel(key)
+        elif not any(group_key in self._fold_tasks for group_key in group_keys):
+            self._evaluation_pool.cancel(('group', tuple(group_keys)))
+
+    def _shared_fit_groups(self, sklearn_pipeline_list):
+        """Group the pipelines that only differ by the regularization strength of their final linear model.
+
+        Parameters
+        ----------
+        sklearn_pipeline_list: list
+            A list of scikit-learn pipelines to evaluate
+
+        Returns
+        -------
+        fit_groups: list
+            Lists of indices of the pipelines to evaluate together, each pipeline
+            on its own unless regularization_path or batch_neighbors is True, and
+            at most _max_fit_group_size pipelines per list
+        """
+        fit_groups = OrderedDict()
+        for idx, sklearn_pipeline in enumerate(sklearn_pipeline_list):
+            group_key = shared_fit_key(sklearn_pipeline, self.regularization_path, self.batch_neighbors)
+            # The pipelines that share no fit get a key of their own
+            fit_groups.setdefault(group_key if group_key is not None else idx, []).append(idx)
+        # A group is given the sum of the time limits of its pipelines, so a stuck fit
+        # is never allowed more than _max_fit_group_size times the limit of a pipeline
+        size = self._max_fit_group_size
+        return [fit_group[start:start + size] for fit_group in fit_groups.values()
+                for start in range(0, len(fit_group), size)]
+
+    def _racing_threshold(self, operator_count):
+        """Compute the CV score a pipeline must be able to reach to enter the Pareto front.
+
+        Parameters
+        ----------
+        operator_count: int
+            Number of operators in the pipeline
+
+        Returns
+        -------
+        racing_threshold: float or None
+            The best CV score on the current Pareto front among the pipelines
+            with at most operator_count operators. None if racing is disabled
+            or no such pipeline exists yet.
+        """
+        if not self.racing or not self._pareto_front or self.cost_objective is not None:
+            return None
+        front_scores = [pipeline_scores.wvalues[1] for pipeline_scores in self._pareto_front.keys
+                        if -pipeline_scores.wvalues[0] <= operator_count]
+        if not front_scores:
+            return None
+        return max(front_scores)
 
     def _preprocess_individuals(self, individuals):
         """Preprocess DEAP individuals before pipeline evaluation.
@@ -1203,7 +2691,9 @@ class TPOTBase(BaseEstimator):
         if not (self.max_time_mins is None) and not self._pbar.disable and self._pbar.total <= self._pbar.n:
             self._pbar.total += self.offspring_size
         # Check we do not evaluate twice the same individual in one pass.
-        _, unique_individual_indices = np.unique([str(ind) for ind in individuals], return_index=True)
+        # Equivalent pipelines, e.g. with swapped CombineDFs operands, are duplicates too.
+        _, unique_individual_indices = np.unique([self._canonical_key(str(ind)) for ind in individuals],
+                                                 return_index=True)
         unique_individuals = [ind for i, ind in enumerate(individuals) if i in unique_individual_indices]
         # update number of duplicate pipelines
         self._update_pbar(pbar_num=len(individuals) - len(unique_individuals))
@@ -1216,11 +2706,11 @@ class TPOTBase(BaseEstimator):
         sklearn_pipeline_list = []
 
         for individual in unique_individuals:
-            # Disallow certain combinations of operators because they will take too long or take up too much RAM
-            # This is a fairly hacky way to prevent TPOT from getting stuck on bad pipelines and should be improved in a future release
+            # Disallow the pipelines whose intermediate samples would take too long to fit or too much RAM
             individual_str = str(individual)
-            sklearn_pipeline_str = generate_pipeline_code(expr_to_tree(individual, self._pset), self.operators)
-            if sklearn_pipeline_str.count('PolynomialFeatures') > 1:
+            pipeline_tree = expr_to_tree(individual, self._pset)
+            sklearn_pipeline_str = generate_pipeline_code(pipeline_tree, self.operators)
+            if self._pipeline_over_budget(pipeline_tree, self._input_shape, self._n_classes):
                 self.evaluated_individuals_[individual_str] = self._combine_individual_stats(5000.,
                                                                                              -float('inf'),
                                                                                              individual.statistics)
@@ -1230,6 +2720,25 @@ class TPOTBase(BaseEstimator):
                 self._update_pbar(pbar_msg=('Pipeline encountered that has previously been evaluated during the '
                                             'optimization process. Using the score from the previous evaluation.'))
             else:
+                # Check if an equivalent individual was evaluated before
+                equivalent_str = self._evaluated_equivalent(individual_str)
+                if equivalent_str is not None:
+                    self._copy_equivalent_stats(individual, equivalent_str)
+                    self._update_pbar(pbar_msg=('Pipeline encountered that is equivalent to a previously evaluated '
+                                                'pipeline. Using the score from the previous evaluation.'))
+                    continue
+                # Check if the individual was evaluated by a previous TPOT run on the same data
+                if self._evaluation_cache is not None:
+                    cached_stats = self._evaluation_cache.get(individual_str)
+                    # The cost objective needs the costs that older cache entries may not have
+                    if cached_stats is not None and (self.cost_objective is None or 'fold_times' in cached_stats):
+                        self.evaluated_individuals_[individual_str] = self._combine_individual_stats(cached_stats['operator_count'],
+                                                                                                     cached_stats['internal_cv_score'],
+                                                                                                     individual.statistics)
+                        self.evaluated_individuals_[individual_str].update(cached_stats)
+                        self._update_pbar(pbar_msg=('Pipeline encountered that has been evaluated by a previous TPOT run. '
+                                                    'Using the score from the evaluation cache.'))
+                        continue
                 try:
                     # Transform the tree expression into an sklearn pipeline
                     sklearn_pipeline = self._toolbox.compile(expr=individual)
@@ -1258,6 +2767,38 @@ class TPOTBase(BaseEstimator):
 
         return operator_counts, eval_individuals_str, sklearn_pipeline_list, stats_dicts
 
+    def _pipeline_over_budget(self, pipeline_tree, input_shape=None, n_classes=None):
+        """Check if the predicted shapes of the samples of a pipeline make it too expensive to evaluate.
+
+        Parameters
+        ----------
+        pipeline_tree: list
+            Pipeline tree output by expr_to_tree()
+        input_shape: tuple, optional
+            Shape of the training set output by data_shape(). If not supplied, only the
+            degree of the features of the pipeline is checked.
+        n_classes: int, optional
+            Number of classes of the training target
+
+        Returns
+        -------
+        over_budget: bool
+            True if the features of the pipeline are polynomials of a degree above
+            MAX_FEATURE_DEGREE, if its intermediate samples exceed max_pipeline_mb or
+            if the cost of its fit exceeds max_pipeline_fit_cost
+        """
+        n_samples, n_features, density, is_sparse = input_shape if input_shape is not None else (1, 1, 1., False)
+        shape = infer_pipeline_shape(pipeline_tree, self.operators, n_samples, n_features, density, is_sparse,
+                                     n_classes)
+        if shape['degree'] > MAX_FEATURE_DEGREE:
+            return True
+        if input_shape is None:
+            return False
+        if self.max_pipeline_mb is not None and shape['peak_bytes'] > self.max_pipeline_mb * 2 ** 20:
+            return True
+        return (self.max_pipeline_fit_cost is not None and
+                shape['fit_cost'] > self.max_pipeline_fit_cost * n_samples * n_features * density)
+
     def _update_evaluated_individuals_(self, result_score_list, eval_individuals_str, operator_counts, stats_dicts):
         """Update self.evaluated_individuals_ and error message during pipeline evaluation.
 
@@ -1311,7 +2852,7 @@ class TPOTBase(BaseEstimator):
             ind1_copy, ind2_copy = self._toolbox.clone(ind1), self._toolbox.clone(ind2)
             offspring, offspring2 = cxOnePoint(ind1_copy, ind2_copy)
 
-            if str(offspring) not in self.evaluated_individuals_:
+            if self._evaluated_equivalent(str(offspring)) is None:
                 # We only use the first offspring, so we do not care to check uniqueness of the second.
 
                 # update statistics:
@@ -1365,7 +2906,7 @@ class TPOTBase(BaseEstimator):
             # We have to clone the individual because mutator operators work in-place.
             ind = self._toolbox.clone(individual)
             offspring, = mutator(ind)
-            if str(offspring) not in self.evaluated_individuals_:
+            if self._evaluated_equivalent(str(offspring)) is None:
                 # Update statistics
                 # crossover_count is kept the same as for the predecessor
                 # mutation count is increased by 1
@@ -1440,7 +2981,7 @@ class TPOTBase(BaseEstimator):
 
         Parameters
         ----------
-        val: float or "Timeout"
+        val: float, array of fold scores or "Timeout"
             CV scores
         result_score_list: list
             A list of CV scores
@@ -1451,7 +2992,7 @@ class TPOTBase(BaseEstimator):
             A updated list of CV scores
         """
         self._update_pbar()
-        if val == 'Timeout':
+        if isinstance(val, str) and val == 'Timeout':
             self._update_pbar(pbar_msg=('Skipped pipeline #{0} due to time out. '
                                         'Continuing to the next pipeline.'.format(self._pbar.n)))
             result_score_list.append(-float('inf'))
@@ -0,0 +1,828 @@
+# -*- coding: utf-8 -*-
+
+"""This file is part of the TPOT library.
+
+TPOT was primarily developed at the University of Pennsylvania by:
+    - Randal S. Olson (rso@randalolson.com)
+    - Weixuan Fu (weixuanf@upenn.edu)
+    - Daniel Angell (dpa34@drexel.edu)
+    - and many more generous open source contributors
+
+TPOT is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as
+published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+TPOT is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with TPOT. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import os
+import pickle
+import hashlib
+import weakref
+from collections import OrderedDict
+from functools import partial
+from tempfile import mkstemp
+
+import numpy as np
+from scipy import sparse
+import sklearn
+from sklearn.externals.joblib import Memory, dump, load
+from sklearn.externals.joblib import hash as joblib_hash
+
+from ._version import __version__
+from .gp_deap import canonical_pipeline_key
+
+try:
+    import fcntl
+except ImportError:  # fcntl is not available on Windows
+    fcntl = None
+
+
+def _nbytes(data):
+    """Compute the number of bytes held by the arrays of a (nested) data structure.
+
+    Parameters
+    ----------
+    data: array-like, sparse matrix, list, tuple or dict
+        The data structure
+
+    Returns
+    -------
+    nbytes: int
+        Number of bytes of the numpy arrays and sparse matrices in data
+    """
+    if data is None:
+        return 0
+    if sparse.issparse(data):
+        return sum(getattr(data, attr).nbytes for attr in ('data', 'indices', 'indptr') if hasattr(data, attr))
+    if isinstance(data, dict):
+        return sum(_nbytes(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return sum(_nbytes(value) for value in data)
+    return np.asarray(data).nbytes
+
+
+def _dump_pickle(obj, path):
+    """Pickle an object to a file readable by both Python 2 and 3."""
+    with open(path, 'wb') as pickle_file:
+        pickle.dump(obj, pickle_file, protocol=2)
+
+
+def _atomic_write(path, dump_fn):
+    """Write a file through a temporary file in the same directory.
+
+    The temporary file is renamed to path once written, so that readers never
+    see a partially written file.
+
+    Parameters
+    ----------
+    path: string
+        Path of the file
+    dump_fn: callable
+        Function writing the content of the file to the path it is given
+
+    Returns
+    -------
+    None
+    """
+    fd, temp_path = mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    os.close(fd)
+    try:
+        dump_fn(temp_path)
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, path)
+        else:
+            os.rename(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class EvaluationCache(object):
+    """Persistent store of pipeline evaluations shared between TPOT runs.
+
+    Each evaluation is stored in its own file, named after a hash of the
+    evaluation context (training data, cross-validation folds, scoring function,
+    random state and versions of TPOT and scikit-learn) and of the canonical form of the pipeline string, so that the
+    equivalent pipelines share their evaluation. Files are written atomically so
+    that several TPOT processes on the same host can share one directory,
+    and the least recently used entries are removed once the directory
+    grows over max_bytes.
+    """
+
+    def __init__(self, cachedir, max_bytes=50 * 2 ** 20):
+        """Set up the evaluation store.
+
+        Parameters
+        ----------
+        cachedir: string
+            Path of the directory holding the evaluations, created if it does not exist
+        max_bytes: int, optional (default: 50 MB)
+            Size of the directory above which the least recently used evaluations are removed
+
+        Returns
+        -------
+        None
+        """
+        self.cachedir = cachedir
+        self.max_bytes = max_bytes
+        self._context_key = ''
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+
+    def set_context(self, features, target, cv_iter, scoring_function, sample_weight=None, random_state=None):
+        """Fingerprint the evaluation context that the stored evaluations depend on.
+
+        Parameters
+        ----------
+        features: array-like {n_samples, n_features}
+            Feature matrix
+        target: array-like {n_samples}
+            List of class labels for prediction
+        cv_iter: list
+            List of (train, test) indices of the cross-validation folds
+        scoring_function: string
+            Name of the scorer in tpot.metrics.SCORERS
+        sample_weight: array-like {n_samples}, optional
+            List of sample weights
+        random_state: int, optional
+            Random state set on the operators of the pipelines
+
+        Returns
+        -------
+        None
+        """
+        # Hash the raw bytes of the fold indices instead of converting them to lists
+        folds_hash = hashlib.sha1()
+        for train, test in cv_iter:
+            for indices in (train, test):
+                indices = np.ascontiguousarray(indices)
+                folds_hash.update('{}:{}:'.format(indices.dtype.str, indices.shape[0]).encode('utf-8'))
+                folds_hash.update(indices.tobytes())
+        # Another seed or version of the libraries can give the same pipeline another score
+        self._context_key = joblib_hash((features, target, sample_weight, folds_hash.hexdigest(),
+                                         scoring_function, random_state, __version__, sklearn.__version__))
+
+    def _path(self, pipeline_str):
+        key = hashlib.sha1('{}:{}'.format(self._context_key,
+                                          canonical_pipeline_key(pipeline_str)).encode('utf-8')).hexdigest()
+        return os.path.join(self.cachedir, key + '.pkl')
+
+    def get(self, pipeline_str):
+        """Look up a stored evaluation of a pipeline in the current context.
+
+        Parameters
+        ----------
+        pipeline_str: string
+            String representation of the pipeline
+
+        Returns
+        -------
+        stats: dict or None
+            Stored 'operator_count' and 'internal_cv_score' of the pipeline, None if it was never stored
+        """
+        path = self._path(pipeline_str)
+        try:
+            with open(path, 'rb') as cache_file:
+                stats = pickle.load(cache_file)
+            # Mark the entry as recently used for the eviction
+            os.utime(path, None)
+        except Exception:
+            return None
+        return stats
+
+    def put(self, pipeline_str, stats):
+        """Store the evaluation of a pipeline in the current context.
+
+        Parameters
+        ----------
+        pipeline_str: string
+            String representation of the pipeline
+        stats: dict
+            Evaluation statistics of the pipeline
+
+        Returns
+        -------
+        None
+        """
+        try:
+            _atomic_write(self._path(pipeline_str), partial(_dump_pickle, stats))
+        except Exception:
+            pass
+
+    def evict(self):
+        """Remove the least recently used evaluations until the directory fits in max_bytes.
+
+        Returns
+        -------
+        None
+        """
+        _evict_lru(self.cachedir, self.max_bytes)
+
+
+class PretestMemo(object):
+    """Outcomes of the pretests of pipelines on the small pretest data set.
+
+    A pipeline whose fit failed is recorded by the prefix of its steps that
+    failed, so that any pipeline starting with the same prefix is known to
+    fail without being fitted. The pipelines that passed are recorded too.
+    The outcomes can be saved to a file shared between TPOT runs.
+    """
+
+    def __init__(self, context=''):
+        """Set up an empty memo.
+
+        Parameters
+        ----------
+        context: string, optional
+            Identifier of the pretest data set and library versions that the outcomes depend on
+
+        Returns
+        -------
+        None
+        """
+        self.context = context
+        self.failed = set()
+        self.passed = set()
+
+    def lookup(self, prefix_keys):
+        """Look up the pretest outcome of a pipeline.
+
+        Parameters
+        ----------
+        prefix_keys: list of strings
+            Keys of the prefixes of the pipeline, from its first step to the whole pipeline
+
+        Returns
+        -------
+        outcome: bool or None
+            False if one of the prefixes failed, True if the pipeline passed,
+            None if its outcome is unknown
+        """
+        for prefix_key in prefix_keys:
+            if prefix_key in self.failed:
+                return False
+        if prefix_keys and prefix_keys[-1] in self.passed:
+            return True
+        return None
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as memo_file:
+                memo = pickle.load(memo_file)
+            return memo.get(self.context, (set(), set()))
+        except Exception:
+            return set(), set()
+
+    def load(self, path):
+        """Add the outcomes saved in a file to the memo.
+
+        Parameters
+        ----------
+        path: string
+            Path of the file, ignored if it does not exist or cannot be read
+
+        Returns
+        -------
+        None
+        """
+        failed, passed = self._read(path)
+        self.failed.update(failed)
+        self.passed.update(passed)
+
+    def save(self, path):
+        """Save the memo to a file, merged with the outcomes saved there by other runs.
+
+        Parameters
+        ----------
+        path: string
+            Path of the file
+
+        Returns
+        -------
+        None
+        """
+        try:
+            with open(path, 'rb') as memo_file:
+                memo = pickle.load(memo_file)
+        except Exception:
+            memo = {}
+        failed, passed = memo.get(self.context, (set(), set()))
+        memo[self.context] = (failed | self.failed, passed | self.passed)
+        try:
+            _atomic_write(path, partial(_dump_pickle, memo))
+        except Exception:
+            pass
+
+
+def _evict_lru(cachedir, max_bytes):
+    """Remove the least recently used .pkl files of a directory until it fits in max_bytes.
+
+    The files are marked as used by updating their modification time. Only one
+    process evicts at a time, the others skip the eviction.
+
+    Parameters
+    ----------
+    cachedir: string
+        Path of the directory
+    max_bytes: int
+        Size of the .pkl files above which the oldest ones are removed
+
+    Returns
+    -------
+    None
+    """
+    lock_file = open(os.path.join(cachedir, '.lock'), 'w')
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                # Another TPOT process is already evicting
+                return
+        entries = []
+        for file_name in os.listdir(cachedir):
+            if not file_name.endswith('.pkl'):
+                continue
+            try:
+                file_stat = os.stat(os.path.join(cachedir, file_name))
+            except OSError:
+                continue
+            entries.append((file_stat.st_mtime, file_stat.st_size, file_name))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, file_name in sorted(entries):
+            if total_bytes <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(cachedir, file_name))
+            except OSError:
+                pass
+            total_bytes -= size
+    finally:
+        lock_file.close()
+
+
+class PrefixCache(object):
+    """In-process LRU cache of the outputs of fitted pipeline prefixes on the CV folds.
+
+    Pipelines of a TPOT run often start with the same transformers, e.g.
+    StandardScaler followed by PCA feeding different classifiers. The
+    transformed training and testing samples of a fold are kept under the
+    canonical string of the prefix and the identifier of the fold, so that
+    the other pipelines sharing the prefix only fit their remaining steps.
+    The column statistics computed by the univariate selectors and by
+    VarianceThreshold on the output of a prefix are kept too, so that the
+    selectors with other thresholds only slice them. The fitted PCA and
+    FastICA decompositions of the output of a prefix are kept within a
+    budget of their own, see get_decompositions().
+    The training data is never hashed: the cache is only valid for the data
+    it was filled with and a new cache is used for each call to fit().
+    """
+
+    def __init__(self, max_bytes, decomposition_bytes=0):
+        """Set up an empty cache.
+
+        Parameters
+        ----------
+        max_bytes: int
+            Maximum size of the cached arrays in bytes, the least recently
+            used entries are evicted beyond it
+        decomposition_bytes: int, optional (default: 0)
+            Maximum size of the arrays of the cached decompositions in bytes,
+            the least recently used ones are evicted beyond it
+
+        Returns
+        -------
+        None
+        """
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self.decomposition_bytes = decomposition_bytes
+        self.n_decomposition_bytes = 0
+        self._decompositions = OrderedDict()
+
+    def longest_prefix(self, prefix_keys, fold_key):
+        """Find the longest cached prefix of a pipeline on a fold.
+
+        Parameters
+        ----------
+        prefix_keys: list of str
+            Canonical strings of the prefixes of the pipeline, shortest first
+        fold_key: hashable
+            Identifier of the CV fold
+
+        Returns
+        -------
+        (n_steps, entry): tuple
+            Number of steps of the cached prefix and its entry, see put(), or (0, None)
+        """
+        for n_steps in range(len(prefix_keys), 0, -1):
+            key = (prefix_keys[n_steps - 1], fold_key)
+            if key in self._entries:
+                entry = self._entries.pop(key)
+                # Move the entry to the most recently used end
+                self._entries[key] = entry
+                self.hits += 1
+                return n_steps, entry
+        self.misses += 1
+        return 0, None
+
+    def put(self, prefix_key, fold_key, entry):
+        """Store the outputs of a fitted prefix on a fold.
+
+        Parameters
+        ----------
+        prefix_key: str
+            Canonical string of the prefix
+        fold_key: hashable
+            Identifier of the CV fold
+        entry: tuple
+            (X_train, X_test, fit_time, transform_time, model_size) tuple: transformed
+            training and testing samples, time to fit the prefix and to transform the
+            testing samples in seconds and pickled size of the fitted prefix in bytes.
+            For column statistics, see get_statistics().
+
+        Returns
+        -------
+        None
+        """
+        key = (prefix_key, fold_key)
+        entry_bytes = _nbytes(entry[:2])
+        if entry_bytes > self.max_bytes or key in self._entries:
+            return
+        while self._entries and self.n_bytes + entry_bytes > self.max_bytes:
+            _, evicted_entry = self._entries.popitem(last=False)
+            self.n_bytes -= _nbytes(evicted_entry[:2])
+        self._entries[key] = entry
+        self.n_bytes += entry_bytes
+
+    def get_statistics(self, statistics_key, fold_key):
+        """Look up the column statistics computed by a selector on the output of a prefix.
+
+        Parameters
+        ----------
+        statistics_key: str
+            Canonical string of the prefix followed by the one of the statistics
+        fold_key: hashable
+            Identifier of the CV fold
+
+        Returns
+        -------
+        entry: tuple or None
+            (statistics, pvalues, compute_time) tuple: statistics of the columns, their
+            p-values or None and time to compute them in seconds, None if not cached
+        """
+        key = (statistics_key, fold_key)
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            # Move the entry to the most recently used end
+            self._entries[key] = entry
+        return entry
+
+    def get_decompositions(self, decomposition_key, fold_key):
+        """Look up the fitted decompositions of the output of a prefix.
+
+        Parameters
+        ----------
+        decomposition_key: str
+            Canonical string of the prefix followed by the one of the decomposition,
+            without the parameters that a cached fit can stand for
+        fold_key: hashable
+            Identifier of the CV fold
+
+        Returns
+        -------
+        entries: list
+            (decomposition, fit_time) tuples: fitted decomposition and time to fit it
+            in seconds, empty if none is cached
+        """
+        key = (decomposition_key, fold_key)
+        entries = self._decompositions.pop(key, None)
+        if entries is None:
+            return []
+        # Move the entries to the most recently used end
+        self._decompositions[key] = entries
+        return list(entries)
+
+    def put_decompositions(self, decomposition_key, fold_key, entries):
+        """Store the fitted decompositions of the output of a prefix, replacing the ones stored before.
+
+        Parameters
+        ----------
+        decomposition_key: str
+            Canonical string of the prefix followed by the one of the decomposition,
+            see get_decompositions()
+        fold_key: hashable
+            Identifier of the CV fold
+        entries: list
+            (decomposition, fit_time) tuples, see get_decompositions()
+
+        Returns
+        -------
+        None
+        """
+        key = (decomposition_key, fold_key)
+        if key in self._decompositions:
+            self.n_decomposition_bytes -= _decompositions_nbytes(self._decompositions.pop(key))
+        entries_bytes = _decompositions_nbytes(entries)
+        if entries_bytes > self.decomposition_bytes:
+            return
+        while self._decompositions and self.n_decomposition_bytes + entries_bytes > self.decomposition_bytes:
+            _, evicted_entries = self._decompositions.popitem(last=False)
+            self.n_decomposition_bytes -= _decompositions_nbytes(evicted_entries)
+        self._decompositions[key] = list(entries)
+        self.n_decomposition_bytes += entries_bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _decompositions_nbytes(entries):
+    """Compute the number of bytes held by the fitted attributes of cached decompositions."""
+    return _nbytes([[value for attr, value in vars(decomposition).items() if attr.endswith('_')]
+                    for decomposition, _ in entries])
+
+
+class _MemoryState(object):
+    """Data tokens and statistics shared by the copies of a TPOTMemory in one process."""
+
+    def __init__(self):
+        self.tokens = {}
+        self.hits = 0
+        self.misses = 0
+
+    def token(self, data):
+        """Return the token registered for an array, None if it has none."""
+        entry = self.tokens.get(id(data))
+        if entry is not None and entry[0]() is data:
+            return entry[1]
+        return None
+
+    def register(self, data, token):
+        """Register the token identifying the content of an array or sparse matrix."""
+        if not (isinstance(data, np.ndarray) or sparse.issparse(data)):
+            return
+        data_id = id(data)
+        ref = weakref.ref(data, partial(self._forget, data_id))
+        self.tokens[data_id] = (ref, token)
+
+    def _forget(self, data_id, ref):
+        # A newer array may have been registered under the id of the collected one
+        entry = self.tokens.get(data_id)
+        if entry is not None and entry[0] is ref:
+            del self.tokens[data_id]
+
+
+# State of the TPOTMemory objects of this process by output directory. The
+# pipelines are cloned for each fold, which deep-copies their memory, so the
+# tokens and statistics cannot be held by the TPOTMemory instances themselves.
+_memory_states = {}
+
+
+def _memory_counts():
+    """Snapshot the cache hits and misses of the TPOTMemory objects of this process.
+
+    Returns
+    -------
+    counts: dict
+        (hits, misses) of each output directory
+    """
+    return dict((outputdir, (state.hits, state.misses)) for outputdir, state in _memory_states.items())
+
+
+def _memory_counts_since(counts):
+    """Count the cache hits and misses of this process since a snapshot taken by _memory_counts().
+
+    Parameters
+    ----------
+    counts: dict
+        Snapshot returned by _memory_counts()
+
+    Returns
+    -------
+    counts: dict
+        (hits, misses) of each output directory since the snapshot, without the unchanged directories
+    """
+    new_counts = {}
+    for outputdir, (hits, misses) in _memory_counts().items():
+        old_hits, old_misses = counts.get(outputdir, (0, 0))
+        if (hits, misses) != (old_hits, old_misses):
+            new_counts[outputdir] = (hits - old_hits, misses - old_misses)
+    return new_counts
+
+
+def _add_memory_counts(counts):
+    """Add the cache hits and misses counted by a worker process to the TPOTMemory objects of this process.
+
+    Parameters
+    ----------
+    counts: dict
+        (hits, misses) of each output directory, see _memory_counts_since()
+
+    Returns
+    -------
+    None
+    """
+    for outputdir, (hits, misses) in counts.items():
+        state = _memory_states.setdefault(outputdir, _MemoryState())
+        state.hits += hits
+        state.misses += misses
+
+
+class TPOTMemory(Memory):
+    """joblib Memory managed by TPOT for the memory parameter.
+
+    The transformer outputs cached by the pipelines are stored under a key
+    built from tokens instead of hashes of the data: the training samples of
+    each fold get a token derived from a hash of the training set computed
+    once per call to fit() and of the fold indices, and each cached output
+    gets a token derived from the key of the call that produced it. The
+    cache directory is kept under max_bytes by removing the least recently
+    used outputs between generations, and the cache hits and misses are
+    counted. The EvaluationPool adds the counts of its worker processes to
+    the ones of the main process.
+    """
+
+    def __init__(self, cachedir, max_bytes=None, data_token=None, verbose=0):
+        """Set up the managed memory.
+
+        Parameters
+        ----------
+        cachedir: string
+            Path of the base directory of the cache
+        max_bytes: int, optional
+            Size of the cached outputs above which the least recently used ones are
+            removed by evict(). By default, the size of the cache is not limited.
+        data_token: string, optional
+            Hash of the training set, see set_data()
+        verbose: int, optional (default: 0)
+            Verbosity of joblib
+
+        Returns
+        -------
+        None
+        """
+        Memory.__init__(self, cachedir=cachedir, verbose=verbose)
+        self._base_cachedir = cachedir
+        self.max_bytes = max_bytes
+        self.data_token = data_token
+        self._outputdir = os.path.join(self.cachedir, 'tpot')
+        if not os.path.isdir(self._outputdir):
+            try:
+                os.makedirs(self._outputdir)
+            except OSError:
+                # Created in the meantime by another process
+                pass
+
+    def __reduce__(self):
+        return (self.__class__, (self._base_cachedir, self.max_bytes, self.data_token, self._verbose))
+
+    @property
+    def _state(self):
+        if self._outputdir not in _memory_states:
+            _memory_states[self._outputdir] = _MemoryState()
+        return _memory_states[self._outputdir]
+
+    @property
+    def hits(self):
+        """Number of outputs loaded from the cache by this process and its evaluation workers."""
+        return self._state.hits
+
+    @property
+    def misses(self):
+        """Number of outputs computed and stored in the cache by this process and its evaluation workers."""
+        return self._state.misses
+
+    def set_data(self, features, target):
+        """Hash the training set once for the tokens of the folds.
+
+        Parameters
+        ----------
+        features: array-like {n_samples, n_features}
+            Feature matrix
+        target: array-like {n_samples}
+            List of class labels for prediction
+
+        Returns
+        -------
+        None
+        """
+        self.data_token = joblib_hash((features, target))
+
+    def register_fold(self, features, target, train):
+        """Give tokens to the training samples of a fold so that they are never hashed.
+
+        Parameters
+        ----------
+        features: array-like
+            Training samples of the fold
+        target: array-like
+            Targets of the training samples
+        train: array-like
+            Indices of the training samples in the training set given to set_data()
+
+        Returns
+        -------
+        None
+        """
+        if self.data_token is None:
+            return
+        state = self._state
+        fold_token = state.token(train)
+        if fold_token is None:
+            fold_token = joblib_hash((self.data_token, train))
+            state.register(train, fold_token)
+        state.register(features, fold_token + '-features')
+        state.register(target, fold_token + '-target')
+
+    def cache(self, func=None, ignore=None, verbose=None, mmap_mode=False):
+        """Decorate a function to store its outputs in the managed cache.
+
+        Parameters
+        ----------
+        func: callable, optional
+            The function to decorate
+        ignore, verbose, mmap_mode:
+            Unused, kept for compatibility with joblib.Memory.cache
+
+        Returns
+        -------
+        decorated_func: callable
+            Function that loads its output from the cache when it was called before
+            with the same arguments
+        """
+        if func is None:
+            return partial(self.cache, ignore=ignore, verbose=verbose, mmap_mode=mmap_mode)
+        return _TokenizedFunc(self, func)
+
+    def _call_key(self, func, args, kwargs):
+        """Hash the arguments of a call, using the tokens of the registered arrays."""
+        state = self._state
+
+        def tokenize(value):
+            token = state.token(value)
+            return value if token is None else ('tpot-token', token)
+
+        return joblib_hash((func.__module__, func.__name__,
+                            [tokenize(value) for value in args],
+                            sorted((name, tokenize(value)) for name, value in kwargs.items())))
+
+    def _call(self, func, args, kwargs):
+        """Load the output of a call from the cache, or compute and store it."""
+        key = self._call_key(func, args, kwargs)
+        path = os.path.join(self._outputdir, key + '.pkl')
+        state = self._state
+        try:
+            output = load(path)
+            # Mark the output as recently used for the eviction
+            os.utime(path, None)
+            state.hits += 1
+        except Exception:
+            output = func(*args, **kwargs)
+            state.misses += 1
+            self._store(path, output)
+        # The outputs are passed on to the next steps of the pipeline
+        if isinstance(output, tuple):
+            for idx, value in enumerate(output):
+                state.register(value, '{}-{}'.format(key, idx))
+        else:
+            state.register(output, key)
+        return output
+
+    def _store(self, path, output):
+        try:
+            _atomic_write(path, partial(dump, output))
+        except Exception:
+            pass
+
+    def evict(self):
+        """Remove the least recently used outputs until the cache fits in max_bytes.
+
+        Returns
+        -------
+        None
+        """
+        if self.max_bytes is not None:
+            _evict_lru(self._outputdir, self.max_bytes)
+
+
+class _TokenizedFunc(object):
+    """Function whose outputs are stored in a TPOTMemory."""
+
+    def __init__(self, memory, func):
+        self.memory = memory
+        self.func = func
+
+    def __call__(self, *args, **kwargs):
+        return self.memory._call(self.func, args, kwargs)
@@ -28,7 +28,8 @@ from functools import wraps
 import warnings
 from sklearn.datasets import make_classification, make_regression
 from .export_utils import expr_to_tree, generate_pipeline_code
-from deap import creator
+from .gp_deap import _estimator_key
+from deap import gp
 
 NUM_TESTS = 10
 
@@ -38,12 +39,71 @@ pretest_X, pretest_y = make_classification(n_samples=50, n_features=10, random_s
 pretest_X_reg, pretest_y_reg = make_regression(n_samples=50, n_features=10, random_state=42)
 
 
+def _pretest_fit(sklearn_pipeline, features, target, pretest_memo=None):
+    """Fit a pipeline on the pretest data set, raising an exception if the fit fails.
+
+    With a memo, the pipelines that start with a prefix known to fail are rejected
+    and the pipelines known to pass are accepted without being fitted. The steps
+    are otherwise fitted one by one to record the prefix that failed.
+
+    Parameters
+    ----------
+    sklearn_pipeline: sklearn.pipeline.Pipeline
+        The pipeline to test
+    features: numpy.ndarray {n_samples, n_features}
+        Pretest feature matrix
+    target: numpy.ndarray {n_samples}
+        Pretest target
+    pretest_memo: PretestMemo, optional
+        Outcomes of the previous pretests
+
+    Returns
+    -------
+    None
+    """
+    if pretest_memo is None:
+        sklearn_pipeline.fit(features, target)
+        return
+
+    steps = sklearn_pipeline.steps if hasattr(sklearn_pipeline, 'steps') else [('', sklearn_pipeline)]
+    prefix_keys = []
+    for _, step in steps:
+        step_key = _estimator_key(step)
+        prefix_keys.append(prefix_keys[-1] + ' -> ' + step_key if prefix_keys else step_key)
+
+    outcome = pretest_memo.lookup(prefix_keys)
+    if outcome is False:
+        raise ValueError('This pipeline is known to fail on the pretest data set.')
+    if outcome is True:
+        return
+
+    Xt = features
+    for step_idx, (_, step) in enumerate(steps):
+        try:
+            if step_idx == len(steps) - 1:
+                step.fit(Xt, target)
+            elif hasattr(step, 'fit_transform'):
+                Xt = step.fit_transform(Xt, target)
+            else:
+                Xt = step.fit(Xt, target).transform(Xt)
+        except Exception:
+            pretest_memo.failed.add(prefix_keys[step_idx])
+            raise
+    pretest_memo.passed.add(prefix_keys[-1])
+
+
 def _pre_test(func):
     """Check if the wrapped function works with a pretest data set.
 
     Reruns the wrapped function until it generates a good pipeline, for a max of
     NUM_TESTS times.
 
+    The pretests run in the main process and not in the evaluation workers: each
+    retry depends on the outcome of the previous one, and the initial population is
+    generated before the workers are started. A fit on the 50 rows of the pretest
+    data set is also cheaper than a round trip to a worker, so the repeated fits
+    are avoided by the pretest memo instead, see _pretest_fit().
+
     Parameters
     ----------
     func: function
@@ -63,7 +123,7 @@ def _pre_test(func):
         while bad_pipeline and num_test < NUM_TESTS:
             # clone individual before each func call so it is not altered for
             # the possible next cycle loop
-            args = [self._toolbox.clone(arg) if isinstance(arg, creator.Individual) else arg for arg in args]
+            args = [self._toolbox.clone(arg) if isinstance(arg, gp.PrimitiveTree) else arg for arg in args]
 
             try:
                 with warnings.catch_warnings():
@@ -82,9 +142,9 @@ def _pre_test(func):
                         sklearn_pipeline = eval(pipeline_code, self.operators_context)
 
                         if self.classification:
-                            sklearn_pipeline.fit(pretest_X, pretest_y)
+                            _pretest_fit(sklearn_pipeline, pretest_X, pretest_y, self._pretest_memo)
                         else:
-                            sklearn_pipeline.fit(pretest_X_reg, pretest_y_reg)
+                            _pretest_fit(sklearn_pipeline, pretest_X_reg, pretest_y_reg, self._pretest_memo)
                         bad_pipeline = False
             except BaseException as e:
                 message = '_pre_test decorator: {fname}: num_test={n} {e}'.format(
@@ -399,6 +399,19 @@ def _get_arg_parser():
         )
     )
 
+    parser.add_argument(
+        '-resume',
+        action='store',
+        dest='RESUME_FROM',
+        default=None,
+        type=str,
+        help=(
+            'Path of a checkpoint saved in the checkpoint folder (-cf) by a previous '
+            'run on the same data with the same settings. The optimization continues '
+            'from the last generation saved in the checkpoint.'
+        )
+    )
+
     parser.add_argument(
         '-v',
         action='store',
@@ -529,7 +542,7 @@ def tpot_driver(args):
         disable_update_check=args.DISABLE_UPDATE_CHECK
     )
 
-    tpot_obj.fit(training_features, training_target)
+    tpot_obj.fit(training_features, training_target, resume_from=args.RESUME_FROM)
 
     if args.VERBOSITY in [1, 2] and tpot_obj._optimized_pipeline:
         training_score = max([x.wvalues[1] for x in tpot_obj._pareto_front.keys])
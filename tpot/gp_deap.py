@@ -23,13 +23,27 @@ License along with TPOT. If not, see <http://www.gnu.org/licenses/>.
 
 """
 
+import sys
+import pickle
+import numbers
+from time import time
 import numpy as np
+from scipy import stats
 from deap import tools, gp
 from inspect import isclass
 from .operator_utils import set_sample_weight
-from sklearn.utils import indexable
-from sklearn.metrics.scorer import check_scoring
-from sklearn.model_selection._validation import _fit_and_score
+from sklearn.utils import indexable, safe_indexing
+from sklearn.utils.validation import _num_samples, check_X_y
+try:
+    from sklearn.neighbors.base import _get_weights
+except ImportError:  # Private helper of scikit-learn, the neighbors are then never batched
+    _get_weights = None
+try:
+    from sklearn.utils.metaestimators import _safe_split
+except ImportError:  # Private helper of scikit-learn, see _split_fold()
+    _safe_split = None
+from sklearn.metrics.scorer import check_scoring, _BaseScorer
+from sklearn.model_selection._validation import _index_param_value, _score
 from sklearn.model_selection._split import check_cv
 
 from sklearn.base import clone, is_classifier
@@ -37,40 +51,183 @@ from collections import defaultdict
 import warnings
 from stopit import threading_timeoutable, TimeoutException
 
+try:
+    import resource
+except ImportError:  # resource is not available on Windows
+    resource = None
 
-def pick_two_individuals_eligible_for_crossover(population):
+
+# Parameters that have no effect on an operator for some values of another of its
+# parameters: {operator: [(parameter, controlling parameter, values ignoring the parameter)]}
+_IRRELEVANT_PARAMETERS = {
+    # alpha is the quantile of the huber and quantile losses only
+    'GradientBoostingRegressor': [('alpha', 'loss', ('ls', 'lad'))],
+    # the kernels below do not have a gamma parameter
+    'Nystroem': [('gamma', 'kernel', ('linear', 'cosine', 'additive_chi2'))]
+}
+
+
+def _is_parameter(arg_str):
+    """Check if an argument of a pipeline string is a parameter and not an input operator."""
+    return '=' in arg_str and ('(' not in arg_str or arg_str.index('=') < arg_str.index('('))
+
+
+def _split_arguments(args_str):
+    """Split the arguments of an operator in a pipeline string at the top level commas."""
+    args = []
+    depth = 0
+    start = 0
+    for i, char in enumerate(args_str):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            args.append(args_str[start:i].strip())
+            start = i + 1
+    args.append(args_str[start:].strip())
+    return args
+
+
+def canonical_pipeline_key(pipeline_str):
+    """Compute a canonical form of a pipeline which is shared by the equivalent pipelines.
+
+    The operands of CombineDFs are sorted and the parameters that have no effect
+    on their operator, given the values of its other parameters, are removed.
+
+    Parameters
+    ----------
+    pipeline_str: string
+        String representation of a DEAP individual
+
+    Returns
+    -------
+    canonical_str: string
+        Canonical string representation of the pipeline
+    """
+    if '(' not in pipeline_str or _is_parameter(pipeline_str):
+        return pipeline_str
+    op_name, args_str = pipeline_str.split('(', 1)
+    args = [canonical_pipeline_key(arg) for arg in _split_arguments(args_str[:-1])]
+    if op_name == 'CombineDFs':
+        args = sorted(args)
+    elif op_name in _IRRELEVANT_PARAMETERS:
+        values = {}
+        for arg in args:
+            if _is_parameter(arg):
+                parameter, value = arg.split('=', 1)
+                values[parameter.split('__')[-1]] = value
+        irrelevant = set(op_name + '__' + parameter
+                         for parameter, controlling_parameter, ignoring_values in _IRRELEVANT_PARAMETERS[op_name]
+                         if values.get(controlling_parameter) in ignoring_values)
+        args = [arg for arg in args if not (_is_parameter(arg) and arg.split('=', 1)[0] in irrelevant)]
+    return '{}({})'.format(op_name, ', '.join(args))
+
+
+class CrossoverIndex(object):
+    """Inverted index from the primitives to the individuals of a population that contain them.
+
+    The index is built once per variation step and samples the pairs of individuals
+    eligible for crossover without enumerating all of them.
+    """
+
+    # Number of rejected samples after which all the eligible pairs are enumerated,
+    # e.g. when most of the individuals sharing a primitive are equivalent
+    max_rejections = 100
+
+    def __init__(self, population):
+        """Index the primitives of a population.
+
+        Parameters
+        ----------
+        population: array of individuals
+        """
+        self.population = population
+        self._primitives = [frozenset([node.name for node in ind if isinstance(node, gp.Primitive)])
+                            for ind in population]
+        self._keys = [canonical_pipeline_key(str(ind)) for ind in population]
+        individuals_by_primitive = defaultdict(list)
+        for idx, primitives in enumerate(self._primitives):
+            for primitive in primitives:
+                individuals_by_primitive[primitive].append(idx)
+        self._members = [np.array(individuals_by_primitive[primitive])
+                         for primitive in sorted(individuals_by_primitive)
+                         if len(individuals_by_primitive[primitive]) > 1]
+        # A primitive is picked with a probability proportional to its number of ordered pairs
+        n_pairs = np.array([len(members) * (len(members) - 1) for members in self._members], dtype=float)
+        self._cumulative_weights = np.cumsum(n_pairs) / n_pairs.sum() if len(n_pairs) else n_pairs
+        self._eligible_pairs = None
+
+    def sample(self):
+        """Pick two individuals which share a primitive, uniformly among all such pairs.
+
+        Returns
+        ----------
+        tuple: (individual, individual)
+            Two individuals which are not equivalent, but share at least one primitive.
+            Alternatively, if no such pair exists in the population, (None, None) is returned instead.
+        """
+        if not self._members:
+            return None, None
+
+        for _ in range(self.max_rejections):
+            primitive_idx = min(np.searchsorted(self._cumulative_weights, np.random.random(), side='right'),
+                                len(self._members) - 1)
+            members = self._members[primitive_idx]
+            pos1 = np.random.randint(0, len(members))
+            pos2 = np.random.randint(0, len(members) - 1)
+            if pos2 >= pos1:
+                pos2 += 1
+            idx1, idx2 = members[pos1], members[pos2]
+            if self._keys[idx1] == self._keys[idx2]:
+                continue
+            # A pair sharing several primitives can be drawn through each of them,
+            # it is only kept with the inverse probability to keep the sampling uniform
+            n_shared = len(self._primitives[idx1] & self._primitives[idx2])
+            if n_shared > 1 and np.random.random() * n_shared >= 1:
+                continue
+            return self.population[idx1], self.population[idx2]
+
+        return self._sample_from_eligible_pairs()
+
+    def _sample_from_eligible_pairs(self):
+        """Pick two individuals eligible for crossover by enumerating all the eligible pairs."""
+        if self._eligible_pairs is None:
+            self._eligible_pairs = [(i, i+1+j) for i, ind1_prims in enumerate(self._primitives)
+                                    for j, ind2_prims in enumerate(self._primitives[i+1:])
+                                    if not ind1_prims.isdisjoint(ind2_prims) and
+                                    self._keys[i] != self._keys[i+1+j]]
+            # Pairs are eligible in both orders, this ensures that both orders are considered
+            self._eligible_pairs += [(j, i) for (i, j) in self._eligible_pairs]
+
+        if not self._eligible_pairs:
+            # If there are no eligible pairs, the caller should decide what to do
+            return None, None
+
+        pair = np.random.randint(0, len(self._eligible_pairs))
+        idx1, idx2 = self._eligible_pairs[pair]
+
+        return self.population[idx1], self.population[idx2]
+
+
+def pick_two_individuals_eligible_for_crossover(population, crossover_index=None):
     """Pick two individuals from the population which can do crossover, that is, they share a primitive.
 
     Parameters
     ----------
     population: array of individuals
+    crossover_index: CrossoverIndex, optional
+        Index of the primitives of the population, built if not provided
 
     Returns
     ----------
     tuple: (individual, individual)
-        Two individuals which are not the same, but share at least one primitive.
+        Two individuals which are not equivalent, but share at least one primitive.
         Alternatively, if no such pair exists in the population, (None, None) is returned instead.
     """
-    primitives_by_ind = [set([node.name for node in ind if isinstance(node, gp.Primitive)])
-                         for ind in population]
-    pop_as_str = [str(ind) for ind in population]
-
-    eligible_pairs = [(i, i+1+j) for i, ind1_prims in enumerate(primitives_by_ind)
-                                 for j, ind2_prims in enumerate(primitives_by_ind[i+1:])
-                                 if not ind1_prims.isdisjoint(ind2_prims) and
-                                    pop_as_str[i] != pop_as_str[i+1+j]]
-
-    # Pairs are eligible in both orders, this ensures that both orders are considered
-    eligible_pairs += [(j, i) for (i, j) in eligible_pairs]
-
-    if not eligible_pairs:
-        # If there are no eligible pairs, the caller should decide what to do
-        return None, None
-
-    pair = np.random.randint(0, len(eligible_pairs))
-    idx1, idx2 = eligible_pairs[pair]
-
-    return population[idx1], population[idx2]
+    if crossover_index is None:
+        crossover_index = CrossoverIndex(population)
+    return crossover_index.sample()
 
 
 def mutate_random_individual(population, toolbox):
@@ -126,11 +283,15 @@ def varOr(population, toolbox, lambda_, cxpb, mutpb):
     1 - *cxpb* - *mutpb*.
     """
     offspring = []
+    # The index of the parental population is built at the first crossover
+    crossover_index = None
 
     for _ in range(lambda_):
         op_choice = np.random.random()
         if op_choice < cxpb:  # Apply crossover
-            ind1, ind2 = pick_two_individuals_eligible_for_crossover(population)
+            if crossover_index is None:
+                crossover_index = CrossoverIndex(population)
+            ind1, ind2 = pick_two_individuals_eligible_for_crossover(population, crossover_index)
             if ind1 is not None:
                 ind1, _ = toolbox.mate(ind1, ind2)
                 del ind1.fitness.values
@@ -172,7 +333,8 @@ def initialize_stats_dict(individual):
 
 
 def eaMuPlusLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen, pbar,
-                   stats=None, halloffame=None, verbose=0, per_generation_function=None):
+                   stats=None, halloffame=None, verbose=0, per_generation_function=None,
+                   prescreen_factor=1, start_gen=0, checkpoint_function=None):
     """This is the :math:`(\mu + \lambda)` evolutionary algorithm.
     :param population: A list of individuals.
     :param toolbox: A :class:`~deap.base.Toolbox` that contains the evolution
@@ -190,6 +352,14 @@ def eaMuPlusLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen, pbar,
     :param verbose: Whether or not to log the statistics.
     :param per_generation_function: if supplied, call this function before each generation
                             used by tpot to save best pipeline before each new generation
+    :param prescreen_factor: if greater than 1, *prescreen_factor* times more
+                             offspring are bred and :meth:`toolbox.prescreen`
+                             picks the *lambda_* offspring to evaluate.
+    :param start_gen: number of generations already completed by the
+                      evaluated *population*, when resuming from a checkpoint.
+    :param checkpoint_function: if supplied, called with the generation number
+                                and the population at the end of each generation
+                                used by tpot to save the state of the evolution
     :returns: The final population
     :returns: A class:`~deap.tools.Logbook` with the statistics of the
               evolution.
@@ -221,8 +391,10 @@ def eaMuPlusLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen, pbar,
     logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
 
     # Initialize statistics dict for the individuals in the population, to keep track of mutation/crossover operations and predecessor relations
-    for ind in population:
-        initialize_stats_dict(ind)
+    # A population restored from a checkpoint keeps its statistics
+    if start_gen == 0:
+        for ind in population:
+            initialize_stats_dict(ind)
 
     # Evaluate the individuals with an invalid fitness
     invalid_ind = [ind for ind in population if not ind.fitness.valid]
@@ -235,16 +407,18 @@ def eaMuPlusLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen, pbar,
         halloffame.update(population)
 
     record = stats.compile(population) if stats is not None else {}
-    logbook.record(gen=0, nevals=len(invalid_ind), **record)
+    logbook.record(gen=start_gen, nevals=len(invalid_ind), **record)
+    if checkpoint_function is not None and start_gen == 0:
+        checkpoint_function(0, population)
 
     # Begin the generational process
-    for gen in range(1, ngen + 1):
+    for gen in range(start_gen + 1, ngen + 1):
         # after each population save a periodic pipeline
         if per_generation_function is not None:
             per_generation_function()
 
         # Vary the population
-        offspring = varOr(population, toolbox, lambda_, cxpb, mutpb)
+        offspring = _vary_and_prescreen(population, toolbox, lambda_, cxpb, mutpb, prescreen_factor)
 
         # Update generation statistic for all individuals which have invalid 'generation' stats
         # This hold for individuals that have been altered in the varOr function
@@ -271,31 +445,188 @@ def eaMuPlusLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen, pbar,
         population[:] = toolbox.select(population + offspring, mu)
 
         # pbar process
-        if not pbar.disable:
-            # Print only the best individual fitness
-            if verbose == 2:
-                high_score = max([halloffame.keys[x].wvalues[1] for x in range(len(halloffame.keys))])
-                pbar.write('Generation {0} - Current best internal CV score: {1}'.format(gen, high_score))
-
-            # Print the entire Pareto front
-            elif verbose == 3:
-                pbar.write('Generation {} - Current Pareto front scores:'.format(gen))
-                for pipeline, pipeline_scores in zip(halloffame.items, reversed(halloffame.keys)):
-                    pbar.write('{}\t{}\t{}'.format(
-                            int(pipeline_scores.wvalues[0]),
-                            pipeline_scores.wvalues[1],
-                            pipeline
-                        )
-                    )
-                pbar.write('')
+        _print_generation(pbar, halloffame, gen, verbose)
 
         # Update the statistics with the new population
         record = stats.compile(population) if stats is not None else {}
         logbook.record(gen=gen, nevals=len(invalid_ind), **record)
 
+        if checkpoint_function is not None:
+            checkpoint_function(gen, population)
+
     return population, logbook
 
 
+def eaSteadyState(population, toolbox, mu, lambda_, cxpb, mutpb, ngen, pbar, n_slots=1,
+                  stats=None, halloffame=None, verbose=0, per_generation_function=None,
+                  prescreen_factor=1, start_gen=0, checkpoint_function=None):
+    """Steady-state variant of :func:`eaMuPlusLambda` without a generation barrier.
+    :param population: A list of individuals.
+    :param toolbox: A :class:`~deap.base.Toolbox` that contains the evolution
+                    operators.
+    :param mu: The number of individuals to keep in the population.
+    :param lambda\_: The number of offspring inserted between two reports,
+                     which play the role of generations.
+    :param cxpb: The probability that an offspring is produced by crossover.
+    :param mutpb: The probability that an offspring is produced by mutation.
+    :param ngen: The number of generation.
+    :param pbar: processing bar
+    :param n_slots: The number of offspring evaluated at the same time.
+    :param stats: A :class:`~deap.tools.Statistics` object that is updated
+                  inplace, optional.
+    :param halloffame: A :class:`~deap.tools.HallOfFame` object that will
+                       contain the best individuals, optional.
+    :param verbose: Whether or not to log the statistics.
+    :param per_generation_function: if supplied, call this function before each generation
+                            used by tpot to save best pipeline before each new generation
+    :param prescreen_factor: if greater than 1, each offspring is picked by
+                             :meth:`toolbox.prescreen` among *prescreen_factor*
+                             bred candidates.
+    :param start_gen: number of generations already completed by the
+                      evaluated *population*, when resuming from a checkpoint.
+    :param checkpoint_function: if supplied, called with the generation number
+                                and the population every *lambda_* inserted
+                                offspring. The offspring still being evaluated
+                                are not part of the checkpoint.
+    :returns: The final population
+    :returns: A class:`~deap.tools.Logbook` with the statistics of the
+              evolution.
+    Instead of evaluating *lambda_* offspring and waiting for the slowest one
+    before selecting the next population, a new offspring is bred with the
+    :func:`varOr` function as soon as one of the *n_slots* evaluation slots is
+    free, and each evaluated offspring is inserted right away in the hall of
+    fame and in the population, which is reduced back to *mu* individuals with
+    :meth:`toolbox.select`. The pseudocode goes as follow ::
+        evaluate(population)
+        while less than ngen * lambda_ offspring were inserted:
+            while a slot is free:
+                submit(varOr(population, toolbox, 1, cxpb, mutpb))
+            for offspring in collect():
+                population = select(population + [offspring], mu)
+    This function expects :meth:`toolbox.mate`, :meth:`toolbox.mutate`,
+    :meth:`toolbox.select` and :meth:`toolbox.evaluate` aliases to be
+    registered in the toolbox, as well as :meth:`toolbox.submit`, which starts
+    the evaluation of an individual, and :meth:`toolbox.collect`, which waits
+    for at least one submitted individual and returns a list of
+    (individual, fitness) tuples.
+    """
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+
+    # Initialize statistics dict for the individuals in the population, to keep track of mutation/crossover operations and predecessor relations
+    # A population restored from a checkpoint keeps its statistics
+    if start_gen == 0:
+        for ind in population:
+            initialize_stats_dict(ind)
+
+    # Evaluate the individuals with an invalid fitness
+    invalid_ind = [ind for ind in population if not ind.fitness.valid]
+
+    fitnesses = toolbox.evaluate(invalid_ind)
+    for ind, fit in zip(invalid_ind, fitnesses):
+        ind.fitness.values = fit
+
+    if halloffame is not None:
+        halloffame.update(population)
+
+    record = stats.compile(population) if stats is not None else {}
+    logbook.record(gen=start_gen, nevals=len(invalid_ind), **record)
+    if checkpoint_function is not None and start_gen == 0:
+        checkpoint_function(0, population)
+
+    n_offspring = ngen * lambda_
+    n_bred = start_gen * lambda_
+    n_inserted = n_bred
+    n_in_flight = 0
+    nevals = 0
+    gen = start_gen + 1
+    if gen <= ngen and per_generation_function is not None:
+        per_generation_function()
+
+    while n_inserted < n_offspring:
+        finished = []
+        # Breed a new offspring as soon as an evaluation slot is free
+        while n_in_flight < n_slots and n_bred < n_offspring:
+            ind, = _vary_and_prescreen(population, toolbox, 1, cxpb, mutpb, prescreen_factor)
+            n_bred += 1
+            if ind.statistics['generation'] == 'INVALID':
+                ind.statistics['generation'] = gen
+            if ind.fitness.valid:
+                # update pbar for valid individuals (with fitness values)
+                if not pbar.disable:
+                    pbar.update(1)
+                finished.append(ind)
+            else:
+                toolbox.submit(ind)
+                n_in_flight += 1
+
+        if not finished:
+            for ind, fit in toolbox.collect():
+                ind.fitness.values = fit
+                finished.append(ind)
+                n_in_flight -= 1
+                nevals += 1
+
+        for ind in finished:
+            # Update the hall of fame and the population with each evaluated offspring
+            if halloffame is not None:
+                halloffame.update([ind])
+            population[:] = toolbox.select(population + [ind], mu)
+            n_inserted += 1
+
+            if n_inserted % lambda_ == 0:
+                # pbar process
+                _print_generation(pbar, halloffame, gen, verbose)
+
+                # Update the statistics with the new population
+                record = stats.compile(population) if stats is not None else {}
+                logbook.record(gen=gen, nevals=nevals, **record)
+                if checkpoint_function is not None:
+                    checkpoint_function(gen, population)
+                nevals = 0
+                gen += 1
+
+                # after each population save a periodic pipeline
+                if gen <= ngen and per_generation_function is not None:
+                    per_generation_function()
+
+    return population, logbook
+
+
+def _vary_and_prescreen(population, toolbox, lambda_, cxpb, mutpb, prescreen_factor=1):
+    """Breed offspring with :func:`varOr`, optionally picking them among more candidates.
+
+    If *prescreen_factor* is greater than 1, *lambda_* x *prescreen_factor*
+    candidates are bred and :meth:`toolbox.prescreen` returns the *lambda_*
+    candidates that are worth evaluating.
+    """
+    if prescreen_factor <= 1:
+        return varOr(population, toolbox, lambda_, cxpb, mutpb)
+    candidates = varOr(population, toolbox, lambda_ * prescreen_factor, cxpb, mutpb)
+    return toolbox.prescreen(candidates, lambda_)
+
+
+def _print_generation(pbar, halloffame, gen, verbose):
+    """Print the best individual or the entire Pareto front at the end of a generation."""
+    if not pbar.disable:
+        # Print only the best individual fitness
+        if verbose == 2:
+            high_score = max([halloffame.keys[x].wvalues[1] for x in range(len(halloffame.keys))])
+            pbar.write('Generation {0} - Current best internal CV score: {1}'.format(gen, high_score))
+
+        # Print the entire Pareto front
+        elif verbose == 3:
+            pbar.write('Generation {} - Current Pareto front scores:'.format(gen))
+            for pipeline, pipeline_scores in zip(halloffame.items, reversed(halloffame.keys)):
+                pbar.write('{}\t{}\t{}'.format(
+                        int(pipeline_scores.wvalues[0]),
+                        pipeline_scores.wvalues[1],
+                        pipeline
+                    )
+                )
+            pbar.write('')
+
+
 def cxOnePoint(ind1, ind2):
     """Randomly select in each individual and exchange each subtree with the
     point as root between each individual.
@@ -393,9 +724,37 @@ def mutNodeReplacement(individual, pset):
     return individual,
 
 
+def _racing_upper_bound(fold_scores, confidence=0.95):
+    """Compute an upper confidence bound of the mean CV score from partial folds.
+
+    Parameters
+    ----------
+    fold_scores: list of float
+        Scores of the cross-validation folds evaluated so far
+    confidence: float, optional (default: 0.95)
+        One-sided confidence level of the Student's t bound
+
+    Returns
+    -------
+    upper_bound: float
+        Upper bound of the mean CV score of the pipeline. Returns inf if fewer
+        than two finite fold scores are available.
+    """
+    scores = np.asarray(fold_scores, dtype=np.float64)
+    scores = scores[~np.isnan(scores)]
+    n_scores = len(scores)
+    if n_scores < 2 or not np.all(np.isfinite(scores)):
+        return np.inf
+    std_error = np.std(scores, ddof=1) / np.sqrt(n_scores)
+    return np.mean(scores) + stats.t.ppf(confidence, n_scores - 1) * std_error
+
+
 @threading_timeoutable(default="Timeout")
 def _wrapped_cross_val_score(sklearn_pipeline, features, target,
-                             cv, scoring_function, sample_weight=None, groups=None):
+                             cv, scoring_function, sample_weight=None, groups=None,
+                             racing_threshold=None, racing_min_folds=2, return_fold_scores=False,
+                             return_stats=False, prefix_cache=None, cv_key=None, fold_buffers=None,
+                             measure_memory=False):
     """Fit estimator and compute scores for a given dataset split.
     Parameters
     ----------
@@ -406,43 +765,1082 @@ def _wrapped_cross_val_score(sklearn_pipeline, features, target,
     target : array-like, optional, default: None
         The target variable to try to predict in the case of
         supervised learning.
-    cv: int or cross-validation generator
+    cv: int, cross-validation generator or list
         If CV is a number, then it is the number of folds to evaluate each
         pipeline over in k-fold cross-validation during the TPOT optimization
          process. If it is an object then it is an object to be used as a
-         cross-validation generator.
-    scoring_function : callable
-        A scorer callable object / function with signature
+         cross-validation generator. If it is a list, it holds the (train, test)
+         index arrays of the folds, precomputed by the caller.
+    scoring_function : str or callable
+        A scorer name or callable object / function with signature
         ``scorer(estimator, X, y)``.
     sample_weight : array-like, optional
         List of sample weights to balance (or un-balanace) the dataset target as needed
     groups: array-like {n_samples, }, optional
         Group labels for the samples used while splitting the dataset into train/test set
+    racing_threshold: float, optional
+        If supplied, the folds are scored one by one and the evaluation is abandoned
+        as soon as the upper confidence bound of the mean CV score falls below this value
+    racing_min_folds: int, optional (default: 2)
+        Minimum number of folds to score before the evaluation can be abandoned
+    return_fold_scores: bool, optional (default: False)
+        If True, return the array of scores of the folds that were evaluated
+        instead of their mean
+    return_stats: bool, optional (default: False)
+        If True, return a (score, cost_stats) tuple where cost_stats holds the
+        fit time, score time, time per fold, peak memory and model size of the
+        folds that were evaluated, see _combine_fold_stats
+    prefix_cache: PrefixCache, optional
+        If supplied, the outputs of the fitted pipeline prefixes on each fold are
+        reused from and stored in this cache
+    cv_key: hashable, optional
+        Identifier of the cross-validation folds in prefix_cache
+    fold_buffers: list, optional
+        (X_train, y_train, X_test, y_test) samples of each fold of cv, materialized
+        once by the caller instead of being indexed for each evaluation
+    measure_memory: bool, optional (default: False)
+        If True, the peak memory and the model size are measured on the first fold.
+        Otherwise, they are None in the cost_stats.
     """
     sample_weight_dict = set_sample_weight(sklearn_pipeline.steps, sample_weight)
 
     features, target, groups = indexable(features, target, groups)
 
-    cv = check_cv(cv, target, classifier=is_classifier(sklearn_pipeline))
-    cv_iter = list(cv.split(features, target, groups))
-    scorer = check_scoring(sklearn_pipeline, scoring=scoring_function)
+    if isinstance(cv, list):
+        cv_iter = cv
+    else:
+        cv = check_cv(cv, target, classifier=is_classifier(sklearn_pipeline))
+        cv_iter = list(cv.split(features, target, groups))
+    scorer = _check_scorer(sklearn_pipeline, scoring_function)
 
+    fold_stats_list = []
     try:
         with warnings.catch_warnings():
             warnings.simplefilter('ignore')
-            scores = [_fit_and_score(estimator=clone(sklearn_pipeline),
-                                    X=features,
-                                    y=target,
-                                    scorer=scorer,
-                                    train=train,
-                                    test=test,
-                                    verbose=0,
-                                    parameters=None,
-                                    fit_params=sample_weight_dict)
-                                for train, test in cv_iter]
-            CV_score = np.array(scores)[:, 0]
-            return np.nanmean(CV_score)
+            scores = []
+            for fold_idx, (train, test) in enumerate(cv_iter):
+                fold_stats = {} if return_stats else None
+                scores.append(_fit_and_score_fold(sklearn_pipeline, features, target, scorer,
+                                                  train, test, sample_weight_dict, fold_stats,
+                                                  prefix_cache, (cv_key, fold_idx),
+                                                  fold_buffers[fold_idx] if fold_buffers is not None else None,
+                                                  measure_memory and fold_idx == 0))
+                fold_stats_list.append(fold_stats)
+                # Stop early once the pipeline cannot reach the racing threshold
+                if (racing_threshold is not None and len(scores) >= racing_min_folds and
+                        _racing_upper_bound(scores) < racing_threshold):
+                    break
+            CV_score = np.array(scores)
+            if not return_fold_scores:
+                CV_score = np.nanmean(CV_score)
     except TimeoutException:
-        return "Timeout"
+        CV_score = "Timeout"
     except Exception as e:
-        return -float('inf')
+        CV_score = -float('inf')
+    if return_stats:
+        return CV_score, _combine_fold_stats(fold_stats_list)
+    return CV_score
+
+
+@threading_timeoutable(default="Timeout")
+def _wrapped_group_cross_val_score(sklearn_pipelines, features, target, cv, scoring_function, sample_weight=None,
+                                  groups=None, return_fold_scores=False, fold_buffers=None, measure_memory=False):
+    """Compute the CV scores of a group of pipelines, sharing their fits on each fold.
+
+    Parameters
+    ----------
+    sklearn_pipelines: list
+        Pipelines with the same shared_fit_key()
+    features : array-like of shape at least 2D
+        The data to fit.
+    target : array-like, optional, default: None
+        The target variable to try to predict in the case of
+        supervised learning.
+    cv: int, cross-validation generator or list
+        Cross-validation strategy or (train, test) index arrays of the folds, see _wrapped_cross_val_score
+    scoring_function : str or callable
+        A scorer name or callable object / function with signature
+        ``scorer(estimator, X, y)``.
+    sample_weight : array-like, optional
+        List of sample weights to balance (or un-balanace) the dataset target as needed
+    groups: array-like {n_samples, }, optional
+        Group labels for the samples used while splitting the dataset into train/test set
+    return_fold_scores: bool, optional (default: False)
+        If True, return the arrays of fold scores instead of their means
+    fold_buffers: list, optional
+        (X_train, y_train, X_test, y_test) samples of each fold of cv, materialized
+        once by the caller instead of being indexed for each evaluation
+    measure_memory: bool, optional (default: False)
+        If True, the peak memory and the model sizes are measured on the first fold
+
+    Returns
+    -------
+    results: list or "Timeout"
+        (CV_score, cost_stats) of each pipeline, in the same order as sklearn_pipelines,
+        see _wrapped_cross_val_score
+    """
+    sample_weight_dict = set_sample_weight(sklearn_pipelines[0].steps, sample_weight)
+
+    features, target, groups = indexable(features, target, groups)
+
+    if isinstance(cv, list):
+        cv_iter = cv
+    else:
+        cv = check_cv(cv, target, classifier=is_classifier(sklearn_pipelines[0]))
+        cv_iter = list(cv.split(features, target, groups))
+    scorer = _check_scorer(sklearn_pipelines[0], scoring_function)
+
+    fold_results = []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for fold_idx, (train, test) in enumerate(cv_iter):
+            try:
+                fold_results.append(_fit_and_score_group(sklearn_pipelines, features, target, scorer,
+                                                        train, test, sample_weight_dict,
+                                                        fold_buffers[fold_idx] if fold_buffers is not None else None,
+                                                        measure_memory and fold_idx == 0))
+            except TimeoutException:
+                raise
+            except Exception:
+                # The shared prefix failed, and so did every pipeline
+                fold_results.append([(-float('inf'), {})] * len(sklearn_pipelines))
+
+    results = []
+    for pipeline_idx in range(len(sklearn_pipelines)):
+        scores = np.array([fold_result[pipeline_idx][0] for fold_result in fold_results])
+        if np.any(scores == -float('inf')):
+            CV_score = -float('inf')
+        else:
+            CV_score = scores if return_fold_scores else np.nanmean(scores)
+        results.append((CV_score, _combine_fold_stats([fold_result[pipeline_idx][1]
+                                                       for fold_result in fold_results])))
+    return results
+
+
+def _split_fold(estimator, features, target, indices, train_indices=None):
+    """Index the samples of a fold like cross_val_score, or plainly if its private helper is missing."""
+    if _safe_split is not None:
+        return _safe_split(estimator, features, target, indices, train_indices)
+    return safe_indexing(features, indices), safe_indexing(target, indices)
+
+
+def _check_scorer(sklearn_pipeline, scoring_function):
+    """Return scoring_function if it is already a scorer, otherwise look it up with check_scoring."""
+    if isinstance(scoring_function, _BaseScorer):
+        return scoring_function
+    return check_scoring(sklearn_pipeline, scoring=scoring_function)
+
+
+def _fit_and_score_fold(sklearn_pipeline, features, target, scorer, train, test, fit_params=None, fold_stats=None,
+                        prefix_cache=None, fold_key=None, fold_data=None, measure_memory=False):
+    """Fit a clone of the pipeline on a training fold and score it on the matching test fold.
+
+    Parameters
+    ----------
+    sklearn_pipeline : pipeline object implementing 'fit'
+        The object to use to fit the data.
+    features : array-like of shape at least 2D
+        The data to fit.
+    target : array-like
+        The target variable to try to predict.
+    scorer : callable
+        A scorer callable object with signature ``scorer(estimator, X, y)``.
+    train: array-like
+        Indices of the training samples of the fold
+    test: array-like
+        Indices of the testing samples of the fold
+    fit_params: dict, optional
+        Parameters passed to the fit method of the pipeline
+    fold_stats: dict, optional
+        If supplied, filled with the 'fit_time', 'score_time' and 'fold_time' in
+        seconds, the 'peak_rss' of the process in bytes and the pickled
+        'model_size' of the fitted pipeline in bytes, None unless measure_memory is True
+    prefix_cache: PrefixCache, optional
+        If supplied, the outputs of the longest cached prefix of the pipeline on
+        this fold are reused, and the outputs of the newly fitted prefixes are stored
+    fold_key: hashable, optional
+        Identifier of the fold in prefix_cache
+    fold_data: tuple, optional
+        (X_train, y_train, X_test, y_test) samples of the fold, materialized once
+        by the caller. By default, they are indexed from features and target.
+    measure_memory: bool, optional (default: False)
+        If True, the peak memory and the model size are measured, which pickles the
+        fitted pipeline
+
+    Returns
+    -------
+    score: float
+        Score of the pipeline on the testing samples of the fold
+    """
+    start_time = time()
+    measure_memory = measure_memory and fold_stats is not None
+    if measure_memory:
+        _reset_peak_rss()
+    estimator = clone(sklearn_pipeline)
+    # Adjust length of sample weights
+    fit_params = fit_params if fit_params is not None else {}
+    fit_params = dict([(k, _index_param_value(features, v, train)) for k, v in fit_params.items()])
+
+    if fold_data is not None:
+        X_train, y_train, X_test, y_test = fold_data
+    else:
+        X_train, y_train = _split_fold(estimator, features, target, train)
+        X_test, y_test = _split_fold(estimator, features, target, test, train)
+    # Let a TPOTMemory identify the training samples of the fold without hashing them
+    if hasattr(getattr(estimator, 'memory', None), 'register_fold'):
+        estimator.memory.register_fold(X_train, y_train, train)
+
+    if prefix_cache is not None and len(estimator.steps) > 1:
+        score, fit_time, score_time, model_size = _fit_and_score_with_prefix_cache(estimator, X_train, y_train,
+                                                                                 X_test, y_test, scorer, fit_params,
+                                                                                 prefix_cache, fold_key,
+                                                                                 measure_memory)
+    else:
+        fit_start_time = time()
+        estimator.fit(X_train, y_train, **fit_params)
+        score_start_time = time()
+        score = _score(estimator, X_test, y_test, scorer)
+        fit_time = score_start_time - fit_start_time
+        score_time = time() - score_start_time
+        model_size = _pickled_size(estimator) if measure_memory else None
+
+    if fold_stats is not None:
+        fold_stats['fit_time'] = fit_time
+        fold_stats['score_time'] = score_time
+        fold_stats['fold_time'] = time() - start_time
+        fold_stats['peak_rss'] = _peak_rss() if measure_memory else None
+        fold_stats['model_size'] = model_size
+        fold_stats['n_test_samples'] = len(test)
+    return score
+
+
+def _estimator_key(estimator):
+    """Build the canonical string of an estimator from its class and parameters.
+
+    Unlike repr(), long parameter values are never truncated and the nested
+    estimators of meta-estimators, pipelines and feature unions are expanded.
+    """
+    params = estimator.get_params(deep=False)
+    param_strs = []
+    for name in sorted(params):
+        value = params[name]
+        if name in ('steps', 'transformer_list'):
+            value_str = '[{}]'.format(', '.join('({}, {})'.format(step_name, _estimator_key(step))
+                                                for step_name, step in value))
+        elif hasattr(value, 'get_params') and not isclass(value):
+            value_str = _estimator_key(value)
+        else:
+            value_str = repr(value)
+        param_strs.append('{}={}'.format(name, value_str))
+    return '{}({})'.format(type(estimator).__name__, ', '.join(param_strs))
+
+
+def _fit_and_score_with_prefix_cache(estimator, X_train, y_train, X_test, y_test, scorer, fit_params,
+                                     prefix_cache, fold_key, measure_memory=False):
+    """Fit and score a pipeline step by step, reusing the outputs of its longest cached prefix.
+
+    Parameters
+    ----------
+    estimator: sklearn.pipeline.Pipeline
+        Unfitted clone of the pipeline
+    X_train, y_train: array-like
+        Training samples of the fold
+    X_test, y_test: array-like
+        Testing samples of the fold
+    scorer: callable
+        A scorer callable object with signature ``scorer(estimator, X, y)``
+    fit_params: dict
+        Parameters passed to the fit methods of the steps, prefixed by the step names
+    prefix_cache: PrefixCache
+        Cache of the outputs of the fitted prefixes
+    fold_key: hashable
+        Identifier of the fold in prefix_cache
+    measure_memory: bool, optional (default: False)
+        If True, the pickled sizes of the fitted steps are measured
+
+    Returns
+    -------
+    (score, fit_time, score_time, model_size): tuple
+        Score of the pipeline on the testing samples, time to fit the pipeline and to
+        score it in seconds and pickled size of the fitted pipeline in bytes. The steps
+        taken from the cache count with the times and size measured when they were fitted.
+        The size is None if it was not measured for every step.
+    """
+    step_fit_params = dict((name, {}) for name, _ in estimator.steps)
+    for param_name, param_value in fit_params.items():
+        step_name, param = param_name.split('__', 1)
+        step_fit_params[step_name][param] = param_value
+
+    prefix_keys = []
+    prefix_key = ''
+    for _, transformer in estimator.steps[:-1]:
+        prefix_key += _estimator_key(transformer) + '; '
+        prefix_keys.append(prefix_key)
+
+    n_cached_steps, entry = prefix_cache.longest_prefix(prefix_keys, fold_key)
+    if entry is None:
+        Xt_train, Xt_test, fit_time, transform_time, model_size = X_train, X_test, 0., 0., 0 if measure_memory else None
+    else:
+        Xt_train, Xt_test, fit_time, transform_time, model_size = entry
+
+    for step_idx in range(n_cached_steps, len(estimator.steps) - 1):
+        name, transformer = estimator.steps[step_idx]
+        statistics_key = _selector_statistics_key(transformer)
+        decomposition_key = _decomposition_key(transformer) if prefix_cache.decomposition_bytes else None
+        input_key = prefix_keys[step_idx - 1] if step_idx > 0 else ''
+        fit_start_time = time()
+        if statistics_key is not None and not step_fit_params[name]:
+            fit_time += _fit_selector(transformer, Xt_train, y_train, prefix_cache,
+                                      input_key + statistics_key, fold_key)
+            Xt_train = transformer.transform(Xt_train)
+        elif decomposition_key is not None and not step_fit_params[name]:
+            fit_time += _fit_decomposition(transformer, Xt_train, y_train, prefix_cache,
+                                           input_key + decomposition_key, fold_key)
+            Xt_train = transformer.transform(Xt_train)
+        elif hasattr(transformer, 'fit_transform'):
+            Xt_train = transformer.fit_transform(Xt_train, y_train, **step_fit_params[name])
+        else:
+            Xt_train = transformer.fit(Xt_train, y_train, **step_fit_params[name]).transform(Xt_train)
+        transform_start_time = time()
+        Xt_test = transformer.transform(Xt_test)
+        fit_time += transform_start_time - fit_start_time
+        transform_time += time() - transform_start_time
+        model_size = model_size + (_pickled_size(transformer) or 0) if measure_memory and model_size is not None else None
+        prefix_cache.put(prefix_keys[step_idx], fold_key, (Xt_train, Xt_test, fit_time, transform_time, model_size))
+
+    name, final_estimator = estimator.steps[-1]
+    fit_start_time = time()
+    final_estimator.fit(Xt_train, y_train, **step_fit_params[name])
+    score_start_time = time()
+    score = _score(final_estimator, Xt_test, y_test, scorer)
+    fit_time += score_start_time - fit_start_time
+    score_time = transform_time + time() - score_start_time
+    if measure_memory and model_size is not None:
+        model_size += _pickled_size(final_estimator) or 0
+    else:
+        model_size = None
+    return score, fit_time, score_time, model_size
+
+
+# Univariate selectors whose fit only computes the statistics of the columns with
+# their score_func, whatever their threshold
+_UNIVARIATE_SELECTORS = ('SelectPercentile', 'SelectKBest', 'SelectFpr', 'SelectFdr', 'SelectFwe')
+
+
+def _selector_statistics_key(transformer):
+    """Build the canonical string of the column statistics computed by the fit of a selector.
+
+    Parameters
+    ----------
+    transformer: estimator
+        A step of a pipeline
+
+    Returns
+    -------
+    statistics_key: str or None
+        Canonical string of the statistics, None if the transformer is not a
+        univariate selector or a VarianceThreshold, or if its score_func has no name
+    """
+    transformer_name = type(transformer).__name__
+    if transformer_name in _UNIVARIATE_SELECTORS:
+        score_func = transformer.score_func
+        if not hasattr(score_func, '__name__'):
+            return None
+        return 'UnivariateStatistics(score_func={}.{})'.format(getattr(score_func, '__module__', None),
+                                                               score_func.__name__)
+    if transformer_name == 'VarianceThreshold':
+        return 'Variances()'
+    return None
+
+
+def _fit_selector(selector, X, y, prefix_cache, statistics_key, fold_key):
+    """Fit a selector from the column statistics cached for its input, computing them if needed.
+
+    Parameters
+    ----------
+    selector: estimator
+        Unfitted univariate selector or VarianceThreshold
+    X, y: array-like
+        Training samples of the fold, transformed by the steps preceding the selector
+    prefix_cache: PrefixCache
+        Cache of the outputs of the fitted prefixes and of the column statistics
+    statistics_key: str
+        Canonical string of the preceding steps followed by _selector_statistics_key(selector)
+    fold_key: hashable
+        Identifier of the fold in prefix_cache
+
+    Returns
+    -------
+    compute_time: float
+        Time taken to compute the statistics in seconds when they were cached, 0 if they
+        were computed by this call
+    """
+    entry = prefix_cache.get_statistics(statistics_key, fold_key)
+    if type(selector).__name__ == 'VarianceThreshold':
+        compute_time = 0.
+        if entry is None:
+            start_time = time()
+            # No threshold, so that the statistics are cached even if no column passes it
+            variances = clone(selector).set_params(threshold=-np.inf).fit(X, y).variances_
+            entry = (variances, None, time() - start_time)
+            prefix_cache.put(statistics_key, fold_key, entry)
+        else:
+            compute_time = entry[2]
+        selector.variances_ = entry[0]
+        # Same check as VarianceThreshold.fit()
+        if np.all(selector.variances_ <= selector.threshold):
+            raise ValueError('No feature in X meets the variance threshold {0:.5f}'.format(selector.threshold))
+        return compute_time
+
+    if entry is None:
+        start_time = time()
+        selector.fit(X, y)
+        prefix_cache.put(statistics_key, fold_key, (selector.scores_, selector.pvalues_, time() - start_time))
+        return 0.
+    # _check_params is private to scikit-learn, fit the selector if it is not there
+    check_params = getattr(selector, '_check_params', None)
+    if check_params is None:
+        selector.fit(X, y)
+        return 0.
+    # Same checks as the fit of the selector, only the statistics come from the cache
+    check_X_y(X, y, ['csr', 'csc'], multi_output=True)
+    check_params(X, y)
+    selector.scores_, selector.pvalues_ = entry[0], entry[1]
+    return entry[2]
+
+
+# Decompositions whose fit can stand for the fits with a lower accuracy on the same
+# input: {operator: (accuracy parameter, whether increasing it makes the fit more accurate)}
+_DECOMPOSITIONS = {
+    'PCA': ('iterated_power', True),
+    'FastICA': ('tol', False)
+}
+
+
+def _is_number(value, number_type=numbers.Real):
+    return isinstance(value, number_type) and not isinstance(value, bool)
+
+
+def _decomposition_key(transformer):
+    """Build the canonical string of a decomposition without the parameters that a cached fit can stand for.
+
+    Parameters
+    ----------
+    transformer: estimator
+        A step of a pipeline
+
+    Returns
+    -------
+    decomposition_key: str or None
+        Canonical string of the decomposition, None if the transformer is not in _DECOMPOSITIONS
+    """
+    transformer_name = type(transformer).__name__
+    if transformer_name not in _DECOMPOSITIONS:
+        return None
+    shared_params = {_DECOMPOSITIONS[transformer_name][0]: None}
+    if transformer_name == 'PCA' and _is_number(transformer.n_components, numbers.Integral):
+        # A PCA fit with more components is truncated
+        shared_params['n_components'] = 'truncated'
+    return _estimator_key(clone(transformer).set_params(**shared_params))
+
+
+def _derive_decomposition(transformer, decomposition, n_total_components):
+    """Fit a decomposition from a fitted decomposition with the same _decomposition_key().
+
+    Parameters
+    ----------
+    transformer: estimator
+        Unfitted PCA or FastICA
+    decomposition: estimator
+        Fitted decomposition of the same input
+    n_total_components: int
+        Number of components of a full PCA of the input, min(n_samples, n_features)
+
+    Returns
+    -------
+    derived: bool
+        True if the fitted decomposition is at least as accurate and has at least as
+        many components as the transformer, which then gets its fitted attributes
+    """
+    accuracy_param, more_accurate = _DECOMPOSITIONS[type(transformer).__name__]
+    accuracy = transformer.get_params()[accuracy_param]
+    fitted_accuracy = decomposition.get_params()[accuracy_param]
+    if accuracy != fitted_accuracy:
+        if not _is_number(accuracy) or not _is_number(fitted_accuracy):
+            return False
+        if (fitted_accuracy < accuracy) if more_accurate else (fitted_accuracy > accuracy):
+            return False
+    n_components = transformer.n_components
+    truncate = type(transformer).__name__ == 'PCA' and n_components != decomposition.n_components
+    if truncate and n_components > decomposition.n_components_:
+        return False
+
+    for attr, value in vars(decomposition).items():
+        if attr.endswith('_'):
+            setattr(transformer, attr, value)
+    if truncate:
+        transformer.components_ = decomposition.components_[:n_components]
+        transformer.explained_variance_ = decomposition.explained_variance_[:n_components]
+        transformer.explained_variance_ratio_ = decomposition.explained_variance_ratio_[:n_components]
+        if hasattr(decomposition, 'singular_values_'):
+            # singular_values_ was added in scikit-learn 0.19
+            transformer.singular_values_ = decomposition.singular_values_[:n_components]
+        transformer.n_components_ = n_components
+        if n_components < decomposition.n_components_:
+            # The noise variance is the mean variance of all the discarded components,
+            # including the ones already discarded by the cached fit
+            n_discarded = n_total_components - decomposition.n_components_
+            discarded_variance = (decomposition.explained_variance_[n_components:].sum() +
+                                  decomposition.noise_variance_ * n_discarded)
+            transformer.noise_variance_ = discarded_variance / (n_total_components - n_components)
+    return True
+
+
+def _fit_decomposition(transformer, X, y, prefix_cache, decomposition_key, fold_key):
+    """Fit a decomposition from a cached fit of its input if one can stand for it, fitting and caching it otherwise.
+
+    Parameters
+    ----------
+    transformer: estimator
+        Unfitted PCA or FastICA
+    X, y: array-like
+        Training samples of the fold, transformed by the steps preceding the decomposition
+    prefix_cache: PrefixCache
+        Cache of the outputs of the fitted prefixes and of the fitted decompositions
+    decomposition_key: str
+        Canonical string of the preceding steps followed by _decomposition_key(transformer)
+    fold_key: hashable
+        Identifier of the fold in prefix_cache
+
+    Returns
+    -------
+    fit_time: float
+        Time taken to fit the cached decomposition in seconds when the transformer was
+        derived from it, 0 if the transformer was fitted by this call
+    """
+    entries = prefix_cache.get_decompositions(decomposition_key, fold_key)
+    n_total_components = min(np.shape(X))
+    for decomposition, fit_time in entries:
+        if _derive_decomposition(transformer, decomposition, n_total_components):
+            return fit_time
+    start_time = time()
+    transformer.fit(X, y)
+    fit_time = time() - start_time
+    # Drop the cached fits that the new one can stand for
+    entries = [entry for entry in entries
+               if not _derive_decomposition(clone(entry[0]), transformer, n_total_components)]
+    prefix_cache.put_decompositions(decomposition_key, fold_key, entries + [(transformer, fit_time)])
+    return 0.
+
+
+# Regularization parameter of the linear models whose fits can share a regularization
+# path, and whether increasing it strengthens the regularization. Lasso and ElasticNet
+# warm start their coordinate descent along the path. The liblinear solver of
+# LogisticRegression, LinearSVC and LinearSVR cannot warm start, so these models only
+# share the fits of the steps before them.
+_REGULARIZATION_PARAMETERS = {
+    'LogisticRegression': ('C', False),
+    'LinearSVC': ('C', False),
+    'LinearSVR': ('C', False),
+    'Lasso': ('alpha', True),
+    'ElasticNet': ('alpha', True)
+}
+
+# Nearest neighbors models whose fits can share one neighbor query for all their
+# values of n_neighbors and weights
+_NEIGHBORS_MODELS = ('KNeighborsClassifier', 'KNeighborsRegressor')
+
+
+def shared_fit_key(sklearn_pipeline, regularization_path=True, batch_neighbors=True):
+    """Compute the key shared by the pipelines whose fits on a fold can be shared.
+
+    Parameters
+    ----------
+    sklearn_pipeline: sklearn.pipeline.Pipeline
+        The pipeline
+    regularization_path: bool, optional (default: True)
+        If True, the pipelines that only differ by the regularization strength
+        of their final linear model share a key
+    batch_neighbors: bool, optional (default: True)
+        If True, the pipelines that only differ by the n_neighbors and weights
+        of their final nearest neighbors model share a key
+
+    Returns
+    -------
+    group_key: string or None
+        Key of the group of the pipeline, None if it cannot share its fits
+    """
+    final_estimator = sklearn_pipeline.steps[-1][1]
+    estimator_name = type(final_estimator).__name__
+    if regularization_path and estimator_name in _REGULARIZATION_PARAMETERS:
+        shared_params = {_REGULARIZATION_PARAMETERS[estimator_name][0]: None}
+    elif batch_neighbors and _get_weights is not None and estimator_name in _NEIGHBORS_MODELS:
+        shared_params = {'n_neighbors': None, 'weights': None}
+    else:
+        return None
+    group_key = ''
+    for _, transformer in sklearn_pipeline.steps[:-1]:
+        group_key += _estimator_key(transformer) + '; '
+    return group_key + _estimator_key(clone(final_estimator).set_params(**shared_params))
+
+
+def _fit_and_score_group(sklearn_pipelines, features, target, scorer, train, test, fit_params=None, fold_data=None,
+                         measure_memory=False):
+    """Fit a group of pipelines sharing their fits on a training fold and score them on the matching test fold.
+
+    The prefix shared by the pipelines is fitted once, then their final models are
+    fitted by _fit_and_score_path or _fit_and_score_neighbors.
+
+    Parameters
+    ----------
+    sklearn_pipelines: list
+        Pipelines with the same shared_fit_key()
+    features : array-like of shape at least 2D
+        The data to fit.
+    target : array-like
+        The target variable to try to predict.
+    scorer : callable
+        A scorer callable object with signature ``scorer(estimator, X, y)``.
+    train: array-like
+        Indices of the training samples of the fold
+    test: array-like
+        Indices of the testing samples of the fold
+    fit_params: dict, optional
+        Parameters passed to the fit methods of the steps, prefixed by the step names
+    fold_data: tuple, optional
+        (X_train, y_train, X_test, y_test) samples of the fold, materialized once
+        by the caller. By default, they are indexed from features and target.
+    measure_memory: bool, optional (default: False)
+        If True, the peak memory and the model sizes are measured, otherwise they are None
+
+    Returns
+    -------
+    results: list
+        (score, fold_stats) of each pipeline, in the same order as sklearn_pipelines.
+        The score is -inf and fold_stats is empty if the final model failed. The
+        fit time and model size of each pipeline include the ones of the prefix.
+    """
+    start_time = time()
+    if measure_memory:
+        _reset_peak_rss()
+    estimator = clone(sklearn_pipelines[0])
+    fit_params = fit_params if fit_params is not None else {}
+    fit_params = dict([(k, _index_param_value(features, v, train)) for k, v in fit_params.items()])
+    step_fit_params = dict((name, {}) for name, _ in estimator.steps)
+    for param_name, param_value in fit_params.items():
+        step_name, param = param_name.split('__', 1)
+        step_fit_params[step_name][param] = param_value
+
+    if fold_data is not None:
+        X_train, y_train, X_test, y_test = fold_data
+    else:
+        X_train, y_train = _split_fold(estimator, features, target, train)
+        X_test, y_test = _split_fold(estimator, features, target, test, train)
+
+    Xt_train, Xt_test = X_train, X_test
+    prefix_fit_time, prefix_transform_time, prefix_size = 0., 0., 0
+    for name, transformer in estimator.steps[:-1]:
+        fit_start_time = time()
+        if hasattr(transformer, 'fit_transform'):
+            Xt_train = transformer.fit_transform(Xt_train, y_train, **step_fit_params[name])
+        else:
+            Xt_train = transformer.fit(Xt_train, y_train, **step_fit_params[name]).transform(Xt_train)
+        transform_start_time = time()
+        Xt_test = transformer.transform(Xt_test)
+        prefix_fit_time += transform_start_time - fit_start_time
+        prefix_transform_time += time() - transform_start_time
+        if measure_memory:
+            prefix_size += _pickled_size(transformer) or 0
+    prefix_time = time() - start_time
+
+    name, final_estimator = estimator.steps[-1]
+    final_estimators = [sklearn_pipeline.steps[-1][1] for sklearn_pipeline in sklearn_pipelines]
+    if type(final_estimator).__name__ in _NEIGHBORS_MODELS:
+        final_results = _fit_and_score_neighbors(final_estimators, Xt_train, y_train, Xt_test, y_test,
+                                                 scorer, step_fit_params[name], measure_memory)
+    else:
+        final_results = _fit_and_score_path(final_estimators, Xt_train, y_train, Xt_test, y_test,
+                                            scorer, step_fit_params[name], measure_memory)
+
+    results = []
+    for final_result in final_results:
+        if final_result is None:
+            results.append((-float('inf'), {}))
+            continue
+        score, fit_time, score_time, model_size = final_result
+        results.append((score, {
+            'fit_time': prefix_fit_time + fit_time,
+            'score_time': prefix_transform_time + score_time,
+            'fold_time': prefix_time + fit_time + score_time,
+            'peak_rss': _peak_rss() if measure_memory else None,
+            'model_size': prefix_size + model_size if measure_memory else None,
+            'n_test_samples': len(test)
+        }))
+    return results
+
+
+def _fit_and_score_path(final_estimators, Xt_train, y_train, Xt_test, y_test, scorer, fit_params,
+                        measure_memory=False):
+    """Fit linear models along their regularization path and score them.
+
+    The models are fitted from the strongest to the weakest regularization, each one
+    warm-started from the solution of the previous one when the model supports it.
+    The liblinear models are fitted from scratch, so they only share the prefix.
+
+    Parameters
+    ----------
+    final_estimators: list
+        Linear models that only differ by their regularization parameter
+    Xt_train, y_train: array-like
+        Training samples of the fold, transformed by the prefix of the pipelines
+    Xt_test, y_test: array-like
+        Testing samples of the fold, transformed by the prefix of the pipelines
+    scorer: callable
+        A scorer callable object with signature ``scorer(estimator, X, y)``
+    fit_params: dict
+        Parameters passed to the fit method of the models
+    measure_memory: bool, optional (default: False)
+        If True, the pickled sizes of the fitted models are measured, otherwise they are 0
+
+    Returns
+    -------
+    results: list
+        (score, fit_time, score_time, model_size) of each model, None if it failed
+    """
+    parameter, strengthens = _REGULARIZATION_PARAMETERS[type(final_estimators[0]).__name__]
+    values = [final_estimator.get_params()[parameter] for final_estimator in final_estimators]
+    path_order = sorted(range(len(final_estimators)), key=lambda idx: values[idx], reverse=strengthens)
+
+    results = [None] * len(final_estimators)
+    path_estimator = None
+    for idx in path_order:
+        fit_start_time = time()
+        try:
+            if path_estimator is None:
+                path_estimator = clone(final_estimators[idx])
+                if 'warm_start' in path_estimator.get_params():
+                    path_estimator.set_params(warm_start=True)
+            path_estimator.set_params(**{parameter: values[idx]})
+            path_estimator.fit(Xt_train, y_train, **fit_params)
+            score_start_time = time()
+            score = _score(path_estimator, Xt_test, y_test, scorer)
+        except TimeoutException:
+            raise
+        except Exception:
+            # The next model of the path starts from scratch
+            path_estimator = None
+            continue
+        results[idx] = (score, score_start_time - fit_start_time, time() - score_start_time,
+                        (_pickled_size(path_estimator) or 0) if measure_memory else 0)
+    return results
+
+
+def _fit_and_score_neighbors(final_estimators, Xt_train, y_train, Xt_test, y_test, scorer, fit_params,
+                             measure_memory=False):
+    """Score nearest neighbors models from a single neighbor query.
+
+    The neighbors of the testing samples are queried once for the largest n_neighbors,
+    the predictions of each model are then computed from its first neighbors.
+
+    Parameters
+    ----------
+    final_estimators: list
+        Nearest neighbors models that only differ by their n_neighbors and weights
+    Xt_train, y_train: array-like
+        Training samples of the fold, transformed by the prefix of the pipelines
+    Xt_test, y_test: array-like
+        Testing samples of the fold, transformed by the prefix of the pipelines
+    scorer: callable
+        A scorer callable object with signature ``scorer(estimator, X, y)``
+    fit_params: dict
+        Parameters passed to the fit method of the models
+    measure_memory: bool, optional (default: False)
+        If True, the pickled size of the fitted model is measured, otherwise it is 0
+
+    Returns
+    -------
+    results: list
+        (score, fit_time, score_time, model_size) of each model, None if it failed.
+        The fit time and the query time are the ones of the shared query.
+    """
+    n_neighbors = [final_estimator.get_params()['n_neighbors'] for final_estimator in final_estimators]
+    # A model with more neighbors than training samples fails, like on its own
+    valid_n_neighbors = [k for k in n_neighbors if k <= _num_samples(Xt_train)]
+    results = [None] * len(final_estimators)
+    if not valid_n_neighbors:
+        return results
+
+    max_n_neighbors = max(valid_n_neighbors)
+    fit_start_time = time()
+    neighbors = clone(final_estimators[n_neighbors.index(max_n_neighbors)])
+    neighbors.fit(Xt_train, y_train, **fit_params)
+    query_start_time = time()
+    distances, indices = neighbors.kneighbors(Xt_test, n_neighbors=max_n_neighbors)
+    fit_time = query_start_time - fit_start_time
+    query_time = time() - query_start_time
+    model_size = (_pickled_size(neighbors) or 0) if measure_memory else 0
+
+    for idx, final_estimator in enumerate(final_estimators):
+        if n_neighbors[idx] > max_n_neighbors:
+            continue
+        score_start_time = time()
+        try:
+            predictions = _NeighborsPredictions(neighbors, final_estimator.get_params()['weights'],
+                                                distances[:, :n_neighbors[idx]], indices[:, :n_neighbors[idx]],
+                                                Xt_test)
+            score = _score(predictions, Xt_test, y_test, scorer)
+        except TimeoutException:
+            raise
+        except Exception:
+            continue
+        results[idx] = (score, fit_time, query_time + time() - score_start_time, model_size)
+    return results
+
+
+class _NeighborsPredictions(object):
+    """Predictions of a nearest neighbors model computed from a neighbor query made beforehand.
+
+    It stands for the fitted model in the scorers, like KNeighborsClassifier and
+    KNeighborsRegressor it predicts from the (weighted) targets of the neighbors.
+    The predictions are only available for the samples of the query.
+    """
+
+    def __init__(self, neighbors, weights, distances, indices, X):
+        """Set up the predictions.
+
+        Parameters
+        ----------
+        neighbors: KNeighborsClassifier or KNeighborsRegressor
+            Fitted model that made the neighbor query
+        weights: str or callable
+            Weight function of the model to predict for
+        distances: numpy.ndarray {n_samples, n_neighbors}
+            Distances to the neighbors of the samples
+        indices: numpy.ndarray {n_samples, n_neighbors}
+            Indices of the neighbors of the samples in the training set
+        X: array-like {n_samples, n_features}
+            The queried samples
+        """
+        self._estimator_type = neighbors._estimator_type
+        if self._estimator_type == 'classifier':
+            self.classes_ = neighbors.classes_
+        self._y = neighbors._y
+        self._weights = _get_weights(distances, weights)
+        self._indices = indices
+        self._X = X
+
+    def _check_samples(self, X):
+        if X is not self._X:
+            raise ValueError('The neighbors were queried for other samples.')
+
+    def predict_proba(self, X):
+        self._check_samples(X)
+        neighbors_y = self._y[self._indices]
+        weights = self._weights if self._weights is not None else np.ones(self._indices.shape)
+        all_rows = np.arange(self._indices.shape[0])
+        proba = np.zeros((self._indices.shape[0], len(self.classes_)))
+        for i in range(self._indices.shape[1]):
+            proba[all_rows, neighbors_y[:, i]] += weights[:, i]
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        return proba / normalizer
+
+    def predict(self, X):
+        if self._estimator_type == 'classifier':
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        self._check_samples(X)
+        neighbors_y = self._y[self._indices]
+        if self._weights is None:
+            return np.mean(neighbors_y, axis=1)
+        return np.sum(neighbors_y * self._weights, axis=1) / np.sum(self._weights, axis=1)
+
+
+def _combine_fold_stats(fold_stats_list):
+    """Summarize the costs of the evaluated folds of a pipeline.
+
+    Parameters
+    ----------
+    fold_stats_list: list of dict
+        Costs of each evaluated fold, filled by _fit_and_score_fold
+
+    Returns
+    -------
+    cost_stats: dict
+        'fit_time': total fit time over the folds in seconds
+        'score_time': total score time over the folds in seconds
+        'fold_times': list of the wall times of the folds in seconds
+        'peak_rss': largest peak resident memory over the folds in bytes, None if unknown
+        'model_size': largest pickled size of the fitted pipelines in bytes, None if unknown
+        'predict_latency': score time per testing sample in seconds, None if no fold was scored
+    """
+    fold_stats_list = [fold_stats for fold_stats in fold_stats_list if fold_stats]
+    peak_rss = [fold_stats['peak_rss'] for fold_stats in fold_stats_list if fold_stats['peak_rss'] is not None]
+    model_size = [fold_stats['model_size'] for fold_stats in fold_stats_list if fold_stats['model_size'] is not None]
+    n_test_samples = sum(fold_stats['n_test_samples'] for fold_stats in fold_stats_list)
+    score_time = sum(fold_stats['score_time'] for fold_stats in fold_stats_list)
+    return {
+        'fit_time': sum(fold_stats['fit_time'] for fold_stats in fold_stats_list),
+        'score_time': score_time,
+        'fold_times': [fold_stats['fold_time'] for fold_stats in fold_stats_list],
+        'peak_rss': max(peak_rss) if peak_rss else None,
+        'model_size': max(model_size) if model_size else None,
+        'predict_latency': score_time / n_test_samples if n_test_samples else None
+    }
+
+
+def _reset_peak_rss():
+    """Reset the peak resident memory of the process so that it is measured per fold (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except (IOError, OSError):
+        pass
+
+
+def _peak_rss():
+    """Read the peak resident memory of the process in bytes.
+
+    Returns
+    -------
+    peak_rss: int or None
+        Peak resident memory since the last _reset_peak_rss() call on Linux, or since
+        the start of the process on other platforms. None if it cannot be measured.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+class _ByteCounter(object):
+    """File-like object that only counts the bytes written to it."""
+
+    def __init__(self):
+        self.n_bytes = 0
+
+    def write(self, data):
+        self.n_bytes += len(data)
+
+
+def _pickled_size(estimator):
+    """Compute the size of a pickled estimator in bytes without keeping the pickle in memory."""
+    byte_counter = _ByteCounter()
+    try:
+        pickle.dump(estimator, byte_counter, protocol=2)
+    except Exception:
+        return None
+    return byte_counter.n_bytes
+
+
+@threading_timeoutable(default="Timeout")
+def _wrapped_fold_score(sklearn_pipeline, features, target, train, test,
+                        scoring_function, sample_weight=None, return_stats=False,
+                        prefix_cache=None, fold_key=None, fold_data=None, measure_memory=False):
+    """Fit a pipeline and compute its score on a single cross-validation fold.
+
+    Parameters
+    ----------
+    sklearn_pipeline : pipeline object implementing 'fit'
+        The object to use to fit the data.
+    features : array-like of shape at least 2D
+        The data to fit.
+    target : array-like
+        The target variable to try to predict.
+    train: array-like
+        Indices of the training samples of the fold
+    test: array-like
+        Indices of the testing samples of the fold
+    scoring_function : str or callable
+        A scorer name or callable object with signature ``scorer(estimator, X, y)``.
+    sample_weight : array-like, optional
+        List of sample weights to balance (or un-balanace) the dataset target as needed
+    return_stats: bool, optional (default: False)
+        If True, return a (score, fold_stats) tuple where fold_stats holds the
+        costs of the fold measured by _fit_and_score_fold, empty if the pipeline failed
+    prefix_cache: PrefixCache, optional
+        If supplied, the outputs of the fitted pipeline prefixes on the fold are
+        reused from and stored in this cache
+    fold_key: hashable, optional
+        Identifier of the fold in prefix_cache
+    fold_data: tuple, optional
+        (X_train, y_train, X_test, y_test) samples of the fold, materialized once
+        by the caller
+    measure_memory: bool, optional (default: False)
+        If True, the peak memory and the model size are measured, see _fit_and_score_fold
+
+    Returns
+    -------
+    score: float or "Timeout"
+        Score of the pipeline on the fold, -inf if the pipeline failed
+    """
+    sample_weight_dict = set_sample_weight(sklearn_pipeline.steps, sample_weight)
+    scorer = _check_scorer(sklearn_pipeline, scoring_function)
+
+    fold_stats = {} if return_stats else None
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            score = _fit_and_score_fold(sklearn_pipeline, features, target, scorer,
+                                        train, test, sample_weight_dict, fold_stats,
+                                        prefix_cache, fold_key, fold_data, measure_memory)
+    except TimeoutException:
+        score = "Timeout"
+        fold_stats = {} if return_stats else None
+    except Exception as e:
+        score = -float('inf')
+        fold_stats = {} if return_stats else None
+    if return_stats:
+        return score, fold_stats
+    return score
+
+
+def _wrapped_group_fold_score(sklearn_pipelines, features, target, train, test,
+                             scoring_function, sample_weight=None, fold_data=None, measure_memory=False):
+    """Fit a group of pipelines sharing their fits and compute their scores on a single cross-validation fold.
+
+    Parameters
+    ----------
+    sklearn_pipelines: list
+        Pipelines with the same shared_fit_key()
+    features : array-like of shape at least 2D
+        The data to fit.
+    target : array-like
+        The target variable to try to predict.
+    train: array-like
+        Indices of the training samples of the fold
+    test: array-like
+        Indices of the testing samples of the fold
+    scoring_function : str or callable
+        A scorer name or callable object with signature ``scorer(estimator, X, y)``.
+    sample_weight : array-like, optional
+        List of sample weights to balance (or un-balanace) the dataset target as needed
+    fold_data: tuple, optional
+        (X_train, y_train, X_test, y_test) samples of the fold, materialized once
+        by the caller
+    measure_memory: bool, optional (default: False)
+        If True, the peak memory and the model sizes are measured
+
+    Returns
+    -------
+    (scores, fold_stats_list): tuple
+        Score of each pipeline on the fold, -inf if it failed, and its costs, empty if it failed
+    """
+    sample_weight_dict = set_sample_weight(sklearn_pipelines[0].steps, sample_weight)
+    scorer = _check_scorer(sklearn_pipelines[0], scoring_function)
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results = _fit_and_score_group(sklearn_pipelines, features, target, scorer,
+                                          train, test, sample_weight_dict, fold_data, measure_memory)
+    except Exception:
+        results = [(-float('inf'), {})] * len(sklearn_pipelines)
+    return [score for score, _ in results], [fold_stats for _, fold_stats in results]
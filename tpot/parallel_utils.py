@@ -0,0 +1,559 @@
+# -*- coding: utf-8 -*-
+
+"""This file is part of the TPOT library.
+
+TPOT was primarily developed at the University of Pennsylvania by:
+    - Randal S. Olson (rso@randalolson.com)
+    - Weixuan Fu (weixuanf@upenn.edu)
+    - Daniel Angell (dpa34@drexel.edu)
+    - and many more generous open source contributors
+
+TPOT is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as
+published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+TPOT is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with TPOT. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import os
+import select
+import signal
+import time
+import warnings
+from collections import deque
+from multiprocessing import Pipe, Process
+from tempfile import mkdtemp
+from shutil import rmtree
+
+try:
+    from multiprocessing.connection import wait as _wait_connections
+except ImportError:  # Python 2 has no wait() on several connections
+    _wait_connections = None
+
+from sklearn.externals.joblib import dump, load
+
+from .gp_deap import _wrapped_fold_score, _wrapped_group_fold_score
+from .cache_utils import PrefixCache, _nbytes, _memory_counts, _memory_counts_since, _add_memory_counts
+
+# Training data of the current worker process. It is set once when the worker
+# starts so that only the pipelines need to be sent along with each task.
+_worker_data = {}
+
+
+def _shared_temp_folder():
+    """Return the folder in which the data shared with the workers is written.
+
+    A RAM-backed file system is used when available so that the memory-mapped
+    data never has to be written to disk.
+    """
+    shm_folder = '/dev/shm'
+    if os.path.isdir(shm_folder) and os.access(shm_folder, os.W_OK):
+        return shm_folder
+    return None
+
+
+def _init_worker(data_path, scoring_function, prefix_cache_bytes=None, decomposition_cache_bytes=None,
+                 measure_memory=False):
+    """Map the training data shared by the main process in a new worker process.
+
+    Parameters
+    ----------
+    data_path: str
+        Path of the file holding the features, target, sample weights and
+        (train, test) index arrays of the cross-validation folds
+    scoring_function: str or callable
+        Scorer used to evaluate the pipelines
+    prefix_cache_bytes: int, optional
+        If supplied, size in bytes of the cache of the fitted pipeline prefixes
+        kept by the worker, see PrefixCache
+    decomposition_cache_bytes: int, optional
+        If supplied, size in bytes of the cache of the fitted decompositions
+        kept by the worker, see PrefixCache
+    measure_memory: bool, optional (default: False)
+        If True, the peak memory and the model size of the pipelines are measured
+        on the first fold
+
+    Returns
+    -------
+    None
+    """
+    # Let the main process handle CTRL+C and shut the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The arrays are memory-mapped read-only, so all the workers share one copy
+    _worker_data.update(load(data_path, mmap_mode='r'))
+    _worker_data['scoring_function'] = scoring_function
+    _worker_data['measure_memory'] = measure_memory
+    if prefix_cache_bytes or decomposition_cache_bytes:
+        _worker_data['prefix_cache'] = PrefixCache(prefix_cache_bytes or 0, decomposition_cache_bytes or 0)
+    else:
+        _worker_data['prefix_cache'] = None
+
+
+def _evaluate_fold_task(task):
+    """Score a pipeline on one cross-validation fold of the data held by the worker.
+
+    Parameters
+    ----------
+    task: tuple
+        (sklearn_pipeline, fold_idx, timeout) where fold_idx is the index of the
+        fold in the cross-validation iterator and timeout is the time limit in seconds,
+        enforced by the main process. sklearn_pipeline can also be a list of pipelines
+        sharing their fits, see shared_fit_key(), then the scores and costs are lists.
+
+    Returns
+    -------
+    (score, fold_stats): tuple
+        Score of the pipeline on the fold, -inf if the pipeline failed, and the
+        costs of the fold measured in the worker, empty if the pipeline failed
+    """
+    sklearn_pipeline, fold_idx, _ = task
+    train, test = _worker_data['cv_iter'][fold_idx]
+    fold_buffers = _worker_data['fold_buffers']
+    fold_data = fold_buffers[fold_idx] if fold_buffers is not None and fold_idx < len(fold_buffers) else None
+    measure_memory = _worker_data['measure_memory'] and fold_idx == 0
+    if isinstance(sklearn_pipeline, list):
+        # The pipelines of the group share their fits on the fold
+        return _wrapped_group_fold_score(sklearn_pipelines=sklearn_pipeline,
+                                        features=_worker_data['features'],
+                                        target=_worker_data['target'],
+                                        train=train,
+                                        test=test,
+                                        scoring_function=_worker_data['scoring_function'],
+                                        sample_weight=_worker_data['sample_weight'],
+                                        fold_data=fold_data,
+                                        measure_memory=measure_memory)
+    try:
+        return _wrapped_fold_score(sklearn_pipeline=sklearn_pipeline,
+                                   features=_worker_data['features'],
+                                   target=_worker_data['target'],
+                                   train=train,
+                                   test=test,
+                                   scoring_function=_worker_data['scoring_function'],
+                                   sample_weight=_worker_data['sample_weight'],
+                                   return_stats=True,
+                                   prefix_cache=_worker_data['prefix_cache'],
+                                   fold_key=fold_idx,
+                                   fold_data=fold_data,
+                                   measure_memory=measure_memory)
+    except Exception:
+        # Never let a task fail silently, the main process waits for every result
+        return -float('inf'), {}
+
+
+def _fit_pipeline_task(task):
+    """Fit a pipeline on the whole training set held by the worker.
+
+    Parameters
+    ----------
+    task: tuple
+        (sklearn_pipeline, None, timeout) tuple
+
+    Returns
+    -------
+    (fitted_pipeline, fold_stats): tuple
+        The fitted pipeline, None if the pipeline failed, and empty costs
+    """
+    sklearn_pipeline = task[0]
+    features = _worker_data['features']
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            try:
+                sklearn_pipeline.fit(features, _worker_data['target'])
+            except ValueError:
+                # The shared arrays are read-only, a pipeline that writes to its input
+                # is fitted on a private copy like in the main process
+                sklearn_pipeline.fit(features.copy(), _worker_data['target'])
+        return sklearn_pipeline, {}
+    except Exception:
+        return None, {}
+
+
+def _worker_loop(conn, data_path, scoring_function, prefix_cache_bytes=None, decomposition_cache_bytes=None,
+                 measure_memory=False):
+    """Evaluate the tasks received from the main process until it sends None.
+
+    Parameters
+    ----------
+    conn: multiprocessing.Connection
+        Worker end of the pipe to the main process
+    data_path: str
+        Path of the file holding the shared training data
+    scoring_function: str or callable
+        Scorer used to evaluate the pipelines
+    prefix_cache_bytes: int, optional
+        If supplied, size in bytes of the cache of the fitted pipeline prefixes
+        kept by the worker
+    decomposition_cache_bytes: int, optional
+        If supplied, size in bytes of the cache of the fitted decompositions
+        kept by the worker
+    measure_memory: bool, optional (default: False)
+        If True, the peak memory and the model size of the pipelines are measured
+        on the first fold
+
+    Returns
+    -------
+    None
+    """
+    _init_worker(data_path, scoring_function, prefix_cache_bytes, decomposition_cache_bytes, measure_memory)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        memory_counts = _memory_counts()
+        # The tasks without a fold fit the pipeline on the whole training set
+        result = _fit_pipeline_task(task) if task[1] is None else _evaluate_fold_task(task)
+        # The TPOTMemory statistics of the task are added up in the main process
+        conn.send(tuple(result) + (_memory_counts_since(memory_counts),))
+
+
+def _is_group_task(task_id):
+    """Check if a task scores a group of pipelines sharing their fits."""
+    return isinstance(task_id, tuple) and len(task_id) == 2 and task_id[0] == 'group'
+
+
+class EvaluationPool(object):
+    """Pool of worker processes that keep the training data for a whole TPOT run.
+
+    Each worker talks to the main process through its own pipe and runs one
+    task at a time. A worker that runs past the time limit of its task is
+    killed, which also stops native code that a thread-based timeout cannot
+    interrupt, and a new worker takes its place without disturbing the tasks
+    running in the other workers.
+    """
+
+    def __init__(self, n_jobs, features, target, cv_iter, scoring_function, sample_weight=None, n_folds=None,
+                 prefix_cache_bytes=None, decomposition_cache_bytes=None, fold_buffers=None, measure_memory=False):
+        """Start the worker processes and send them the training data once.
+
+        Parameters
+        ----------
+        n_jobs: int
+            Number of worker processes
+        features: array-like {n_samples, n_features}
+            Feature matrix
+        target: array-like {n_samples}
+            List of class labels for prediction
+        cv_iter: list
+            List of (train, test) index arrays of the cross-validation folds
+        scoring_function: str or callable
+            Scorer used to evaluate the pipelines
+        sample_weight: array-like {n_samples}, optional
+            List of sample weights to balance (or un-balanace) the dataset target as needed
+        n_folds: int, optional
+            Number of folds of a full cross-validation, the next folds of cv_iter can
+            only be addressed by their index. By default, all the folds of cv_iter.
+        prefix_cache_bytes: int, optional
+            If supplied, each worker keeps the outputs of the fitted pipeline prefixes
+            on the folds in a cache of this size in bytes, see PrefixCache
+        decomposition_cache_bytes: int, optional
+            If supplied, each worker keeps the fitted PCA and FastICA of the pipeline
+            prefixes on the folds in a cache of this size in bytes, see PrefixCache
+        fold_buffers: list, optional
+            (X_train, y_train, X_test, y_test) samples of the first folds of cv_iter,
+            shared with the workers so that they do not index them for each task
+        measure_memory: bool, optional (default: False)
+            If True, the workers measure the peak memory and the model size of the
+            pipelines on the first fold, otherwise they are None in the fold costs
+
+        Returns
+        -------
+        None
+        """
+        self.n_jobs = n_jobs
+        self.n_folds = len(cv_iter) if n_folds is None else n_folds
+
+        # Write the data once to a memory-mapped file instead of giving each
+        # worker its own copy of the training matrix
+        data = {
+            'features': features,
+            'target': target,
+            'cv_iter': cv_iter,
+            'sample_weight': sample_weight,
+            'fold_buffers': fold_buffers
+        }
+        self.shared_nbytes = _nbytes(data)
+        self._temp_folder = mkdtemp(prefix='tpot_', dir=_shared_temp_folder())
+        self._data_path = os.path.join(self._temp_folder, 'data.pkl')
+        self._scoring_function = scoring_function
+        self._prefix_cache_bytes = prefix_cache_bytes
+        self._decomposition_cache_bytes = decomposition_cache_bytes
+        self._measure_memory = measure_memory
+        dump(data, self._data_path)
+
+        self._processes = [None] * n_jobs
+        self._conns = [None] * n_jobs
+        # (task_id, deadline) of the task running in each worker, None if the worker is idle
+        self._running = [None] * n_jobs
+        for worker_idx in range(n_jobs):
+            self._start_worker(worker_idx)
+        self._tasks = deque()
+        self._results = deque()
+        self.n_pending = 0
+        # Number of calls to map() and fit_pipelines(), part of the identifiers of their tasks
+        self._n_calls = 0
+
+    def _start_worker(self, worker_idx):
+        """Start a worker process, or replace a killed one."""
+        conn, worker_conn = Pipe()
+        process = Process(target=_worker_loop, args=(worker_conn, self._data_path, self._scoring_function,
+                                                        self._prefix_cache_bytes, self._decomposition_cache_bytes,
+                                                        self._measure_memory))
+        process.daemon = True
+        process.start()
+        worker_conn.close()
+        self._processes[worker_idx] = process
+        self._conns[worker_idx] = conn
+        self._running[worker_idx] = None
+
+    def _kill_worker(self, worker_idx):
+        """Kill a worker process, whatever it is running."""
+        self._conns[worker_idx].close()
+        self._processes[worker_idx].terminate()
+        self._processes[worker_idx].join()
+
+    def submit(self, task_id, task):
+        """Queue a task, it starts as soon as a worker is free.
+
+        Parameters
+        ----------
+        task_id: hashable
+            Identifier returned along with the result of the task. For the list of
+            pipelines sharing their fits, ('group', keys) where keys holds the
+            identifier of each pipeline, the task then returns one result per pipeline.
+        task: tuple
+            (sklearn_pipeline, fold_idx, timeout) tuple, fold_idx is None to fit
+            the pipeline on the whole training set
+
+        Returns
+        -------
+        None
+        """
+        self.n_pending += len(task_id[1]) if _is_group_task(task_id) else 1
+        self._tasks.append((task_id, task))
+        self._dispatch()
+
+    def cancel(self, task_id):
+        """Drop the tasks submitted with an identifier, killing the workers running them.
+
+        The queued tasks are removed, the workers running one of them are replaced by
+        new ones, and the results already received for them are discarded, so that
+        get_result() never returns them.
+
+        Parameters
+        ----------
+        task_id: hashable
+            Identifier given to submit()
+
+        Returns
+        -------
+        None
+        """
+        n_results = len(task_id[1]) if _is_group_task(task_id) else 1
+        result_keys = set(task_id[1]) if _is_group_task(task_id) else set([task_id])
+        n_tasks = len(self._tasks)
+        self._tasks = deque((queued_id, task) for queued_id, task in self._tasks if queued_id != task_id)
+        n_cancelled = (n_tasks - len(self._tasks)) * n_results
+        for worker_idx in range(self.n_jobs):
+            if self._running[worker_idx] is not None and self._running[worker_idx][0] == task_id:
+                self._kill_worker(worker_idx)
+                self._start_worker(worker_idx)
+                n_cancelled += n_results
+        n_received = len(self._results)
+        self._results = deque(result for result in self._results if result[0] not in result_keys)
+        n_cancelled += n_received - len(self._results)
+        self.n_pending -= n_cancelled
+        self._dispatch()
+
+    def _dispatch(self):
+        """Send the queued tasks to the idle workers."""
+        for worker_idx in range(self.n_jobs):
+            if not self._tasks:
+                break
+            if self._running[worker_idx] is None:
+                task_id, task = self._tasks.popleft()
+                self._conns[worker_idx].send(task)
+                self._running[worker_idx] = (task_id, time.time() + task[2])
+
+    def _poll(self):
+        """Gather the results of the finished tasks and kill the workers past their deadline."""
+        now = time.time()
+        for worker_idx in range(self.n_jobs):
+            if self._running[worker_idx] is None:
+                continue
+            task_id, deadline = self._running[worker_idx]
+            conn = self._conns[worker_idx]
+            try:
+                if conn.poll():
+                    score, fold_stats, memory_counts = conn.recv()
+                    _add_memory_counts(memory_counts)
+                    self._append_result(task_id, score, fold_stats)
+                    self._running[worker_idx] = None
+                    continue
+            except (EOFError, IOError, OSError):
+                # The worker died, e.g. killed by the OS when running out of memory
+                self._append_result(task_id, -float('inf'), {})
+                self._kill_worker(worker_idx)
+                self._start_worker(worker_idx)
+                continue
+            if now > deadline:
+                self._append_result(task_id, "Timeout", {})
+                self._kill_worker(worker_idx)
+                self._start_worker(worker_idx)
+        self._dispatch()
+
+    def _append_result(self, task_id, score, fold_stats):
+        """Queue the result of a task, split into one result per pipeline for a group of pipelines."""
+        if not _is_group_task(task_id):
+            self._results.append((task_id, score, fold_stats))
+            return
+        keys = task_id[1]
+        # A failed or timed out task gives the same result to all its pipelines
+        scores = score if isinstance(score, list) else [score] * len(keys)
+        fold_stats_list = fold_stats if isinstance(fold_stats, list) else [fold_stats] * len(keys)
+        for key, key_score, key_fold_stats in zip(keys, scores, fold_stats_list):
+            self._results.append((key, key_score, key_fold_stats))
+
+    def get_result(self):
+        """Wait for the next finished task, in order of completion.
+
+        Returns
+        -------
+        (task_id, score, fold_stats): tuple
+            Identifier of the task given to submit(), score of the pipeline on the
+            fold, "Timeout" if the worker was killed at the time limit, and costs
+            of the fold measured in the worker, empty if the pipeline failed
+        """
+        self._poll()
+        while not self._results:
+            self._wait()
+            self._poll()
+        self.n_pending -= 1
+        return self._results.popleft()
+
+    def _wait(self):
+        """Block until a worker sends a result or the earliest deadline of the running tasks.
+
+        Python 2 has no wait() on several connections, so the file descriptors of the
+        pipes are passed to select() instead. select() does not accept pipes on Windows,
+        where Python 2 still polls the pipes every 10 ms.
+        """
+        running = [worker_idx for worker_idx in range(self.n_jobs) if self._running[worker_idx] is not None]
+        if not running:
+            return
+        timeout = max(min(self._running[worker_idx][1] for worker_idx in running) - time.time(), 0.)
+        conns = [self._conns[worker_idx] for worker_idx in running]
+        if _wait_connections is not None:
+            _wait_connections(conns, timeout)
+        elif os.name != 'nt':
+            try:
+                select.select([conn.fileno() for conn in conns], [], [], timeout)
+            except (select.error, OSError):
+                # Interrupted by a signal, the caller polls the pipes and waits again
+                pass
+        else:
+            time.sleep(min(timeout, 0.01))
+
+    def map(self, tasks):
+        """Score pipelines on cross-validation folds in the worker processes.
+
+        Parameters
+        ----------
+        tasks: list
+            List of (sklearn_pipeline, fold_idx, timeout) tuples
+
+        Returns
+        -------
+        scores: list
+            Score of each task, in the same order as tasks
+        """
+        self._n_calls += 1
+        task_ids = [('map', self._n_calls, task_idx) for task_idx in range(len(tasks))]
+        for task_id, task in zip(task_ids, tasks):
+            self.submit(task_id, task)
+        results = self._get_results(task_ids)
+        return [results[task_id] for task_id in task_ids]
+
+    def fit_pipelines(self, pipelines, timeout):
+        """Fit pipelines on the whole training set in the worker processes.
+
+        Parameters
+        ----------
+        pipelines: list
+            List of unfitted sklearn pipelines
+        timeout: float
+            Time limit of the fit of each pipeline in seconds
+
+        Returns
+        -------
+        fitted_pipelines: list
+            Fitted copy of each pipeline, in the same order as pipelines,
+            None for the pipelines that failed or timed out
+        """
+        self._n_calls += 1
+        task_ids = [('fit', self._n_calls, pipeline_idx) for pipeline_idx in range(len(pipelines))]
+        for task_id, pipeline in zip(task_ids, pipelines):
+            self.submit(task_id, (pipeline, None, timeout))
+        results = self._get_results(task_ids)
+        # A worker that died returns a -inf score instead of a pipeline
+        return [results[task_id] if hasattr(results[task_id], 'predict') else None for task_id in task_ids]
+
+    def _get_results(self, task_ids):
+        """Wait for the results of some tasks, skipping the results of any other task.
+
+        Parameters
+        ----------
+        task_ids: list
+            Identifiers given to submit()
+
+        Returns
+        -------
+        results: dict
+            Score, or fitted pipeline, of each task, keyed by its identifier
+        """
+        waiting = set(task_ids)
+        results = {}
+        while waiting:
+            # The results of the tasks submitted by other callers are dropped
+            task_id, result, _ = self.get_result()
+            if task_id in waiting:
+                waiting.remove(task_id)
+                results[task_id] = result
+        return results
+
+    def memory_report(self):
+        """Report the memory saved by sharing the training data between the workers.
+
+        Returns
+        -------
+        report: dict
+            'shared_bytes': size of the data mapped by every worker
+            'n_jobs': number of worker processes
+            'bytes_without_sharing': size of the data if each worker held its own copy
+            'bytes_with_sharing': size of the single shared copy of the data
+            'saved_bytes': difference between the two
+        """
+        return {
+            'shared_bytes': self.shared_nbytes,
+            'n_jobs': self.n_jobs,
+            'bytes_without_sharing': self.shared_nbytes * self.n_jobs,
+            'bytes_with_sharing': self.shared_nbytes,
+            'saved_bytes': self.shared_nbytes * (self.n_jobs - 1)
+        }
+
+    def close(self):
+        """Stop the worker processes and delete the shared data."""
+        for worker_idx in range(self.n_jobs):
+            self._kill_worker(worker_idx)
+        rmtree(self._temp_folder, ignore_errors=True)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""This file is part of the TPOT library.
+
+TPOT was primarily developed at the University of Pennsylvania by:
+    - Randal S. Olson (rso@randalolson.com)
+    - Weixuan Fu (weixuanf@upenn.edu)
+    - Daniel Angell (dpa34@drexel.edu)
+    - and many more generous open source contributors
+
+TPOT is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as
+published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+TPOT is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with TPOT. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.special import comb
+
+from .export_utils import get_by_name
+
+# Pipelines whose features are polynomials of a higher degree of the input features,
+# e.g. PolynomialFeatures of PolynomialFeatures, are rejected whatever their size
+MAX_FEATURE_DEGREE = 2
+
+# Operators whose output is sparse when their input is sparse
+_SPARSE_OPERATORS = ('Binarizer', 'MaxAbsScaler', 'Normalizer', 'SelectFwe', 'SelectPercentile',
+                     'VarianceThreshold', 'SelectFromModel', 'RFE')
+
+# Number of unique values below which tpot.builtins.OneHotEncoder encodes a feature
+_ONE_HOT_MAX_VALUES = 10
+
+
+def data_shape(features):
+    """Describe the shape of a feature matrix for infer_pipeline_shape().
+
+    Parameters
+    ----------
+    features: array-like or sparse matrix {n_samples, n_features}
+        Feature matrix
+
+    Returns
+    -------
+    (n_samples, n_features, density, is_sparse): tuple
+        Number of samples and features, fraction of non-zero values of a sparse
+        matrix (1 for a dense one) and whether the matrix is sparse
+    """
+    n_samples, n_features = np.shape(features)
+    if sparse.issparse(features):
+        return n_samples, n_features, features.nnz / float(max(1, n_samples * n_features)), True
+    return n_samples, n_features, 1., False
+
+
+def _matrix_bytes(n_samples, n_features, density, is_sparse):
+    """Estimate the size in bytes of a float64 matrix, in CSR format if it is sparse."""
+    if is_sparse:
+        return int(n_samples * n_features * density * 12 + (n_samples + 1) * 4)
+    return int(n_samples * n_features * 8)
+
+
+def _operator_params(operator, tpot_op):
+    """Map the parameter names of an operator of a pipeline tree to their values."""
+    params = {}
+    for arg_type, value in zip(tpot_op.arg_types, operator[2:]):
+        name_parts = arg_type.__name__.split('__')
+        # The parameters of the nested estimators are left out
+        if len(name_parts) == 2:
+            params[name_parts[1]] = value
+    return params
+
+
+def _output_features(op_name, params, n_samples, n_features):
+    """Predict the number of features output by a transformer, upper bounds when they depend on the data."""
+    if op_name == 'PolynomialFeatures':
+        degree = params.get('degree', 2)
+        if params.get('interaction_only', False):
+            n_output = sum(int(comb(n_features, k, exact=True)) for k in range(degree + 1))
+        else:
+            n_output = int(comb(n_features + degree, degree, exact=True))
+        return n_output - (0 if params.get('include_bias', True) else 1)
+    if op_name == 'OneHotEncoder':
+        # Each encoded feature gets a column per frequent value and one for the rare values
+        minimum_fraction = params.get('minimum_fraction') or 0.
+        n_values = _ONE_HOT_MAX_VALUES
+        if minimum_fraction > 0:
+            n_values = min(n_values, int(1. / minimum_fraction))
+        return n_features * (n_values + 1)
+    if op_name == 'SelectPercentile':
+        return max(1, int(n_features * params.get('percentile', 10) / 100.))
+    if op_name in ('PCA', 'FastICA'):
+        n_components = params.get('n_components')
+        return min(n_samples, n_features) if n_components is None else n_components
+    if op_name in ('Nystroem', 'RBFSampler'):
+        return params.get('n_components', 100)
+    if op_name == 'FeatureAgglomeration':
+        return params.get('n_clusters', 2)
+    if op_name == 'ZeroCount':
+        return n_features + 2
+    return n_features
+
+
+def infer_pipeline_shape(pipeline_tree, operators, n_samples, n_features, density=1., is_sparse=False,
+                         n_classes=None):
+    """Predict the shapes of the samples flowing through a pipeline without fitting it.
+
+    The (n_features, density) of the input is propagated through every operator and
+    CombineDFs of the pipeline tree, see expr_to_tree(). The predictions are upper
+    bounds when the output of an operator depends on the data, e.g. OneHotEncoder.
+
+    Parameters
+    ----------
+    pipeline_tree: list
+        Pipeline tree output by expr_to_tree()
+    operators: list
+        List of operator classes from operator library
+    n_samples: int
+        Number of samples the pipeline is fitted on
+    n_features: int
+        Number of features of the input
+    density: float, optional (default: 1.)
+        Fraction of non-zero values of the input
+    is_sparse: bool, optional (default: False)
+        Whether the input is a sparse matrix
+    n_classes: int, optional
+        Number of classes of a classification target, for the class probabilities
+        added by the inner classifiers
+
+    Returns
+    -------
+    shape: dict
+        'n_features' and 'density' of the samples fitted by the final estimator,
+        'degree' of their features as polynomials of the input features, 'peak_bytes'
+        of the intermediate samples alive at once (the input itself is left out) and
+        'fit_cost', a rough count of the values processed by the fits of the steps
+    """
+    def infer(operator, depth):
+        if operator == 'input_matrix':
+            return {'n_features': n_features, 'density': density, 'is_sparse': is_sparse, 'degree': 1,
+                    'n_bytes': 0, 'peak_bytes': 0, 'fit_cost': 0}
+
+        if operator[0] == 'CombineDFs':
+            left = infer(operator[1], depth + 1)
+            right = infer(operator[2], depth + 1)
+            combined_features = left['n_features'] + right['n_features']
+            combined_density = (left['density'] * left['n_features'] +
+                                right['density'] * right['n_features']) / float(max(1, combined_features))
+            combined_sparse = left['is_sparse'] and right['is_sparse']
+            n_bytes = _matrix_bytes(n_samples, combined_features, combined_density, combined_sparse)
+            # The output of the left branch is kept while the right branch is fitted
+            peak_bytes = max(left['peak_bytes'], left['n_bytes'] + right['peak_bytes'],
+                             left['n_bytes'] + right['n_bytes'] + n_bytes)
+            return {'n_features': combined_features, 'density': combined_density, 'is_sparse': combined_sparse,
+                    'degree': max(left['degree'], right['degree']), 'n_bytes': n_bytes,
+                    'peak_bytes': peak_bytes, 'fit_cost': left['fit_cost'] + right['fit_cost']}
+
+        op_name = operator[0]
+        tpot_op = get_by_name(op_name, operators)
+        params = _operator_params(operator, tpot_op)
+        shape = infer(operator[1], depth + 1)
+        fit_cost = shape['fit_cost'] + n_samples * shape['n_features'] * shape['density']
+        if depth == 0:
+            # The final estimator only outputs predictions
+            return dict(shape, fit_cost=fit_cost)
+
+        degree = shape['degree']
+        output_sparse = shape['is_sparse'] and op_name in _SPARSE_OPERATORS
+        output_density = shape['density'] if output_sparse else 1.
+        if tpot_op.root:
+            # StackingEstimator adds the predictions and the class probabilities
+            output_features = shape['n_features'] + 1 + (n_classes or 0)
+            output_sparse = False
+            output_density = 1.
+        else:
+            output_features = _output_features(op_name, params, n_samples, shape['n_features'])
+            if op_name == 'PolynomialFeatures':
+                degree *= params.get('degree', 2)
+        n_bytes = _matrix_bytes(n_samples, output_features, output_density, output_sparse)
+        return {'n_features': output_features, 'density': output_density, 'is_sparse': output_sparse,
+                'degree': degree, 'n_bytes': n_bytes,
+                # The input and the output of the step are alive at once
+                'peak_bytes': max(shape['peak_bytes'], shape['n_bytes'] + n_bytes),
+                'fit_cost': fit_cost + n_samples * output_features * output_density}
+
+    shape = infer(pipeline_tree, 0)
+    return {'n_features': shape['n_features'], 'density': shape['density'], 'degree': shape['degree'],
+            'peak_bytes': shape['peak_bytes'], 'fit_cost': shape['fit_cost']}
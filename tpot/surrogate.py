@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""This file is part of the TPOT library.
+
+TPOT was primarily developed at the University of Pennsylvania by:
+    - Randal S. Olson (rso@randalolson.com)
+    - Weixuan Fu (weixuanf@upenn.edu)
+    - Daniel Angell (dpa34@drexel.edu)
+    - and many more generous open source contributors
+
+TPOT is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as
+published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+TPOT is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with TPOT. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import re
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.feature_extraction import DictVectorizer
+
+_operator_pattern = re.compile(r'(\w+)\(')
+_parameter_pattern = re.compile(r'(\w+__\w+)=([^,\)]+)')
+
+
+def pipeline_features(pipeline_str):
+    """Describe the structure of a pipeline from its string representation.
+
+    Parameters
+    ----------
+    pipeline_str: string
+        String representation of a DEAP individual
+
+    Returns
+    -------
+    features: dict
+        Count of each operator, value of each parameter (numeric values are kept
+        as numbers, the other values are one-hot encoded by DictVectorizer), number
+        of operators and nesting depth of the pipeline
+    """
+    features = {}
+    operators = _operator_pattern.findall(pipeline_str)
+    for operator in operators:
+        operator_key = 'operator=' + operator
+        features[operator_key] = features.get(operator_key, 0) + 1
+    for parameter, value in _parameter_pattern.findall(pipeline_str):
+        try:
+            features[parameter] = float(value)
+        except ValueError:
+            features[parameter] = value
+    depth = 0
+    max_depth = 0
+    for char in pipeline_str:
+        if char == '(':
+            depth += 1
+            max_depth = max(max_depth, depth)
+        elif char == ')':
+            depth -= 1
+    features['n_operators'] = len(operators)
+    features['depth'] = max_depth
+    return features
+
+
+def _pareto_ranks(objectives):
+    """Rank candidates by non-dominated sorting, 0 being the Pareto front.
+
+    Parameters
+    ----------
+    objectives: numpy.ndarray {n_candidates, n_objectives}
+        Objectives of the candidates, all to be minimized
+
+    Returns
+    -------
+    ranks: numpy.ndarray {n_candidates}
+        Index of the non-dominated front of each candidate
+    """
+    n_candidates = objectives.shape[0]
+    ranks = np.full(n_candidates, -1)
+    remaining = np.arange(n_candidates)
+    rank = 0
+    while len(remaining):
+        remaining_objectives = objectives[remaining]
+        dominated = np.zeros(len(remaining), dtype=bool)
+        for candidate_objectives in remaining_objectives:
+            dominated |= (np.all(candidate_objectives <= remaining_objectives, axis=1) &
+                          np.any(candidate_objectives < remaining_objectives, axis=1))
+        ranks[remaining[~dominated]] = rank
+        remaining = remaining[dominated]
+        rank += 1
+    return ranks
+
+
+class SurrogateModel(object):
+    """Predict the CV score and the runtime of pipelines from their structure.
+
+    The models are trained on the evaluated pipelines of the current TPOT run
+    and are used to pick the most promising of a larger set of offspring
+    before they are evaluated.
+    """
+
+    def __init__(self, min_samples=10, random_state=None):
+        """Set up the surrogate model.
+
+        Parameters
+        ----------
+        min_samples: int, optional (default: 10)
+            Number of successfully evaluated pipelines needed before the surrogate is used
+        random_state: int, optional (default: None)
+            Seed of the random forests
+
+        Returns
+        -------
+        None
+        """
+        self.min_samples = min_samples
+        self.random_state = random_state
+        self._vectorizer = None
+        self._score_model = None
+        self._runtime_model = None
+        self._features = {}
+        self.n_samples_ = 0
+        self.n_evaluated_ = 0
+
+    def _pipeline_features(self, pipeline_str):
+        # Parse each pipeline string only once during a TPOT run
+        if pipeline_str not in self._features:
+            self._features[pipeline_str] = pipeline_features(pipeline_str)
+        return self._features[pipeline_str]
+
+    @property
+    def is_fitted(self):
+        """Whether enough evaluated pipelines were seen to use the surrogate."""
+        return self._score_model is not None
+
+    def fit(self, evaluated_individuals):
+        """Train the surrogate on evaluated pipelines.
+
+        Parameters
+        ----------
+        evaluated_individuals: dict
+            evaluated_individuals_ of a TPOT object
+
+        Returns
+        -------
+        self: SurrogateModel
+        """
+        pipeline_strings = sorted(pipeline_str for pipeline_str, stats in evaluated_individuals.items()
+                                  if np.isfinite(stats['internal_cv_score']))
+        self.n_samples_ = len(pipeline_strings)
+        self.n_evaluated_ = len(evaluated_individuals)
+        if self.n_samples_ < self.min_samples:
+            return self
+
+        self._vectorizer = DictVectorizer()
+        X = self._vectorizer.fit_transform([self._pipeline_features(pipeline_str) for pipeline_str in pipeline_strings])
+        scores = np.array([evaluated_individuals[pipeline_str]['internal_cv_score'] for pipeline_str in pipeline_strings])
+        self._score_model = RandomForestRegressor(n_estimators=50, random_state=self.random_state, n_jobs=1)
+        self._score_model.fit(X, scores)
+
+        # The runtime is only known for the pipelines evaluated in this process or in its workers
+        runtimes = np.array([evaluated_individuals[pipeline_str].get('fit_time', np.nan) +
+                             evaluated_individuals[pipeline_str].get('score_time', np.nan)
+                             for pipeline_str in pipeline_strings])
+        has_runtime = np.isfinite(runtimes)
+        self._runtime_model = None
+        if has_runtime.sum() >= self.min_samples:
+            self._runtime_model = RandomForestRegressor(n_estimators=50, random_state=self.random_state, n_jobs=1)
+            self._runtime_model.fit(X[has_runtime], np.log1p(runtimes[has_runtime]))
+        return self
+
+    def predict(self, pipeline_strings):
+        """Predict the CV score and the runtime of pipelines.
+
+        Parameters
+        ----------
+        pipeline_strings: list of string
+            String representations of the pipelines
+
+        Returns
+        -------
+        scores: numpy.ndarray
+            Predicted CV scores
+        runtimes: numpy.ndarray
+            Predicted fit plus score time in seconds, 0 if the runtime model is not trained
+        """
+        X = self._vectorizer.transform([self._pipeline_features(pipeline_str) for pipeline_str in pipeline_strings])
+        scores = self._score_model.predict(X)
+        if self._runtime_model is None:
+            runtimes = np.zeros(len(pipeline_strings))
+        else:
+            runtimes = np.expm1(self._runtime_model.predict(X))
+        return scores, runtimes
+
+    def select(self, pipeline_strings, n_selected):
+        """Select the most promising pipelines by non-dominated sorting of the predicted score and runtime.
+
+        Parameters
+        ----------
+        pipeline_strings: list of string
+            String representations of the candidate pipelines
+        n_selected: int
+            Number of pipelines to select
+
+        Returns
+        -------
+        selected: list of int
+            Indices of the selected pipelines, best first
+        """
+        scores, runtimes = self.predict(pipeline_strings)
+        ranks = _pareto_ranks(np.column_stack([-scores, runtimes]))
+        # Within a front, prefer the highest predicted score
+        order = np.lexsort((-scores, ranks))
+        return list(order[:n_selected])